@@ -83,6 +83,20 @@ WSGI_APPLICATION = 'djmodular.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Persistent connections are reused for DATABASE_CONN_MAX_AGE seconds; off
+# by default, since under ASGI every async request runs sync code in a new
+# thread with its own connection, so persistent ones pile up. Turn it on
+# for WSGI workers. With DATABASE_POOL=True, PostgreSQL connections are
+# served from a psycopg connection pool instead (Django does not allow both
+# at once).
+DATABASE_CONN_MAX_AGE = int(os.getenv('DATABASE_CONN_MAX_AGE', '0'))
+DATABASE_POOL = os.getenv('DATABASE_POOL', 'False') == 'True'
+DATABASE_POOL_OPTIONS = {
+    'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', '2')),
+    'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', '10')),
+    'timeout': int(os.getenv('DATABASE_POOL_TIMEOUT', '10')),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -92,10 +106,7 @@ DATABASES = {
 
 # Use PostgreSQL if DATABASE_URL is set (in Docker)
 if os.getenv('DATABASE_URL'):
-    DATABASES['default'] = dj_database_url.config(
-        conn_max_age=600,
-        conn_health_checks=True,
-    )
+    DATABASES['default'] = dj_database_url.config()
 
 # Test-specific configuration
 if os.getenv('DJANGO_TEST') == 'True':
@@ -110,6 +121,23 @@ if os.getenv('DJANGO_TEST') == 'True':
         }
     }
 
+# Optional read replica for module and catalog reads (see modular_engine.routers)
+DATABASE_REPLICA_ALIAS = 'replica'
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES[DATABASE_REPLICA_ALIAS] = dj_database_url.parse(os.getenv('DATABASE_REPLICA_URL'))
+    DATABASES[DATABASE_REPLICA_ALIAS]['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['modular_engine.routers.ReplicaRouter']
+
+# Apply connection persistence / pooling to every configured database
+for database in DATABASES.values():
+    database['CONN_HEALTH_CHECKS'] = True
+    if DATABASE_POOL and database['ENGINE'] == 'django.db.backends.postgresql':
+        database.setdefault('OPTIONS', {})['pool'] = DATABASE_POOL_OPTIONS
+        database['CONN_MAX_AGE'] = 0
+    else:
+        database['CONN_MAX_AGE'] = DATABASE_CONN_MAX_AGE
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -162,3 +190,12 @@ LOGIN_URL = '/login/'
 AVAILABLE_MODULES = ['product']
 
 CORE_PATHS = ['login', 'logout']
+
+# PRAGMAs applied to SQLite connections by modular_engine (see modular_engine/db.py).
+# busy_timeout is the only lock wait: it overrides the driver's own timeout option.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    # Seconds to wait on a locked database before raising
+    'busy_timeout': int(os.getenv('SQLITE_TIMEOUT', '20')) * 1000,
+}
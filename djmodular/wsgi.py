@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djmodular.settings')
 
 application = get_wsgi_application()
+
+# Warm up installed modules before this worker accepts traffic
+from modular_engine.health import warm_up_worker  # noqa: E402
+
+warm_up_worker()
@@ -0,0 +1,260 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.http import Http404
+
+# Usage of the request being handled, installed by ModularEngineMiddleware
+_request_usage = ContextVar('modular_engine_request_usage', default=None)
+
+# Upper bounds of the histogram buckets; one more bucket counts larger values
+WALL_MS_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+QUERY_COUNT_BOUNDS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+RESPONSE_BYTES_BOUNDS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Fixed-bucket histogram; its memory doesn't grow with the number of values"""
+
+    __slots__ = ('bounds', 'counts')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+
+    def percentile(self, pct):
+        """
+        Return the upper bound of the bucket holding the pct-th percentile.
+        Values beyond the last bound are reported as the last bound.
+        """
+        total = sum(self.counts)
+        if not total:
+            return 0
+        rank = pct / 100 * total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def to_dict(self):
+        return {'bounds': list(self.bounds), 'counts': list(self.counts)}
+
+
+class RequestUsage:
+    """
+    Resources used by one request. The object is shared through a ContextVar,
+    so queries run by sync_to_async threads are counted against it too.
+    """
+
+    __slots__ = ('queries', 'query_seconds', 'wall_seconds', 'cpu_seconds', 'response_bytes', 'error')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = None
+        self.response_bytes = None
+        self.error = False
+
+    def finish(self, response):
+        """Record the response and return it"""
+        self.error = response.status_code >= 500
+        self.response_bytes = get_response_size(response)
+        return response
+
+
+class ModuleUsage:
+    """Aggregated resource usage of a module over one time slot"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.cpu_requests = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.response_bytes = 0
+        self.wall_ms = Histogram(WALL_MS_BOUNDS)
+        self.query_counts = Histogram(QUERY_COUNT_BOUNDS)
+        self.response_sizes = Histogram(RESPONSE_BYTES_BOUNDS)
+
+    def add(self, usage):
+        self.requests += 1
+        self.errors += int(usage.error)
+        self.wall_seconds += usage.wall_seconds
+        self.queries += usage.queries
+        self.query_seconds += usage.query_seconds
+        self.wall_ms.add(usage.wall_seconds * 1000)
+        self.query_counts.add(usage.queries)
+        if usage.cpu_seconds is not None:
+            self.cpu_seconds += usage.cpu_seconds
+            self.cpu_requests += 1
+        if usage.response_bytes is not None:
+            self.response_bytes += usage.response_bytes
+            self.response_sizes.add(usage.response_bytes)
+
+    def merge(self, other):
+        for field in ('requests', 'errors', 'wall_seconds', 'cpu_seconds', 'cpu_requests',
+                      'queries', 'query_seconds', 'response_bytes'):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.wall_ms.merge(other.wall_ms)
+        self.query_counts.merge(other.query_counts)
+        self.response_sizes.merge(other.response_sizes)
+
+    def summary(self):
+        requests = self.requests
+        sized = sum(self.response_sizes.counts)
+        return {
+            'requests': requests,
+            'errors': self.errors,
+            'wall_seconds': self.wall_seconds,
+            'avg_wall_ms': self.wall_seconds / requests * 1000 if requests else 0.0,
+            'p50_wall_ms': self.wall_ms.percentile(50),
+            'p95_wall_ms': self.wall_ms.percentile(95),
+            'p99_wall_ms': self.wall_ms.percentile(99),
+            'cpu_seconds': self.cpu_seconds,
+            'avg_cpu_ms': self.cpu_seconds / self.cpu_requests * 1000 if self.cpu_requests else None,
+            'queries': self.queries,
+            'avg_queries': self.queries / requests if requests else 0.0,
+            'query_seconds': self.query_seconds,
+            'avg_query_ms': self.query_seconds / requests * 1000 if requests else 0.0,
+            'response_bytes': self.response_bytes,
+            'avg_response_bytes': self.response_bytes / sized if sized else 0.0,
+            'histograms': {
+                'wall_ms': self.wall_ms.to_dict(),
+                'queries': self.query_counts.to_dict(),
+                'response_bytes': self.response_sizes.to_dict(),
+            },
+        }
+
+
+class ResourceAccounting:
+    """
+    Thread-safe rolling resource usage per module.
+
+    Usage is aggregated into slots of `slot_seconds`; only the slots within
+    the last `window` seconds are kept, so memory per module is bounded by
+    the number of slots times the fixed histogram sizes.
+    """
+
+    def __init__(self, window=None, slot_seconds=60):
+        if window is None:
+            window = getattr(settings, 'MODULE_ACCOUNTING_WINDOW', 900)
+        self.slot_seconds = slot_seconds
+        self.slot_count = max(1, int(window // slot_seconds))
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    @property
+    def window(self):
+        return self.slot_count * self.slot_seconds
+
+    @contextmanager
+    def measure(self, module_id, cpu=True):
+        """
+        Measure the block as one request of the module. Call finish() on the
+        yielded RequestUsage with the response; a block that raises counts as
+        an error. CPU time is per thread, so it is only measured when the
+        whole request runs on the calling thread.
+        """
+        usage = RequestUsage()
+        token = _request_usage.set(usage)
+        started = time.perf_counter()
+        cpu_started = time.thread_time() if cpu else None
+        try:
+            yield usage
+        except Http404:
+            # Becomes a 404 response, like an unavailable module
+            raise
+        except BaseException:
+            usage.error = True
+            raise
+        finally:
+            _request_usage.reset(token)
+            usage.wall_seconds = time.perf_counter() - started
+            if cpu:
+                usage.cpu_seconds = time.thread_time() - cpu_started
+            self.record(module_id, usage)
+
+    def record(self, module_id, usage):
+        slot = int(time.time() // self.slot_seconds)
+        with self._lock:
+            slots = self._slots.get(module_id)
+            if slots is None:
+                slots = self._slots[module_id] = deque(maxlen=self.slot_count)
+            if not slots or slots[-1][0] != slot:
+                slots.append((slot, ModuleUsage()))
+            slots[-1][1].add(usage)
+
+    def snapshot(self, module_id=None):
+        """Return {module_id: summary} over the rolling window, optionally for one module"""
+        oldest = int(time.time() // self.slot_seconds) - self.slot_count + 1
+        totals = {}
+        with self._lock:
+            for slots_module_id, slots in self._slots.items():
+                if module_id is not None and slots_module_id != module_id:
+                    continue
+                total = ModuleUsage()
+                for slot, usage in slots:
+                    if slot >= oldest:
+                        total.merge(usage)
+                if total.requests:
+                    totals[slots_module_id] = total
+
+        return {totals_module_id: total.summary() for totals_module_id, total in sorted(totals.items())}
+
+    def reset(self, module_id=None):
+        with self._lock:
+            if module_id is None:
+                self._slots.clear()
+            else:
+                self._slots.pop(module_id, None)
+
+
+resource_accounting = ResourceAccounting()
+
+
+def get_response_size(response):
+    """Return the response body size in bytes, or None for unsized streaming responses"""
+    if response.has_header('Content-Length'):
+        try:
+            return int(response['Content-Length'])
+        except ValueError:
+            return None
+    if getattr(response, 'streaming', False):
+        return None
+    return len(response.content)
+
+
+def account_query(execute, sql, params, many, context):
+    """Execute wrapper counting queries against the request being measured"""
+    usage = _request_usage.get()
+    if usage is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        usage.queries += 1
+        usage.query_seconds += time.perf_counter() - started
+
+
+def install_query_accounting(sender, connection, **kwargs):
+    """connection_created receiver adding account_query to the connection's execute wrappers"""
+    if account_query not in connection.execute_wrappers:
+        # First in line, so execute_wrapper() blocks popping their own wrapper leave it in place
+        connection.execute_wrappers.insert(0, account_query)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from modular_engine.models import Module
+from modular_engine.models import Module, ModuleJob, TenantModule
 
 @admin.register(Module)
 class ModuleAdmin(admin.ModelAdmin):
@@ -7,3 +7,18 @@ class ModuleAdmin(admin.ModelAdmin):
     list_filter = ('status',)
     search_fields = ('name', 'module_id', 'description', 'base_path')
     readonly_fields = ('install_date', 'update_date')
+
+
+@admin.register(TenantModule)
+class TenantModuleAdmin(admin.ModelAdmin):
+    list_display = ('tenant', 'tenant_type', 'module', 'enabled')
+    list_filter = ('tenant_type', 'enabled', 'module')
+    search_fields = ('tenant', 'module__module_id')
+
+
+@admin.register(ModuleJob)
+class ModuleJobAdmin(admin.ModelAdmin):
+    list_display = ('module_id', 'action', 'status', 'attempts', 'max_attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'action')
+    search_fields = ('module_id', 'idempotency_key', 'error')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
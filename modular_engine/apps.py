@@ -8,6 +8,20 @@ class ModularEngineConfig(AppConfig):
 
     def ready(self):
         """Initialize the module registry when the app is ready"""
+        # Tune SQLite connections, including those opened by migrations
+        from django.db.backends.signals import connection_created
+        from modular_engine.db import configure_sqlite_connection
+        connection_created.connect(
+            configure_sqlite_connection, dispatch_uid='modular_engine_sqlite_pragmas')
+
+        # Count queries against the module handling the request
+        from modular_engine.accounting import install_query_accounting
+        connection_created.connect(
+            install_query_accounting, dispatch_uid='modular_engine_query_accounting')
+
+        # Connect the tenant module map invalidation signals
+        import modular_engine.tenancy  # noqa: F401
+
         # Skip initialization during migrations
         import sys
         if 'makemigrations' in sys.argv or 'migrate' in sys.argv:
@@ -0,0 +1,41 @@
+"""
+Helpers shared by the benchmark management commands.
+"""
+import statistics
+
+
+def percentile(sorted_values, pct):
+    """Return the pct-th percentile of an already sorted list of values"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1,
+                max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    """
+    Summarize a list of per-operation latencies (in seconds) and the total
+    wall time of the run into throughput and latency percentiles (in ms).
+    """
+    ordered = sorted(latencies)
+    return {
+        'count': len(ordered),
+        'throughput': len(ordered) / elapsed if elapsed else 0.0,
+        'mean_ms': statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        'p50_ms': percentile(ordered, 50) * 1000,
+        'p95_ms': percentile(ordered, 95) * 1000,
+        'p99_ms': percentile(ordered, 99) * 1000,
+    }
+
+
+def format_summary(label, summary):
+    """Format a summary produced by summarize() as a single report line"""
+    return (
+        f"{label:<24} n={summary['count']:<7} "
+        f"{summary['throughput']:>10.1f} ops/s  "
+        f"mean={summary['mean_ms']:.3f}ms  "
+        f"p50={summary['p50_ms']:.3f}ms  "
+        f"p95={summary['p95_ms']:.3f}ms  "
+        f"p99={summary['p99_ms']:.3f}ms"
+    )
@@ -0,0 +1,132 @@
+import threading
+import types
+import zlib
+from django.conf import settings
+from django.urls import get_resolver, include, path
+
+
+def get_routing_key(request, user=None):
+    """
+    Return a stable per-client key without touching the database: the
+    authenticated user's id, whose session key changes on login, else the
+    session cookie, otherwise the client address.
+    """
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        return session_key
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def canary_bucket(module_id, routing_key):
+    """Map a client to a bucket in [0, 100), consistently for each module"""
+    return zlib.crc32(f"{module_id}:{routing_key}".encode()) % 100
+
+
+class CanaryRelease:
+    """
+    A new version of an installed module served to a percentage of clients.
+    Canary requests get their own URLconf, which mounts the new url_patterns
+    at the module's base path ahead of the regular root URLconf.
+
+    The base path is filled in while the root URLconf is built, so routing a
+    request never needs a database query.
+    """
+
+    def __init__(self, module_id, version, url_patterns, percent):
+        self.module_id = module_id
+        self.version = version
+        self.url_patterns = url_patterns
+        self.percent = percent
+        self.prefix = None
+        self._urlconf = None
+
+    @property
+    def base_path(self):
+        if self.prefix is None:
+            return None
+        return '/' if self.prefix == '/' else self.prefix.strip('/')
+
+    @base_path.setter
+    def base_path(self, base_path):
+        # None while the module is not mounted
+        if base_path is None:
+            self.prefix = None
+        else:
+            self.prefix = '/' if base_path == '/' else f"/{base_path}/"
+        self._urlconf = None
+
+    def routes_to_canary(self, request, user=None):
+        return canary_bucket(self.module_id, get_routing_key(request, user)) < self.percent
+
+    @property
+    def urlconf(self):
+        urlconf = self._urlconf
+        if urlconf is None:
+            urlconf = self._urlconf = self._build_urlconf()
+        return urlconf
+
+    def reset_urlconf(self):
+        """Drop the canary URLconf so it is rebuilt from the reloaded root URLconf"""
+        self._urlconf = None
+
+    def _build_urlconf(self):
+        route = '' if self.prefix == '/' else self.prefix.lstrip('/')
+        urlconf = types.ModuleType(f"modular_engine_canary_{self.module_id}")
+        urlconf.urlpatterns = [
+            path(route, include(self.url_patterns)),
+            *get_resolver().url_patterns,
+        ]
+        return urlconf
+
+
+class VersionStats:
+    """Thread-safe request, error and latency counters per module version"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, module_id, version, seconds, error):
+        with self._lock:
+            stats = self._stats.get((module_id, version))
+            if stats is None:
+                stats = self._stats[(module_id, version)] = {
+                    'requests': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+            stats['requests'] += 1
+            stats['errors'] += int(error)
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def snapshot(self, module_id=None):
+        """Return a list of per-version summaries, optionally for one module"""
+        with self._lock:
+            items = [(key, dict(stats)) for key, stats in self._stats.items()]
+
+        result = []
+        for (stats_module_id, version), stats in sorted(items):
+            if module_id is not None and stats_module_id != module_id:
+                continue
+            requests = stats['requests']
+            result.append({
+                'module_id': stats_module_id,
+                'version': version,
+                'requests': requests,
+                'errors': stats['errors'],
+                'error_rate': stats['errors'] / requests if requests else 0.0,
+                'avg_ms': stats['total_seconds'] / requests * 1000 if requests else 0.0,
+                'max_ms': stats['max_seconds'] * 1000,
+            })
+        return result
+
+    def reset(self, module_id=None):
+        with self._lock:
+            if module_id is None:
+                self._stats.clear()
+            else:
+                for key in [key for key in self._stats if key[0] == module_id]:
+                    del self._stats[key]
+
+
+version_stats = VersionStats()
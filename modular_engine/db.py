@@ -0,0 +1,44 @@
+import re
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# PRAGMAs applied to every new SQLite connection. Override or extend them with
+# settings.SQLITE_PRAGMAS; a value of None disables a default pragma.
+DEFAULT_SQLITE_PRAGMAS = {
+    # Readers keep reading the last committed snapshot while a writer commits
+    'journal_mode': 'WAL',
+    # Durable at checkpoints, without an fsync on every commit in WAL mode
+    'synchronous': 'NORMAL',
+    # Milliseconds to wait for a competing writer instead of raising "database is locked"
+    'busy_timeout': 5000,
+    # Negative values are KiB: keep ~20MB of pages in the per-connection cache
+    'cache_size': -20000,
+    # Memory-map up to 128MB of the database file
+    'mmap_size': 134217728,
+}
+
+PRAGMA_VALUE_RE = re.compile(r'^-?\w+$')
+
+
+def get_sqlite_pragmas():
+    """Return the effective SQLite pragmas from defaults and settings.SQLITE_PRAGMAS"""
+    pragmas = dict(DEFAULT_SQLITE_PRAGMAS)
+    pragmas.update(getattr(settings, 'SQLITE_PRAGMAS', {}))
+
+    pragmas = {name: value for name, value in pragmas.items() if value is not None}
+
+    # Pragmas can't be parameterized, so only accept plain names and values
+    for name, value in pragmas.items():
+        if not name.isidentifier() or not PRAGMA_VALUE_RE.match(str(value)):
+            raise ImproperlyConfigured(f"Invalid SQLite pragma {name}={value!r}")
+
+    return pragmas
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created receiver applying the configured pragmas to SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+
+    for name, value in get_sqlite_pragmas().items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,75 @@
+CORE_PATH = object()
+
+
+class _Node:
+    __slots__ = ('children', 'value')
+
+    def __init__(self):
+        self.children = {}
+        self.value = None
+
+
+def split_path(path):
+    """Split a URL path or base path into its non-empty segments"""
+    return [segment for segment in path.split('/') if segment]
+
+
+class PrefixTrie:
+    """
+    Trie over URL path segments. match() returns the value of the longest
+    inserted prefix of a path, walking one node per path segment.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+
+    def insert(self, path, value):
+        node = self.root
+        for segment in split_path(path):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _Node()
+            node = child
+        node.value = value
+
+    def match(self, path):
+        node = self.root
+        value = node.value
+        for segment in path.split('/'):
+            if not segment:
+                continue
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.value is not None:
+                value = node.value
+        return value
+
+
+class ModuleDispatcher:
+    """
+    Maps a request path to the module mounted at it.
+
+    Core paths and module base paths (including multi-segment ones and '/')
+    are compiled into one trie, so the longest mount point wins: a core path
+    such as 'admin' bypasses a module mounted at '/', and 'shop/catalog' is
+    told apart from 'shop'.
+    """
+
+    def __init__(self, core_paths=(), mounts=None):
+        self.trie = PrefixTrie()
+
+        # mounts are {base_path: module_id}, with '/' for the root mount
+        for base_path, module_id in (mounts or {}).items():
+            self.trie.insert(base_path, module_id)
+
+        # Core URLs come first in the root URLconf, so they win over modules
+        for core_path in core_paths:
+            self.trie.insert(core_path, CORE_PATH)
+
+    def match(self, path):
+        """Return the ID of the module serving the path, or None if it isn't gated"""
+        value = self.trie.match(path)
+        if value is CORE_PATH:
+            return None
+        return value
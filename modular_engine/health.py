@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from modular_engine.module_registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+
+def call_module_hook(hook_func, close_connections=False):
+    """
+    Call a warmup or health check function and return a result dict. A hook
+    fails by raising or by returning False.
+    """
+    started = time.perf_counter()
+    try:
+        ok = hook_func() is not False
+        error = '' if ok else 'Check failed'
+    except Exception as e:
+        ok = False
+        error = str(e)
+    finally:
+        # Pool threads must not leak their own database connections
+        if close_connections:
+            connections.close_all()
+
+    return {
+        'ok': ok,
+        'error': error,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def run_module_hooks(hook, registry=None):
+    """
+    Run the `hook` function ('warmup_func' or 'healthcheck_func') of every
+    active module, concurrently when there is more than one.
+    Returns {module_id: result}.
+    """
+    registry = registry or get_registry()
+    hook_funcs = [
+        (module_id, module_info[hook])
+        for module_id, module_info in registry.get_active_modules().items()
+        if module_info.get(hook)
+    ]
+
+    if len(hook_funcs) <= 1:
+        return {module_id: call_module_hook(hook_func) for module_id, hook_func in hook_funcs}
+
+    max_workers = min(len(hook_funcs), getattr(settings, 'MODULE_WARMUP_MAX_WORKERS', 4))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='module-hook') as executor:
+        futures = [
+            (module_id, executor.submit(call_module_hook, hook_func, close_connections=True))
+            for module_id, hook_func in hook_funcs
+        ]
+        return {module_id: future.result() for module_id, future in futures}
+
+
+def warm_up_engine():
+    """Fill the process-wide caches every module relies on"""
+    # Open the first database connection (and the pool, when configured)
+    connections['default'].ensure_connection()
+
+    # Import the root URLconf, including every module's url_patterns
+    get_resolver().url_patterns
+
+    # Fill the ContentType cache used by permission checks
+    from django.contrib.contenttypes.models import ContentType
+    ContentType.objects.get_for_models(*apps.get_models())
+
+    # Record the code generation of each module, as loaded at boot
+    get_registry().sync_code_generations()
+
+
+class WorkerReadiness:
+    """
+    Readiness of this worker process: 'cold' until warm_up() runs, 'warming'
+    while it runs and 'ready' once every module's warmup has finished.
+    """
+
+    def __init__(self):
+        self.state = 'cold'
+        self.warmup_results = {}
+        self._lock = threading.Lock()
+
+    def warm_up(self, registry=None):
+        with self._lock:
+            if self.state != 'cold':
+                return self.warmup_results
+            self.state = 'warming'
+
+        started = time.perf_counter()
+        try:
+            warm_up_engine()
+        except Exception as e:
+            # e.g. migrations haven't run yet; the health checks will tell
+            logger.warning(f"Engine warmup failed: {e}")
+
+        results = run_module_hooks('warmup_func', registry)
+        for module_id, result in results.items():
+            if not result['ok']:
+                logger.error(f"Error running warmup for module {module_id}: {result['error']}")
+
+        # Don't carry the boot thread's connections into request handling
+        connections.close_all()
+
+        self.warmup_results = results
+        self.state = 'ready'
+        logger.info(f"Worker warmed up in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return results
+
+    def check(self, registry=None):
+        """Return an (HTTP status, payload) pair for the readiness endpoint"""
+        if self.state != 'ready':
+            return 503, {'status': self.state, 'modules': {}}
+
+        results = run_module_hooks('healthcheck_func', registry)
+        healthy = all(result['ok'] for result in results.values())
+        return (200 if healthy else 503), {
+            'status': 'ready' if healthy else 'unhealthy',
+            'modules': results,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.state = 'cold'
+            self.warmup_results = {}
+
+
+readiness = WorkerReadiness()
+
+
+def warm_up_worker():
+    """
+    Warm up this worker before it accepts traffic. Called from the WSGI and
+    ASGI entry points; set MODULE_WARMUP = False to skip it.
+    """
+    if not getattr(settings, 'MODULE_WARMUP', True):
+        return
+
+    # Block on a thread of its own: ASGI servers may import the application
+    # while their event loop runs, where synchronous database access is refused
+    thread = threading.Thread(target=readiness.warm_up, name='module-warmup')
+    thread.start()
+    thread.join()
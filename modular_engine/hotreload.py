@@ -0,0 +1,84 @@
+import importlib
+import os
+import sys
+from contextlib import contextmanager
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+
+# Submodules that are imported afresh: the entry point, its URLs and views.
+# Everything else stays loaded, as importing it twice would register models,
+# admin classes or signal receivers again, or leave the new views using fresh
+# copies of per-process state (caches, indexes) that receivers of the old
+# modules keep updating.
+RELOAD_SUBMODULES = {'module', 'urls', 'views'}
+
+
+def get_reloadable_submodules(package):
+    """Return the names of the package's loaded submodules that can be re-imported"""
+    prefix = f"{package}."
+    return [
+        name for name in sys.modules
+        if name.startswith(prefix) and name[len(prefix):].split('.')[0] in RELOAD_SUBMODULES
+    ]
+
+
+@contextmanager
+def fresh_imports(package):
+    """
+    Within the block, the package's submodules are imported afresh from source.
+
+    The old module objects are removed from sys.modules rather than reloaded
+    in place, so code that is still running (e.g. in-flight requests holding
+    old views) keeps a consistent view of its own globals. If the block
+    raises, the old modules are put back and the error propagates.
+    """
+    old_modules = {name: sys.modules.pop(name) for name in get_reloadable_submodules(package)}
+
+    # `from package import views` prefers the package attribute over sys.modules
+    detached = []
+    for name, old_module in old_modules.items():
+        parent_name, _, child = name.rpartition('.')
+        parent = sys.modules.get(parent_name)
+        if parent is not None and getattr(parent, child, None) is old_module:
+            delattr(parent, child)
+            detached.append((parent, child, old_module))
+
+    importlib.invalidate_caches()
+
+    try:
+        yield
+    except BaseException:
+        for name in get_reloadable_submodules(package):
+            sys.modules.pop(name, None)
+        sys.modules.update(old_modules)
+        for parent, child, old_module in detached:
+            setattr(parent, child, old_module)
+        raise
+
+
+def evict_templates(template_dirs, name_prefix):
+    """
+    Drop cached templates that were loaded from one of `template_dirs` or
+    whose name starts with `name_prefix`, leaving every other template cached.
+    Returns the number of evicted entries.
+    """
+    template_dirs = tuple(os.path.join(os.path.abspath(path), '') for path in template_dirs)
+    evicted = 0
+
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+
+        for loader in engine.engine.template_loaders:
+            cache = getattr(loader, 'get_template_cache', None)
+            if cache is None:
+                continue
+
+            for key, template in list(cache.items()):
+                origin = getattr(template, 'origin', None)
+                path = os.path.abspath(origin.name) if origin is not None else ''
+                if key.startswith(name_prefix) or path.startswith(template_dirs):
+                    cache.pop(key, None)
+                    evicted += 1
+
+    return evicted
@@ -0,0 +1,168 @@
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from modular_engine.models import ModuleJob
+from modular_engine.module_registry import get_registry
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def _install(registry, job):
+    return registry.install_module(job.module_id, base_path=job.base_path)
+
+
+def _upgrade(registry, job):
+    return registry.upgrade_module(job.module_id)
+
+
+JOB_HANDLERS = {
+    'install': _install,
+    'upgrade': _upgrade,
+}
+
+
+def enqueue_job(action, module_id, base_path=None, idempotency_key=None):
+    """
+    Queue a module job and wake the in-process worker once the job is committed.
+
+    Returns a (job, created) tuple. An existing job is returned instead of a new
+    one when the idempotency key was already used, or when the same action is
+    already queued or running for the module.
+    """
+    if action not in JOB_HANDLERS:
+        raise ValueError(f"Unknown module job action '{action}'")
+
+    if idempotency_key:
+        existing_job = ModuleJob.objects.filter(idempotency_key=idempotency_key).first()
+        if existing_job:
+            return existing_job, False
+
+    active_job = ModuleJob.objects.filter(
+        action=action, module_id=module_id, status__in=ACTIVE_STATUSES).first()
+    if active_job:
+        return active_job, False
+
+    try:
+        with transaction.atomic():
+            job = ModuleJob.objects.create(
+                action=action,
+                module_id=module_id,
+                base_path=base_path,
+                idempotency_key=idempotency_key or None,
+                max_attempts=getattr(settings, 'MODULE_JOB_MAX_ATTEMPTS', 3),
+            )
+    except IntegrityError:
+        # A concurrent submission with the same key won the race
+        return ModuleJob.objects.get(idempotency_key=idempotency_key), False
+
+    transaction.on_commit(worker.wake)
+    return job, True
+
+
+def requeue_stale_jobs():
+    """Requeue running jobs whose worker died before finishing them"""
+    timeout = getattr(settings, 'MODULE_JOB_TIMEOUT', 600)
+    stale_before = timezone.now() - timedelta(seconds=timeout)
+    return ModuleJob.objects.filter(
+        status='running', started_at__lt=stale_before).update(status='queued')
+
+
+def claim_next_job():
+    """
+    Atomically claim the oldest due job. The conditional UPDATE only succeeds
+    for one worker, so concurrent workers never run the same job.
+    """
+    now = timezone.now()
+    candidates = ModuleJob.objects.filter(
+        status='queued', run_after__lte=now).values_list('pk', flat=True)[:10]
+
+    for job_pk in candidates:
+        claimed = ModuleJob.objects.filter(pk=job_pk, status='queued').update(
+            status='running', started_at=now, attempts=F('attempts') + 1)
+        if claimed:
+            return ModuleJob.objects.get(pk=job_pk)
+
+    return None
+
+
+def run_job(job):
+    """Run a claimed job, scheduling a retry with backoff when it fails"""
+    registry = get_registry()
+
+    try:
+        success = JOB_HANDLERS[job.action](registry, job)
+        error = '' if success else f"Failed to {job.action} module '{job.module_id}'"
+    except Exception as e:
+        logger.exception(f"Error running {job.action} job for module {job.module_id}")
+        success = False
+        error = str(e)
+
+    now = timezone.now()
+    job.error = error
+    if success:
+        job.status = 'succeeded'
+        job.finished_at = now
+    elif job.attempts < job.max_attempts:
+        job.status = 'queued'
+        job.run_after = now + timedelta(seconds=2 ** job.attempts)
+    else:
+        job.status = 'failed'
+        job.finished_at = now
+
+    job.save(update_fields=['status', 'error', 'run_after', 'finished_at'])
+    return job
+
+
+def run_pending_jobs():
+    """Run every due job in the current thread and return how many ran"""
+    requeue_stale_jobs()
+
+    count = 0
+    while (job := claim_next_job()) is not None:
+        run_job(job)
+        count += 1
+    return count
+
+
+class JobWorker:
+    """
+    In-process worker thread draining the job table. It is started lazily on
+    the first enqueued job and otherwise polls for retries that become due.
+    """
+
+    def __init__(self, poll_interval=2.0):
+        self.poll_interval = poll_interval
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    def wake(self):
+        """Start the worker if needed and make it look for jobs now"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='module-job-worker', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+            close_old_connections()
+            try:
+                run_pending_jobs()
+            except Exception:
+                logger.exception("Module job worker failed to process jobs")
+            finally:
+                close_old_connections()
+
+
+worker = JobWorker()
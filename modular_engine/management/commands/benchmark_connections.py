@@ -0,0 +1,75 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.test import Client
+from modular_engine.benchmarking import summarize, format_summary
+
+
+class Command(BaseCommand):
+    help = 'Compare request latency with unpooled, persistent and pooled database connections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Number of requests per connection mode')
+        parser.add_argument('--path', default='/module/',
+                            help='Path requested through the full middleware stack')
+        parser.add_argument('--host', default='localhost',
+                            help='Host header sent with each request')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias whose connection settings are varied')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        original = dict(connection.settings_dict)
+        original_options = dict(original.get('OPTIONS', {}))
+
+        modes = [
+            ('unpooled', {'CONN_MAX_AGE': 0}, None),
+            ('persistent', {'CONN_MAX_AGE': 600}, None),
+        ]
+        if connection.vendor == 'postgresql':
+            pool = getattr(settings, 'DATABASE_POOL_OPTIONS', True)
+            modes.append(('pooled', {'CONN_MAX_AGE': 0}, pool))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'Connection pooling requires PostgreSQL; skipping pooled mode on {connection.vendor}'))
+
+        self.stdout.write(
+            f"Requesting {options['path']} {options['requests']} times per mode")
+
+        for label, overrides, pool in modes:
+            options_dict = dict(original_options)
+            options_dict.pop('pool', None)
+            if pool is not None:
+                options_dict['pool'] = pool
+
+            connection.close()
+            connection.settings_dict.update(overrides, OPTIONS=options_dict)
+            try:
+                summary = self.run_requests(options)
+            finally:
+                connection.close()
+                if pool is not None:
+                    connection.close_pool()
+                connection.settings_dict.clear()
+                connection.settings_dict.update(original)
+
+            self.stdout.write(format_summary(label, summary))
+
+    def run_requests(self, options):
+        client = Client(HTTP_HOST=options['host'], raise_request_exception=False)
+
+        # Warm up URL resolvers, templates and module registration
+        client.get(options['path'])
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            request_started = time.perf_counter()
+            response = client.get(options['path'])
+            latencies.append(time.perf_counter() - request_started)
+            if response.status_code >= 500:
+                self.stderr.write(
+                    f"Request failed with status {response.status_code}")
+        return summarize(latencies, time.perf_counter() - started)
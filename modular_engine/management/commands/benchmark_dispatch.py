@@ -0,0 +1,83 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from modular_engine.benchmarking import summarize, format_summary
+from modular_engine.dispatch import ModuleDispatcher
+
+CORE_PATHS = ['admin', 'module', 'static', 'media', 'login', 'logout']
+
+
+def legacy_match(path, core_paths, installed_modules):
+    """
+    The previous middleware gate: only '/modular_engine/<segment>/' paths were
+    checked, by splitting the path and scanning the core path list.
+    """
+    path = path.lstrip('/')
+    if not path.startswith('modular_engine'):
+        return None
+
+    path_segments = path.split('/')
+    if len(path_segments) < 2:
+        return None
+
+    module_segment = path_segments[1]
+    if module_segment in core_paths:
+        return None
+
+    return installed_modules.get(module_segment)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the prefix trie module dispatcher against the previous path matching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modules', type=int, default=500)
+        parser.add_argument('--lookups', type=int, default=200000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Mount points of one to three segments, like 'shop' or 'shop/catalog/v2'
+        mounts = {}
+        for index in range(options['modules']):
+            segments = [f"area{rng.randrange(20)}", f"module{index}"][2 - rng.randint(1, 2):]
+            if rng.random() < 0.2:
+                segments.append('v2')
+            mounts['/'.join(segments)] = f"bench_module_{index}"
+        base_paths = list(mounts)
+
+        # The previous gate keyed modules by a single segment
+        legacy_modules = {base_path.split('/')[-1]: module_id for base_path, module_id in mounts.items()}
+        core_paths = list(CORE_PATHS)
+
+        started = time.perf_counter()
+        dispatcher = ModuleDispatcher(core_paths, mounts)
+        self.stdout.write(
+            f"{len(mounts)} mount points, trie build: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        probes = []
+        for _ in range(options['lookups']):
+            kind = rng.random()
+            if kind < 0.6:
+                probes.append(f"/{rng.choice(base_paths)}/items/{rng.randrange(1000)}/")
+            elif kind < 0.8:
+                probes.append(f"/{rng.choice(core_paths)}/page/")
+            else:
+                probes.append(f"/modular_engine/module{rng.randrange(options['modules'])}/")
+
+        for label, match in [
+            ('legacy', lambda path: legacy_match(path, core_paths, legacy_modules)),
+            ('trie', dispatcher.match),
+        ]:
+            latencies = []
+            gated = 0
+            started = time.perf_counter()
+            for path in probes:
+                probe_started = time.perf_counter()
+                module_id = match(path)
+                latencies.append(time.perf_counter() - probe_started)
+                gated += module_id is not None
+            self.stdout.write(format_summary(label, summarize(
+                latencies, time.perf_counter() - started)))
+            self.stdout.write(f"{'':<24} gated {gated} of {len(probes)} paths")
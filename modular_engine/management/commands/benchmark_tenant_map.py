@@ -0,0 +1,77 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from modular_engine.benchmarking import summarize, format_summary
+from modular_engine.models import Module, TenantModule
+from modular_engine.tenancy import TenantModuleMap
+
+
+class Command(BaseCommand):
+    help = 'Benchmark per-tenant module checks with the in-memory map against per-request ORM lookups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=1000)
+        parser.add_argument('--modules', type=int, default=50)
+        parser.add_argument('--lookups', type=int, default=200000,
+                            help='Number of in-memory map lookups')
+        parser.add_argument('--orm-lookups', type=int, default=2000,
+                            help='Number of ORM lookups (0 to skip the database comparison)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        hosts = [f"tenant{index}.example.com" for index in range(options['tenants'])]
+        module_ids = [f"bench_module_{index}" for index in range(options['modules'])]
+
+        # Every tenant gets a row per module, with roughly half of them enabled
+        rows = [
+            ('host', host, module_id, rng.random() < 0.5)
+            for host in hosts for module_id in module_ids
+        ]
+        self.stdout.write(
+            f"{options['tenants']} tenants x {options['modules']} modules = {len(rows)} rows")
+
+        started = time.perf_counter()
+        tenant_map = TenantModuleMap(rows)
+        self.stdout.write(f"Map build: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        probes = [(rng.choice(hosts), rng.choice(module_ids)) for _ in range(options['lookups'])]
+        latencies = []
+        started = time.perf_counter()
+        for host, module_id in probes:
+            probe_started = time.perf_counter()
+            tenant_map.is_scoped(module_id) and tenant_map.host_allows(host, module_id)
+            latencies.append(time.perf_counter() - probe_started)
+        self.stdout.write(format_summary('in-memory map', summarize(
+            latencies, time.perf_counter() - started)))
+
+        if options['orm_lookups']:
+            self.benchmark_orm(rows, module_ids, probes[:options['orm_lookups']])
+
+    def benchmark_orm(self, rows, module_ids, probes):
+        """Time the equivalent per-request query on temporary rows that are rolled back"""
+        with transaction.atomic():
+            modules = Module.objects.bulk_create([
+                Module(module_id=module_id, name=module_id, version='1.0.0', status='installed')
+                for module_id in module_ids
+            ])
+            module_pks = {module.module_id: module.pk for module in modules}
+            TenantModule.objects.bulk_create([
+                TenantModule(tenant_type=tenant_type, tenant=tenant,
+                             module_id=module_pks[module_id], enabled=enabled)
+                for tenant_type, tenant, module_id, enabled in rows
+            ], batch_size=5000)
+
+            latencies = []
+            started = time.perf_counter()
+            for host, module_id in probes:
+                probe_started = time.perf_counter()
+                TenantModule.objects.filter(
+                    tenant_type='host', tenant=host,
+                    module__module_id=module_id, enabled=True).exists()
+                latencies.append(time.perf_counter() - probe_started)
+            self.stdout.write(format_summary('orm per request', summarize(
+                latencies, time.perf_counter() - started)))
+
+            transaction.set_rollback(True)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from modular_engine.module_registry import get_registry, register_modules_from_settings, ModuleDependencyError
+
+
+class Command(BaseCommand):
+    help = 'Install modules and their dependencies in topological order as a single operation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('module_ids', nargs='+', help='IDs of the modules to install')
+        parser.add_argument('--base-path', action='append', default=[], metavar='MODULE_ID=PATH',
+                            help='Custom base path for a module (can be repeated)')
+
+    def handle(self, *args, **options):
+        register_modules_from_settings()
+        registry = get_registry()
+
+        base_paths = {}
+        for value in options['base_path']:
+            module_id, separator, base_path = value.partition('=')
+            if not separator:
+                raise CommandError(f"Invalid --base-path '{value}', expected MODULE_ID=PATH")
+            base_paths[module_id] = base_path
+
+        try:
+            levels = registry.resolve_install_order(options['module_ids'])
+        except ModuleDependencyError as e:
+            raise CommandError(str(e))
+
+        for index, level in enumerate(levels, start=1):
+            self.stdout.write(f"  Level {index}: {', '.join(level)}")
+
+        if not registry.install_modules(options['module_ids'], base_paths=base_paths):
+            raise CommandError('Failed to install modules, see the log for details')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Successfully installed {', '.join(options['module_ids'])}"))
@@ -1,26 +1,47 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.http import Http404
 from django.conf import settings
+from modular_engine.accounting import resource_accounting
+from modular_engine.canary import version_stats
+from modular_engine.dispatch import ModuleDispatcher
 from modular_engine.models import Module
+from modular_engine.module_registry import get_registry
+from modular_engine.routers import replica_reads, request_scope
+from modular_engine.tenancy import tenant_modules, get_request_tenant_host
 import time
 
 
 class ModularEngineMiddleware:
     """
     Combined middleware for Django Modular Engine that handles:
-    1. Module URL access control based on installation status
+    1. Per-module rate limits and concurrency caps
+    2. Module URL access control based on installation status
+    3. Canary routing of a share of clients to a new module version
+    4. Accounting of the time, CPU, queries and response bytes used per module
+    5. Hot reloading module code when another worker asked for it
 
     Notes:
     - URLs will only be reloaded manually via the module list page button
     - Or when modules are installed/uninstalled/updated
+    - The middleware is both sync and async capable, so it runs natively
+      under WSGI and ASGI without forcing a thread hop on async stacks
 
     This middleware focuses on performance by:
-    - Caching module information to reduce database queries
-    - Only handling necessary module access control
+    - Matching paths against a prefix trie of core paths and module mount
+      points, rebuilt only when the URLconf is reloaded
+    - Only querying the database for requests that target a module
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
 
+        # Run the async path when the rest of the chain is async
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
         # Module access control settings
         self.core_paths = ['admin', 'module', 'static', 'media']
 
@@ -28,81 +49,226 @@ class ModularEngineMiddleware:
         if hasattr(settings, 'CORE_PATHS'):
             self.core_paths.extend(settings.CORE_PATHS)
 
+        # (mounts, dispatcher) pair, swapped in whole when the mounts change
+        self._dispatcher = (None, None)
+
+        # Set MODULE_ACCOUNTING = False to skip per-module resource accounting
+        self.accounting = getattr(settings, 'MODULE_ACCOUNTING', True)
+
     def __call__(self, request):
-        # Get the path without the leading slash
-        path = request.path.lstrip('/')
-
-        # Check if the path starts with 'modular_engine'
-        if not path.startswith('modular_engine'):
-            # If not, bypass this middleware
-            return self.get_response(request)
-
-        # === STEP 2: Apply module URL access control ===
-        # For paths that start with 'modular_engine', extract the second segment
-        path_segments = path.split('/')
-        
-        # We need at least two segments (modular_engine/module_name)
-        if len(path_segments) < 2:
-            return self.get_response(request)
-            
-        # The second segment is the module name
-        module_segment = path_segments[1]
-        
-        # Skip if this is a core path that should bypass module checks
-        if module_segment in self.core_paths:
-            return self.get_response(request)
-
-        # Get installed modules directly from the database
-        installed_modules = self.get_installed_modules()
-
-        # Determine which module this request is for based on the path
-        target_module_id = None
-
-        # Check if this module segment maps to an installed module
-        if module_segment in installed_modules:
-            target_module_id = installed_modules[module_segment]
-
-        # If we've identified a module, check if it's accessible
-        if target_module_id:
-            # If AVAILABLE_MODULES is defined in settings, check if this module is allowed
-            if hasattr(settings, 'AVAILABLE_MODULES'):
-                if target_module_id not in settings.AVAILABLE_MODULES:
-                    raise Http404(
-                        f"Module '{target_module_id}' is not available")
-
-            # Check if the module is installed
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        # Pick up code reloads requested on other workers
+        registry = get_registry()
+        if registry.code_check_due():
+            registry.sync_code_generations()
+
+        module_id = self.get_target_module(request)
+        if module_id is None or not self.accounting:
+            return self.dispatch(request, module_id)
+
+        with resource_accounting.measure(module_id) as usage:
+            return usage.finish(self.dispatch(request, module_id))
+
+    async def __acall__(self, request):
+        """Async counterpart of __call__ using the async ORM"""
+        registry = get_registry()
+        if registry.code_check_due():
+            await sync_to_async(registry.sync_code_generations)()
+
+        module_id = self.get_target_module(request)
+        if module_id is None or not self.accounting:
+            return await self.adispatch(request, module_id)
+
+        # The request may hop between threads, so its CPU time can't be attributed
+        with resource_accounting.measure(module_id, cpu=False) as usage:
+            return usage.finish(await self.adispatch(request, module_id))
+
+    def dispatch(self, request, module_id):
+        """Apply the module's throttle, then handle the request"""
+        throttle = self.get_throttle(module_id)
+        if throttle is None:
+            return self.handle(request, module_id)
+
+        # Turn the request away before any view or database work
+        rejection, held = throttle.acquire()
+        if rejection is not None:
+            return rejection
+        try:
+            return self.handle(request, module_id)
+        finally:
+            if held:
+                throttle.release()
+
+    async def adispatch(self, request, module_id):
+        """Async version of dispatch"""
+        throttle = self.get_throttle(module_id)
+        if throttle is None:
+            return await self.ahandle(request, module_id)
+
+        rejection, held = await throttle.aacquire()
+        if rejection is not None:
+            return rejection
+        try:
+            return await self.ahandle(request, module_id)
+        finally:
+            if held:
+                await throttle.arelease()
+
+    def handle(self, request, module_id):
+        """Check access to the module, then continue with the request"""
+        # Track writes so reads after a write in this request stay on the primary
+        with request_scope():
+            self.check_module_access(request, module_id)
+
+            user = getattr(request, 'user', None) if module_id in get_registry().canaries else None
+            module_version = self.route_canary(request, module_id, user)
+            if module_version is None:
+                # Continue with the request
+                return self.get_response(request)
+
+            start = time.perf_counter()
+            response = self.get_response(request)
+            return self.record_version_response(module_version, response, start)
+
+    async def ahandle(self, request, module_id):
+        """Async version of handle"""
+        with request_scope():
+            await self.acheck_module_access(request, module_id)
+
+            user = None
+            if module_id in get_registry().canaries:
+                user = await request.auser() if hasattr(request, 'auser') else getattr(request, 'user', None)
+            module_version = self.route_canary(request, module_id, user)
+            if module_version is None:
+                return await self.get_response(request)
+
+            start = time.perf_counter()
+            response = await self.get_response(request)
+            return self.record_version_response(module_version, response, start)
+
+    def get_throttle(self, module_id):
+        """Return the rate limit and concurrency cap of the module, if it has any"""
+        if module_id is None:
+            return None
+        return get_registry().throttles.get(module_id)
+
+    def route_canary(self, request, module_id, user=None):
+        """
+        Pick the module version serving this request when the module has a
+        running canary, and return it as a (module_id, version) tuple.
+
+        Clients are bucketed by a hash of the user's id when `user` is logged
+        in, else of their session cookie (or address), so each client
+        consistently sees the same version, before and after logging in.
+        Apart from loading the user, everything is decided in memory.
+        """
+        if module_id is None:
+            return None
+
+        registry = get_registry()
+        canary = registry.canaries.get(module_id)
+        if canary is None:
+            return None
+
+        if canary.routes_to_canary(request, user):
+            # Resolve this request against the URLconf mounting the canary
+            request.urlconf = canary.urlconf
+            return module_id, canary.version
+
+        module_info = registry.modules.get(module_id) or registry.available_modules[module_id]
+        return module_id, module_info['version']
+
+    def record_version_response(self, module_version, response, start):
+        """Count the response against the module version that served it"""
+        module_id, version = module_version
+        version_stats.record(
+            module_id, version, time.perf_counter() - start, error=response.status_code >= 500)
+        response['X-Module-Version'] = version
+        return response
+
+    def check_module_access(self, request, target_module_id):
+        """Raise Http404 if the module mounted at the request path is not accessible"""
+        if target_module_id is None:
+            return
+
+        self.check_module_available(target_module_id)
+
+        with replica_reads():
+            # The mount table is per process, so confirm the module is still installed
             try:
                 module = Module.objects.get(module_id=target_module_id)
-                if module.status != 'installed':
-                    raise Http404(
-                        f"Module '{target_module_id}' is not installed")
             except Module.DoesNotExist:
                 raise Http404(f"Module '{target_module_id}' does not exist")
+            self.check_module_installed(module)
+
+            # Check that the module is enabled for this tenant
+            tenant_map = tenant_modules.get()
+            if tenant_map.is_scoped(target_module_id):
+                group_names = ()
+                user = getattr(request, 'user', None)
+                if tenant_map.needs_groups(target_module_id) and user is not None and user.is_authenticated:
+                    group_names = user.groups.values_list('name', flat=True)
+                self.check_tenant_access(request, tenant_map, target_module_id, group_names)
+
+    async def acheck_module_access(self, request, target_module_id):
+        """Async version of check_module_access"""
+        if target_module_id is None:
+            return
 
-        # Continue with the request
-        return self.get_response(request)
+        self.check_module_available(target_module_id)
 
-    def get_installed_modules(self):
+        with replica_reads():
+            try:
+                module = await Module.objects.aget(module_id=target_module_id)
+            except Module.DoesNotExist:
+                raise Http404(f"Module '{target_module_id}' does not exist")
+            self.check_module_installed(module)
+
+            tenant_map = await tenant_modules.aget()
+            if tenant_map.is_scoped(target_module_id):
+                group_names = ()
+                if tenant_map.needs_groups(target_module_id):
+                    user = await request.auser() if hasattr(request, 'auser') else getattr(request, 'user', None)
+                    if user is not None and user.is_authenticated:
+                        group_names = [name async for name in user.groups.values_list('name', flat=True)]
+                self.check_tenant_access(request, tenant_map, target_module_id, group_names)
+
+    def get_target_module(self, request):
         """
-        Get a mapping of base paths to module IDs for all installed modules.
+        Return the ID of the module mounted at the request path, or None when
+        the request bypasses module access control.
         """
-        installed_modules = {}
+        return self.get_dispatcher().match(request.path_info)
 
-        try:
-            # Query all installed modules
-            modules = Module.objects.filter(status='installed')
-
-            # Create a mapping of paths to module_ids
-            for module in modules:
-                if module.base_path == '/':
-                    # For root path, use empty string as the key
-                    installed_modules[''] = module.module_id
-                else:
-                    # Use the custom base path or module_id as the key
-                    path_key = module.base_path if module.base_path else module.module_id
-                    installed_modules[path_key] = module.module_id
-        except:
-            # If there's an error (e.g., table doesn't exist), return empty dict
-            pass
-
-        return installed_modules
+    def get_dispatcher(self):
+        """
+        Return the dispatcher for the current mount points. It is rebuilt only
+        when the root URLconf has been reloaded with a new set of mounts.
+        """
+        mounts = get_registry().get_mounts()
+        cached_mounts, dispatcher = self._dispatcher
+        if cached_mounts is not mounts:
+            dispatcher = ModuleDispatcher(self.core_paths, mounts)
+            self._dispatcher = (mounts, dispatcher)
+        return dispatcher
+
+    def check_module_available(self, module_id):
+        """Raise Http404 if the module is not allowed by AVAILABLE_MODULES"""
+        if hasattr(settings, 'AVAILABLE_MODULES'):
+            if module_id not in settings.AVAILABLE_MODULES:
+                raise Http404(f"Module '{module_id}' is not available")
+
+    def check_module_installed(self, module):
+        """Raise Http404 if the module record is not installed"""
+        if module.status != 'installed':
+            raise Http404(f"Module '{module.module_id}' is not installed")
+
+    def check_tenant_access(self, request, tenant_map, module_id, group_names=()):
+        """Raise Http404 if a tenant-scoped module is not enabled for the request's host or groups"""
+        if tenant_map.host_allows(get_request_tenant_host(request), module_id):
+            return
+        if group_names and tenant_map.groups_allow(group_names, module_id):
+            return
+        raise Http404(f"Module '{module_id}' is not enabled for this tenant")
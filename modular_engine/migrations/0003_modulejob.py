@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modular_engine', '0002_module_base_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModuleJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('install', 'Install'), ('upgrade', 'Upgrade')], max_length=20)),
+                ('module_id', models.CharField(max_length=100)),
+                ('base_path', models.CharField(blank=True, max_length=100, null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('idempotency_key', models.CharField(blank=True, help_text='Submitting the same key again returns the existing job', max_length=255, null=True, unique=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=3)),
+                ('error', models.TextField(blank=True)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='modulejob_status_run_after')],
+            },
+        ),
+    ]
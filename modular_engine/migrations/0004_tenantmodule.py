@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modular_engine', '0003_modulejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantModule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant_type', models.CharField(choices=[('host', 'Host'), ('group', 'User Group')], default='host', max_length=10)),
+                ('tenant', models.CharField(help_text='Host name (without port) or user group name', max_length=255)),
+                ('enabled', models.BooleanField(default=True)),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tenant_modules', to='modular_engine.module')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tenant_type', 'tenant', 'module'), name='unique_tenant_module')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('modular_engine', '0004_tenantmodule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='module',
+            name='code_generation',
+            field=models.PositiveIntegerField(default=0, help_text="Bumped to have every worker hot reload the module's code"),
+        ),
+    ]
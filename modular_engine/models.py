@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 MODULE_STATUS_CHOICES = [
     ('installed', 'Installed'),
@@ -16,6 +17,8 @@ class Module(models.Model):
     install_date = models.DateTimeField(null=True, blank=True)
     update_date = models.DateTimeField(null=True, blank=True)
     base_path = models.CharField(max_length=100, blank=True, help_text="Custom base path for module URLs (empty to use module_id)")
+    code_generation = models.PositiveIntegerField(
+        default=0, help_text="Bumped to have every worker hot reload the module's code")
     
     def __str__(self):
         return f"{self.name} ({self.module_id}) - {self.status}"
@@ -23,3 +26,69 @@ class Module(models.Model):
     def get_url_path(self):
         """Return the base path for the module's URL patterns"""
         return self.base_path if self.base_path else self.module_id
+
+
+TENANT_TYPE_CHOICES = [
+    ('host', 'Host'),
+    ('group', 'User Group'),
+]
+
+class TenantModule(models.Model):
+    """
+    Enables a module for a single tenant, identified by request host or user group.
+    Modules without any TenantModule rows stay available to every tenant.
+    """
+    tenant_type = models.CharField(max_length=10, choices=TENANT_TYPE_CHOICES, default='host')
+    tenant = models.CharField(max_length=255, help_text="Host name (without port) or user group name")
+    module = models.ForeignKey(Module, on_delete=models.CASCADE, related_name='tenant_modules')
+    enabled = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant_type', 'tenant', 'module'], name='unique_tenant_module'),
+        ]
+
+    def __str__(self):
+        state = 'enabled' if self.enabled else 'disabled'
+        return f"{self.module.module_id} for {self.tenant_type} {self.tenant} - {state}"
+
+
+JOB_ACTION_CHOICES = [
+    ('install', 'Install'),
+    ('upgrade', 'Upgrade'),
+]
+
+JOB_STATUS_CHOICES = [
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('succeeded', 'Succeeded'),
+    ('failed', 'Failed'),
+]
+
+class ModuleJob(models.Model):
+    """Background job that installs or upgrades a module outside the request"""
+    action = models.CharField(max_length=20, choices=JOB_ACTION_CHOICES)
+    module_id = models.CharField(max_length=100)
+    base_path = models.CharField(max_length=100, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=JOB_STATUS_CHOICES, default='queued')
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True, help_text="Submitting the same key again returns the existing job")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='modulejob_status_run_after'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.module_id} - {self.status}"
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
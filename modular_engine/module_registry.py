@@ -1,24 +1,58 @@
 import logging
 import importlib
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps
 from django.conf import settings
 from django.urls import clear_url_caches, include, path, get_resolver, set_urlconf
 from django.utils import timezone
-from django.db import connection
+from django.db import connection, connections, transaction
 from django.db import DatabaseError
+from django.db.models import F
+from modular_engine.canary import CanaryRelease
+from modular_engine.hotreload import evict_templates, fresh_imports
 from modular_engine.models import Module
+from modular_engine.routers import replica_reads
+from modular_engine.throttling import ModuleThrottle
+from modular_engine.urlcache import url_cache
 
 logger = logging.getLogger(__name__)
 
 
+class ModuleDependencyError(Exception):
+    """Raised when module dependencies are missing or form a cycle"""
+
+
 class ModuleRegistry:
     """Class to handle registration and management of modules"""
 
     def __init__(self):
         self.modules = {}
         self.available_modules = {}
-
-    def register_module(self, module_id, name, description, version, app_name, setup_func=None, url_patterns=None):
-        """Register a module in the registry"""
+        self.canaries = {}
+        self.throttles = {}
+        # {base_path: module_id} of the modules mounted in the root URLconf
+        self.mounts = {}
+        self._hot_reload_lock = threading.Lock()
+        # {module_id: code generation} this worker runs; see sync_code_generations()
+        self.code_generations = {}
+        self._code_checked_at = None
+        self._code_check_lock = threading.Lock()
+
+    def register_module(self, module_id, name, description, version, app_name, setup_func=None, url_patterns=None,
+                        requires=None, warmup_func=None, healthcheck_func=None, max_concurrency=None,
+                        rate_limit=None):
+        """
+        Register a module in the registry.
+        `requires` lists the module IDs that must be installed before this one.
+        `warmup_func` runs when a worker boots, before it takes traffic, and
+        `healthcheck_func` backs the /module/health/ readiness endpoint.
+        `max_concurrency` caps the module's in-flight requests and `rate_limit`
+        (e.g. '100/s' or '600/m') its request rate; see ModuleThrottle.
+        """
         self.available_modules[module_id] = {
             'module_id': module_id,
             'name': name,
@@ -27,77 +61,209 @@ class ModuleRegistry:
             'app_name': app_name,
             'setup_func': setup_func,
             'url_patterns': url_patterns,
+            'requires': list(requires or []),
+            'warmup_func': warmup_func,
+            'healthcheck_func': healthcheck_func,
+            'max_concurrency': max_concurrency,
+            'rate_limit': rate_limit,
         }
 
+        if max_concurrency or rate_limit:
+            # Re-registering, e.g. on hot reload, keeps an unchanged throttle:
+            # requests in flight hold its slots and release them there
+            throttle = self.throttles.get(module_id)
+            if throttle is None or (throttle.max_concurrency, throttle.rate_limit) != (max_concurrency, rate_limit):
+                self.throttles[module_id] = ModuleThrottle(module_id, max_concurrency, rate_limit)
+        else:
+            self.throttles.pop(module_id, None)
+
         # Just clear URL caches instead of using signals
         clear_url_caches()
 
-    def install_module(self, module_id, base_path=None):
-        """Install a module and mark it as installed in the database"""
-
-        if module_id not in self.available_modules:
-            logger.error(f"Module {module_id} not found in registry")
-            return False
-
-        module_info = self.available_modules[module_id]
-
-        # Run setup function if provided
-        if module_info.get('setup_func'):
-            try:
-                module_info['setup_func']()
-            except Exception as e:
-                logger.error(
-                    f"Error running setup for module {module_id}: {e}")
-                return False
+    def get_dependency_graph(self):
+        """Return the dependency DAG as a mapping of module ID to required module IDs"""
+        return {
+            module_id: list(module_info.get('requires', []))
+            for module_id, module_info in self.available_modules.items()
+        }
 
-        # Check if module already exists to determine dates
-        module_exists = Module.objects.filter(module_id=module_id).exists()
-        old_path = ""
+    def get_dependents(self, module_id):
+        """Return the active modules that require the given module"""
+        return [
+            active_id for active_id, module_info in self.modules.items()
+            if module_id in module_info.get('requires', [])
+        ]
+
+    def resolve_install_order(self, module_ids):
+        """
+        Resolve the dependency closure of module_ids into topologically ordered
+        levels. Every module comes after its requirements, and the modules of a
+        level don't depend on each other. Raises ModuleDependencyError when a
+        requirement is not registered or the requirements form a cycle.
+        """
+        # Collect the closure of the requested modules
+        closure = set()
+        pending = list(module_ids)
+        while pending:
+            module_id = pending.pop()
+            if module_id in closure:
+                continue
+            if module_id not in self.available_modules:
+                raise ModuleDependencyError(f"Module {module_id} not found in registry")
+            closure.add(module_id)
+            pending.extend(self.available_modules[module_id].get('requires', []))
+
+        # Kahn's algorithm, keeping each wave of ready modules as a level
+        remaining = {}
+        dependents = defaultdict(list)
+        for module_id in closure:
+            requires = set(self.available_modules[module_id].get('requires', []))
+            remaining[module_id] = len(requires)
+            for required_id in requires:
+                dependents[required_id].append(module_id)
+
+        levels = []
+        level = sorted(module_id for module_id, count in remaining.items() if count == 0)
+        while level:
+            levels.append(level)
+            next_level = []
+            for module_id in level:
+                for dependent_id in dependents[module_id]:
+                    remaining[dependent_id] -= 1
+                    if remaining[dependent_id] == 0:
+                        next_level.append(dependent_id)
+            level = sorted(next_level)
+
+        if sum(len(level) for level in levels) != len(closure):
+            ordered = {module_id for level in levels for module_id in level}
+            cycle = ', '.join(sorted(closure - ordered))
+            raise ModuleDependencyError(f"Circular dependency between modules: {cycle}")
+
+        return levels
 
-        if module_exists:
-            try:
-                existing_module = Module.objects.get(module_id=module_id)
-                old_path = existing_module.base_path
-            except:
-                pass
+    def install_module(self, module_id, base_path=None):
+        """Install a module, and any missing dependencies, and mark it as installed in the database"""
+        base_paths = {module_id: base_path} if base_path is not None else None
+        return self.install_modules([module_id], base_paths=base_paths)
 
-        defaults = {
-            'name': module_info['name'],
-            'description': module_info['description'],
-            'version': module_info['version'],
-            'status': 'installed',
-        }
+    def install_modules(self, module_ids, base_paths=None):
+        """
+        Install modules together with their missing dependencies as one operation.
 
-        # If base_path is provided, save it
-        if base_path is not None:
-            defaults['base_path'] = base_path
+        Setup functions run level by level in dependency order, with the
+        independent setup functions of a level running concurrently in a thread
+        pool. Once every setup succeeded, all module records are written in a
+        single transaction and URLs are reloaded once. If any setup fails,
+        nothing is recorded.
 
-        # Set dates based on whether the module exists
-        if not module_exists:
-            defaults['install_date'] = timezone.now()
-        else:
-            defaults['update_date'] = timezone.now()
+        `base_paths` optionally maps module IDs to a custom base path.
+        """
+        base_paths = base_paths or {}
 
-        # Update or create the module record
-        module, created = Module.objects.update_or_create(
-            module_id=module_id,
-            defaults=defaults
-        )
+        try:
+            levels = self.resolve_install_order(module_ids)
+        except ModuleDependencyError as e:
+            logger.error(f"Cannot install modules {', '.join(module_ids)}: {e}")
+            return False
 
-        # Add module to active modules
-        self.modules[module_id] = module_info
+        # Requested modules are always (re)installed, dependencies only when missing
+        requested = set(module_ids)
+        levels = [
+            [module_id for module_id in level if module_id in requested or module_id not in self.modules]
+            for level in levels
+        ]
+        levels = [level for level in levels if level]
 
-        # If base_path was provided and changed, reload URLs directly
-        if base_path is not None and base_path != old_path:
-            logger.info(
-                f"Module path changed for {module_id} from '{old_path}' to '{base_path}'")
-            self._reload_urls()
+        for level in levels:
+            if not self._run_setup_funcs(level):
+                return False
 
-        # Reload URLs
+        install_order = [module_id for level in levels for module_id in level]
+        now = timezone.now()
+
+        with transaction.atomic():
+            existing_modules = Module.objects.in_bulk(install_order, field_name='module_id')
+
+            for module_id in install_order:
+                module_info = self.available_modules[module_id]
+                existing_module = existing_modules.get(module_id)
+
+                defaults = {
+                    'name': module_info['name'],
+                    'description': module_info['description'],
+                    'version': module_info['version'],
+                    'status': 'installed',
+                }
+
+                # If base_path is provided, save it
+                base_path = base_paths.get(module_id)
+                if base_path is not None:
+                    defaults['base_path'] = base_path
+                    old_path = existing_module.base_path if existing_module else ""
+                    if base_path != old_path:
+                        logger.info(
+                            f"Module path changed for {module_id} from '{old_path}' to '{base_path}'")
+
+                # Set dates based on whether the module exists
+                if existing_module is None:
+                    defaults['install_date'] = now
+                else:
+                    defaults['update_date'] = now
+
+                Module.objects.update_or_create(module_id=module_id, defaults=defaults)
+
+        # Add modules to active modules
+        for module_id in install_order:
+            self.modules[module_id] = self.available_modules[module_id]
+
+        # Reload URLs once for the whole batch
         self._reload_urls()
 
         return True
 
+    def _run_setup_funcs(self, module_ids):
+        """
+        Run the setup functions of independent modules, concurrently when there
+        is more than one. Returns True if all of them succeeded.
+        """
+        setup_funcs = [
+            (module_id, self.available_modules[module_id]['setup_func'])
+            for module_id in module_ids
+            if self.available_modules[module_id].get('setup_func')
+        ]
+
+        if len(setup_funcs) <= 1:
+            results = [(module_id, self._call_setup_func(setup_func))
+                       for module_id, setup_func in setup_funcs]
+        else:
+            max_workers = min(len(setup_funcs), getattr(settings, 'MODULE_SETUP_MAX_WORKERS', 4))
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='module-setup') as executor:
+                futures = [
+                    (module_id, executor.submit(self._call_setup_func, setup_func, close_connections=True))
+                    for module_id, setup_func in setup_funcs
+                ]
+                results = [(module_id, future.result()) for module_id, future in futures]
+
+        success = True
+        for module_id, error in results:
+            if error is not None:
+                logger.error(f"Error running setup for module {module_id}: {error}")
+                success = False
+        return success
+
+    @staticmethod
+    def _call_setup_func(setup_func, close_connections=False):
+        """Call a setup function and return the raised exception, if any"""
+        try:
+            setup_func()
+        except Exception as e:
+            return e
+        finally:
+            # Pool threads must not leak their own database connections
+            if close_connections:
+                connections.close_all()
+        return None
+
     def uninstall_module(self, module_id):
         """Uninstall a module and mark it as not installed in the database"""
 
@@ -105,6 +271,12 @@ class ModuleRegistry:
             logger.error(f"Module {module_id} not found in active modules")
             return False
 
+        dependents = self.get_dependents(module_id)
+        if dependents:
+            logger.error(
+                f"Module {module_id} is required by installed modules: {', '.join(dependents)}")
+            return False
+
         # Update the module record
         try:
             module = Module.objects.get(module_id=module_id)
@@ -116,6 +288,7 @@ class ModuleRegistry:
 
         # Remove module from active modules
         self.modules.pop(module_id, None)
+        self.canaries.pop(module_id, None)
 
         # Reload URLs
         self._reload_urls()
@@ -129,7 +302,8 @@ class ModuleRegistry:
             return False
 
         try:
-            module = Module.objects.get(module_id=module_id)
+            with replica_reads():
+                module = Module.objects.get(module_id=module_id)
             registered_version = self.available_modules[module_id]['version']
 
             if module.version != registered_version:
@@ -169,6 +343,189 @@ class ModuleRegistry:
             logger.error(f"Module {module_id} not found in database")
             return False
 
+    def hot_reload_module(self, module_id):
+        """
+        Re-import a module's code in this process and swap in its new
+        url_patterns and hooks without a restart. Requests already running
+        finish on the old code; only this module's templates are evicted
+        from the template caches.
+        """
+        if module_id not in self.available_modules:
+            logger.error(f"Module {module_id} not found in registry")
+            return False
+
+        with self._hot_reload_lock:
+            previous_info = self.available_modules[module_id]
+
+            try:
+                # The package's 'module' entry point re-imports its urls and views
+                with fresh_imports(module_id):
+                    module = importlib.import_module(f"{module_id}.module")
+                    module.register(self)
+            except Exception as e:
+                self.available_modules[module_id] = previous_info
+                logger.error(f"Error hot reloading module {module_id}: {e}")
+                return False
+
+            if module_id in self.modules:
+                self.modules[module_id] = self.available_modules[module_id]
+
+            # The root URLconf embeds the module's patterns, so it is rebuilt
+            self._reload_urls()
+
+            app_name = self.available_modules[module_id]['app_name']
+            template_dirs = []
+            try:
+                template_dirs.append(os.path.join(apps.get_app_config(app_name).path, 'templates'))
+            except LookupError:
+                pass
+            evicted = evict_templates(template_dirs, f"{app_name}/")
+
+        logger.info(
+            f"Hot reloaded module {module_id} {self.available_modules[module_id]['version']}"
+            f" ({evicted} cached templates evicted)")
+        return True
+
+    def request_hot_reload(self, module_id):
+        """
+        Hot reload a module in every worker: bump its code generation in the
+        database, which the other workers pick up in sync_code_generations(),
+        and reload it in this worker right away.
+        """
+        if module_id not in self.available_modules:
+            logger.error(f"Module {module_id} not found in registry")
+            return False
+
+        modules = Module.objects.filter(module_id=module_id)
+        if not modules.update(code_generation=F('code_generation') + 1):
+            logger.error(f"Module {module_id} not found in database")
+            return False
+
+        self.code_generations[module_id] = modules.values_list('code_generation', flat=True).get()
+        return self.hot_reload_module(module_id)
+
+    def code_check_due(self):
+        """Whether sync_code_generations() would look at the database now"""
+        checked_at = self._code_checked_at
+        return checked_at is None or time.monotonic() - checked_at >= getattr(
+            settings, 'MODULE_CODE_CHECK_SECONDS', 5)
+
+    def sync_code_generations(self):
+        """
+        Hot reload the modules whose code generation was bumped since this
+        worker last looked, at most every MODULE_CODE_CHECK_SECONDS. The first
+        check, at boot, only records the generations of the code just loaded.
+        """
+        # One thread checks; the others carry on with the code they have
+        if not self._code_check_lock.acquire(blocking=False):
+            return
+        try:
+            if not self.code_check_due():
+                return
+            self._code_checked_at = time.monotonic()
+
+            try:
+                generations = list(Module.objects.values_list('module_id', 'code_generation'))
+            except DatabaseError:
+                # e.g. the table doesn't exist yet
+                return
+
+            for module_id, generation in generations:
+                known = self.code_generations.setdefault(module_id, generation)
+                if generation > known:
+                    # Recorded even if the reload fails, so broken code isn't retried on every check
+                    self.code_generations[module_id] = generation
+                    if module_id in self.available_modules:
+                        self.hot_reload_module(module_id)
+        finally:
+            self._code_check_lock.release()
+
+    def start_canary(self, module_id, version, url_patterns, percent):
+        """
+        Serve `url_patterns` as `version` of an installed module to `percent`
+        percent of clients, side by side with the current version. The canary
+        is mounted at the module's base path once the URLconf is (re)loaded.
+        """
+        if module_id not in self.modules:
+            logger.error(f"Module {module_id} not installed")
+            return False
+
+        if not 0 <= percent <= 100:
+            logger.error(f"Canary percentage for module {module_id} must be between 0 and 100")
+            return False
+
+        self.canaries[module_id] = CanaryRelease(module_id, version, url_patterns, percent)
+
+        # Rebuild the root URLconf so the canary learns the module's base path
+        self._reload_urls()
+
+        logger.info(f"Started canary {version} of module {module_id} for {percent}% of clients")
+        return True
+
+    def start_canary_from_code(self, module_id, percent):
+        """
+        Import the module's code afresh, as hot_reload_module() does, and
+        serve it as a canary to `percent` percent of clients. Everyone else
+        keeps the code that is running now. The new code must declare a
+        different version.
+        """
+        if module_id not in self.modules:
+            logger.error(f"Module {module_id} not installed")
+            return False
+
+        with self._hot_reload_lock:
+            # The new code registers itself with a scratch registry
+            staging = ModuleRegistry()
+            try:
+                with fresh_imports(module_id):
+                    module = importlib.import_module(f"{module_id}.module")
+                    module.register(staging)
+                module_info = staging.available_modules[module_id]
+            except Exception as e:
+                logger.error(f"Error loading canary code of module {module_id}: {e}")
+                return False
+
+        if module_info['version'] == self.modules[module_id]['version']:
+            logger.error(f"Canary of module {module_id} must have a new version, not {module_info['version']}")
+            return False
+
+        return self.start_canary(module_id, module_info['version'], module_info['url_patterns'], percent)
+
+    def set_canary_percent(self, module_id, percent):
+        """Change the share of clients routed to a running canary"""
+        canary = self.canaries.get(module_id)
+        if canary is None or not 0 <= percent <= 100:
+            return False
+
+        canary.percent = percent
+        return True
+
+    def stop_canary(self, module_id):
+        """Route every client back to the current version of the module"""
+        return self.canaries.pop(module_id, None) is not None
+
+    def promote_canary(self, module_id):
+        """Make the canary the registered version of the module and upgrade to it"""
+        canary = self.canaries.pop(module_id, None)
+        if canary is None:
+            logger.error(f"Module {module_id} has no running canary")
+            return False
+
+        self.available_modules[module_id].update(
+            version=canary.version, url_patterns=canary.url_patterns)
+
+        if not self.upgrade_module(module_id):
+            return False
+
+        self._reload_urls()
+        return True
+
+    def get_mounts(self):
+        """Return the {base_path: module_id} mount points of the root URLconf"""
+        # Loading the root URLconf records the mount points
+        get_resolver().url_patterns
+        return self.mounts
+
     def update_module_path(self, module_id, new_base_path):
         """Update the base path for a module"""
         if module_id not in self.available_modules:
@@ -213,17 +570,20 @@ class ModuleRegistry:
             base_path = ''
 
             try:
-                module = Module.objects.get(module_id=module_id)
+                with replica_reads():
+                    module = Module.objects.get(module_id=module_id)
                 status = module.status
                 install_date = module.install_date
                 update_date = module.update_date
                 base_path = module.base_path
 
                 # Check if upgrade is available
-                if status == 'installed' and self.check_upgrade_available(module_id):
+                if status == 'installed' and module.version != version:
                     status = 'upgrade_available'
-                    module.status = status
-                    module.save()
+                    # Flag it with a conditional UPDATE on the primary; saving the
+                    # replica's copy could overwrite newer values there
+                    Module.objects.filter(module_id=module_id, status='installed').exclude(
+                        version=version).update(status=status)
             except Module.DoesNotExist:
                 pass
 
@@ -235,7 +595,9 @@ class ModuleRegistry:
                 'status': status,
                 'install_date': install_date,
                 'update_date': update_date,
-                'base_path': base_path
+                'base_path': base_path,
+                'canary': self.canaries.get(module_id),
+                'code_generation': self.code_generations.get(module_id, 0),
             })
 
         return result
@@ -248,6 +610,13 @@ class ModuleRegistry:
         # Reset the URLconf for the current thread
         set_urlconf(None)
 
+        # Drop route templates compiled for the previous URLconf
+        url_cache.clear()
+
+        # Canary URLconfs embed the root patterns, so rebuild them lazily
+        for canary in self.canaries.values():
+            canary.reset_urlconf()
+
         # Reload main URLconf module if needed
         if hasattr(settings, 'ROOT_URLCONF'):
             import sys
@@ -331,6 +700,7 @@ def get_module_url_patterns():
     The base path for each module is determined from the Module model.
     """
     module_patterns = []
+    mounts = {}
     registry = get_registry()
 
     # Include URL patterns for all available modules
@@ -344,6 +714,11 @@ def get_module_url_patterns():
 
             # Get the base path (custom or default)
             base_path = module.get_url_path()
+            mounts[base_path] = module_id
+
+            # Let a running canary match requests under the same base path
+            if module_id in registry.canaries:
+                registry.canaries[module_id].base_path = base_path
 
             # Create the URL pattern with the appropriate base path
             if base_path == '/':
@@ -358,7 +733,11 @@ def get_module_url_patterns():
                 )
         except Module.DoesNotExist:
             # Module not in database, dont add the module to the url patterns
-            pass
+            if module_id in registry.canaries:
+                registry.canaries[module_id].base_path = None
+
+    # Swapped in whole, so the middleware sees either the old or the new mounts
+    registry.mounts = mounts
 
     return module_patterns
 
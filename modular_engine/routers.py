@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+
+# Set while running code whose reads may be served by the replica
+_replica_reads = ContextVar('modular_engine_replica_reads', default=False)
+
+# Per-request routing state, installed by ModularEngineMiddleware
+_request_state = ContextVar('modular_engine_request_db_state', default=None)
+
+
+class RequestDatabaseState:
+    """Mutable routing state shared by everything running for one request"""
+    __slots__ = ('pinned',)
+
+    def __init__(self):
+        self.pinned = False
+
+
+def get_replica_alias():
+    """Return the configured replica alias, or None when no replica is configured"""
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in connections.settings else None
+
+
+@contextmanager
+def replica_reads():
+    """
+    Allow read queries in this block to be routed to the replica.
+    Also usable as a decorator on sync functions.
+    """
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def request_scope():
+    """
+    Track writes for the duration of a request. The state object is mutable,
+    so writes made by views running in sync_to_async threads still pin the
+    rest of the request to the primary.
+    """
+    token = _request_state.set(RequestDatabaseState())
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+
+
+def is_pinned_to_primary():
+    """Return True if the current request has already written to the primary"""
+    state = _request_state.get()
+    return state is not None and state.pinned
+
+
+class ReplicaRouter:
+    """
+    Database router sending opted-in reads (see replica_reads()) to the replica
+    alias. After any write, the remaining reads of the request go to the
+    primary so a request always sees its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or is_pinned_to_primary():
+            return None
+        return get_replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica mirrors the primary, so objects may relate across them
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema through replication
+        if db == get_replica_alias():
+            return False
+        return None
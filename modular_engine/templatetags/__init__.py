@@ -0,0 +1 @@
+# Template tags package 
\ No newline at end of file
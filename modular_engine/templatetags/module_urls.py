@@ -0,0 +1,17 @@
+from django import template
+from modular_engine.urlcache import url_cache
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def module_url(context, viewname, *args, **kwargs):
+    """
+    Like {% url %}, but builds the URL from a cached route template, e.g.
+    {% module_url 'product_detail' product.id %}
+    """
+    # Look up the URLconf, script prefix and language once per render
+    bound = context.render_context.get(url_cache)
+    if bound is None:
+        bound = context.render_context[url_cache] = url_cache.bind()
+    return bound.reverse(viewname, args=args, kwargs=kwargs)
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http.request import split_domain_port
+from modular_engine.models import Module, TenantModule
+
+EMPTY = frozenset()
+
+
+def get_request_tenant_host(request):
+    """Return the lower-cased request host without its port"""
+    domain, _ = split_domain_port(request.get_host())
+    return domain
+
+
+class TenantModuleMap:
+    """
+    Immutable snapshot of per-tenant module enablement.
+
+    Hosts and groups map to frozensets of enabled module IDs, so checking a
+    request is a dict lookup plus a set membership test. Modules that no
+    tenant row mentions are unscoped and stay available to everyone.
+    """
+
+    def __init__(self, rows=()):
+        hosts = defaultdict(set)
+        groups = defaultdict(set)
+        scoped = set()
+
+        # rows are (tenant_type, tenant, module_id, enabled) tuples
+        for tenant_type, tenant, module_id, enabled in rows:
+            scoped.add(module_id)
+            if not enabled:
+                continue
+            if tenant_type == 'host':
+                hosts[tenant.lower()].add(module_id)
+            else:
+                groups[tenant].add(module_id)
+
+        self.hosts = {host: frozenset(ids) for host, ids in hosts.items()}
+        self.groups = {group: frozenset(ids) for group, ids in groups.items()}
+        self.scoped_modules = frozenset(scoped)
+        self.group_modules = frozenset().union(*self.groups.values())
+
+    def is_scoped(self, module_id):
+        """Return True if access to the module depends on the tenant"""
+        return module_id in self.scoped_modules
+
+    def host_allows(self, host, module_id):
+        return module_id in self.hosts.get(host, EMPTY)
+
+    def needs_groups(self, module_id):
+        """Return True if some user group enables the module"""
+        return module_id in self.group_modules
+
+    def groups_allow(self, group_names, module_id):
+        return any(module_id in self.groups.get(name, EMPTY) for name in group_names)
+
+
+class TenantModuleCache:
+    """
+    Process-local cache of the TenantModuleMap. It is loaded lazily and
+    dropped whenever a TenantModule or Module row changes in this process.
+    Other processes only learn about changes by reloading it, which they do
+    once it is MODULE_TENANT_MAP_MAX_AGE seconds old.
+    """
+
+    def __init__(self):
+        self._map = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _fresh_map(self):
+        """The cached map, or None if there is none or it has expired"""
+        tenant_map = self._map
+        if tenant_map is not None and time.monotonic() - self._loaded_at < getattr(
+                settings, 'MODULE_TENANT_MAP_MAX_AGE', 5):
+            return tenant_map
+        return None
+
+    def get(self):
+        tenant_map = self._fresh_map()
+        if tenant_map is not None:
+            return tenant_map
+
+        with self._lock:
+            tenant_map = self._fresh_map()
+            if tenant_map is not None:
+                return tenant_map
+            generation = self._generation
+
+        loaded_at = time.monotonic()
+        tenant_map = self._load()
+
+        with self._lock:
+            # Don't keep a snapshot that was invalidated while loading
+            if generation == self._generation:
+                self._map = tenant_map
+                self._loaded_at = loaded_at
+        return tenant_map
+
+    async def aget(self):
+        tenant_map = self._fresh_map()
+        if tenant_map is not None:
+            return tenant_map
+        return await sync_to_async(self.get)()
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._map = None
+
+    def _load(self):
+        try:
+            rows = TenantModule.objects.values_list(
+                'tenant_type', 'tenant', 'module__module_id', 'enabled')
+            return TenantModuleMap(rows)
+        except DatabaseError:
+            # e.g. the table doesn't exist yet; don't cache the failure
+            self.invalidate()
+            return TenantModuleMap()
+
+
+tenant_modules = TenantModuleCache()
+
+
+@receiver(post_save, sender=TenantModule)
+@receiver(post_delete, sender=TenantModule)
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def invalidate_tenant_modules(sender, **kwargs):
+    tenant_modules.invalidate()
@@ -1,18 +1,45 @@
-from django.test import TestCase, Client, RequestFactory
+from django.test import TestCase, SimpleTestCase, Client, RequestFactory, AsyncRequestFactory
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.contrib.auth.models import User
-from django.urls import path
+from django.contrib.auth.models import User, Group
+from django.urls import path, include, resolve, set_urlconf, set_script_prefix, clear_script_prefix, NoReverseMatch
+from django.template import Context, Template
 from django.http import HttpResponse, Http404
+from django.contrib.auth.models import AnonymousUser
 from django.utils import timezone
 from django.conf import settings
+from django.core.management import call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, OperationalError
+from django.db.models import F
 
 import datetime
+import os
+import sys
+import shutil
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
 from unittest.mock import patch, MagicMock
 
-from modular_engine.models import Module
-from modular_engine.module_registry import ModuleRegistry, registry
+from modular_engine.models import Module, ModuleJob, TenantModule
+from modular_engine.tenancy import TenantModuleMap, tenant_modules
+from modular_engine.jobs import enqueue_job, run_pending_jobs, claim_next_job
+from modular_engine.module_registry import ModuleRegistry, ModuleDependencyError, registry, get_module_url_patterns
+from modular_engine.dispatch import ModuleDispatcher
 from modular_engine.middleware import ModularEngineMiddleware
+from modular_engine.canary import CanaryRelease, canary_bucket, version_stats
+from modular_engine.urlcache import url_cache
+from modular_engine.health import readiness, warm_up_worker
+from modular_engine.hotreload import evict_templates
+from modular_engine.accounting import Histogram, ResourceAccounting, resource_accounting
+from modular_engine.throttling import ModuleThrottle, TokenBucket, parse_rate
+from modular_engine.benchmarking import percentile, summarize
+from modular_engine.db import get_sqlite_pragmas
+from modular_engine.routers import ReplicaRouter, replica_reads, request_scope
 
 
 class ModuleModelTest(TestCase):
@@ -262,9 +289,11 @@ class ModuleViewsTest(TestCase):
             self.assertEqual(len(response.context['modules']), 2)
 
     def test_install_module_view(self):
-        """Test the install module view"""
-        with patch('modular_engine.views.get_registry') as mock_get_registry:
+        """Test that the install module view queues a job"""
+        with patch('modular_engine.views.get_registry') as mock_get_registry, \
+                patch('modular_engine.jobs.get_registry', mock_get_registry):
             mock_registry = MagicMock()
+            mock_registry.available_modules = {'uninstalled_module': {}}
             mock_registry.install_module.return_value = True
             mock_get_registry.return_value = mock_registry
 
@@ -277,9 +306,18 @@ class ModuleViewsTest(TestCase):
             self.assertRedirects(response, reverse(
                 'modular_engine:module_list'))
 
-            # Check that the module was installed with base_path=None
+            # The request only queues the job
+            mock_registry.install_module.assert_not_called()
+            job = ModuleJob.objects.get(module_id='uninstalled_module')
+            self.assertEqual(job.action, 'install')
+            self.assertEqual(job.status, 'queued')
+
+            # Check that the worker installs the module with base_path=None
+            run_pending_jobs()
             mock_registry.install_module.assert_called_once_with(
                 'uninstalled_module', base_path=None)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'succeeded')
 
     def test_uninstall_module_view(self):
         """Test the uninstall module view"""
@@ -302,9 +340,11 @@ class ModuleViewsTest(TestCase):
                 'test_module')
 
     def test_upgrade_module_view(self):
-        """Test the upgrade module view"""
-        with patch('modular_engine.views.get_registry') as mock_get_registry:
+        """Test that the upgrade module view queues a job"""
+        with patch('modular_engine.views.get_registry') as mock_get_registry, \
+                patch('modular_engine.jobs.get_registry', mock_get_registry):
             mock_registry = MagicMock()
+            mock_registry.available_modules = {'test_module': {}}
             mock_registry.upgrade_module.return_value = True
             mock_get_registry.return_value = mock_registry
 
@@ -317,7 +357,8 @@ class ModuleViewsTest(TestCase):
             self.assertRedirects(response, reverse(
                 'modular_engine:module_list'))
 
-            # Check that the module was upgraded
+            # Check that the worker upgrades the module
+            run_pending_jobs()
             mock_registry.upgrade_module.assert_called_once_with('test_module')
 
     def test_update_module_path_view(self):
@@ -343,7 +384,7 @@ class ModuleViewsTest(TestCase):
                 
     def test_reload_urls_view(self):
         """Test the reload urls view"""
-        with patch('modular_engine.views.clear_url_caches') as mock_clear_caches:
+        with patch('modular_engine.views.get_registry') as mock_get_registry:
             response = self.client.post(
                 reverse('modular_engine:reload_urls')
             )
@@ -352,8 +393,14 @@ class ModuleViewsTest(TestCase):
             self.assertRedirects(response, reverse(
                 'modular_engine:module_list'))
 
-            # Check that URL caches were cleared
-            mock_clear_caches.assert_called_once()
+            # The registry rebuilds the root and canary URLconfs
+            mock_get_registry.return_value._reload_urls.assert_called_once()
+
+        # A mutating action: POST only, staff only
+        self.assertEqual(self.client.get(reverse('modular_engine:reload_urls')).status_code, 405)
+        self.client.logout()
+        response = self.client.post(reverse('modular_engine:reload_urls'))
+        self.assertNotEqual(response.status_code, 200)
 
 
 class ModuleIntegrationTest(TestCase):
@@ -472,6 +519,15 @@ class ModularEngineMiddlewareTest(TestCase):
         # Add only the installed module to active modules
         registry.modules["installed_module"] = registry.available_modules["installed_module"]
 
+        # Mount points as recorded by get_module_url_patterns
+        self.mounts = {
+            'installed_module': 'installed_module',
+            'uninstalled_module': 'uninstalled_module',
+        }
+        patcher = patch.object(registry, 'get_mounts', side_effect=lambda: self.mounts)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch('modular_engine.middleware.settings')
     def test_middleware_allows_installed_module(self, mock_settings):
         """Test that the middleware allows access to installed modules"""
@@ -498,13 +554,8 @@ class ModularEngineMiddlewareTest(TestCase):
         mock_module.status = 'not_installed'
         mock_get.return_value = mock_module
         
-        # Override the get_installed_modules method to return our test module
-        self.middleware.get_installed_modules = MagicMock(return_value={
-            'uninstalled_module': 'uninstalled_module'
-        })
-        
         # The middleware should block access to an uninstalled module
-        request = self.factory.get('/modular_engine/uninstalled_module/')
+        request = self.factory.get('/uninstalled_module/')
         with self.assertRaises(Http404):
             self.middleware(request)
 
@@ -531,3 +582,1387 @@ class ModularEngineMiddlewareTest(TestCase):
         response = self.middleware(request)
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.content, b"OK")
+
+    @patch('modular_engine.middleware.settings')
+    def test_middleware_gates_multi_segment_and_root_mounts(self, mock_settings):
+        """Test that modules are gated at their real mount points"""
+        mock_settings.AVAILABLE_MODULES = ['installed_module', 'uninstalled_module']
+        self.mounts = {
+            'shop/catalog': 'installed_module',
+            '/': 'uninstalled_module',
+        }
+
+        request = self.factory.get('/shop/catalog/items/')
+        self.assertEqual(self.middleware(request).status_code, 200)
+
+        # Everything else falls through to the module mounted at the root...
+        for path in ['/', '/shop/', '/shop/other/']:
+            with self.assertRaises(Http404):
+                self.middleware(self.factory.get(path))
+
+        # ...except core paths, which bypass module access control
+        for path in ['/admin/', '/module/']:
+            self.assertEqual(self.middleware(self.factory.get(path)).status_code, 200)
+
+    def test_dispatcher_is_rebuilt_when_mounts_change(self):
+        """Test that the trie is reused until the URLconf records new mounts"""
+        dispatcher = self.middleware.get_dispatcher()
+        self.assertIs(self.middleware.get_dispatcher(), dispatcher)
+
+        self.mounts = {'moved': 'installed_module'}
+        request = self.factory.get('/moved/')
+        self.assertEqual(self.middleware.get_target_module(request), 'installed_module')
+        self.assertIsNot(self.middleware.get_dispatcher(), dispatcher)
+
+    def test_url_patterns_record_mounts(self):
+        """Test that building the module URL patterns records the mount points"""
+        Module.objects.filter(module_id="installed_module").update(base_path="shop/catalog")
+        registry.available_modules["installed_module"]["url_patterns"] = [path('', lambda request: HttpResponse())]
+        self.addCleanup(registry.available_modules["installed_module"].update, url_patterns=[])
+        self.addCleanup(setattr, registry, 'mounts', registry.mounts)
+
+        get_module_url_patterns()
+        self.assertEqual(registry.mounts.get('shop/catalog'), 'installed_module')
+        self.assertNotIn('uninstalled_module', registry.mounts.values())
+
+
+class ModuleDispatcherTest(SimpleTestCase):
+    """Tests for the prefix trie behind module access control"""
+
+    def test_longest_prefix_wins(self):
+        """Test that the deepest matching mount point is returned"""
+        dispatcher = ModuleDispatcher(['admin'], {'shop': 'shop', 'shop/catalog': 'catalog', '/': 'home'})
+        self.assertEqual(dispatcher.match('/shop/cart/'), 'shop')
+        self.assertEqual(dispatcher.match('/shop/catalog/1/'), 'catalog')
+        self.assertEqual(dispatcher.match('/shopping/'), 'home')
+        self.assertEqual(dispatcher.match('/'), 'home')
+        self.assertIsNone(dispatcher.match('/admin/auth/'))
+
+    def test_core_paths_win_over_modules(self):
+        """Test that a module mounted on a core path is not gated"""
+        dispatcher = ModuleDispatcher(['admin'], {'admin': 'shadow'})
+        self.assertIsNone(dispatcher.match('/admin/'))
+
+    def test_unmounted_paths_are_not_gated(self):
+        """Test that paths outside every mount point bypass the gate"""
+        dispatcher = ModuleDispatcher(['admin'], {'shop': 'shop'})
+        self.assertIsNone(dispatcher.match('/'))
+        self.assertIsNone(dispatcher.match('/other/shop/'))
+
+    def test_benchmark_command(self):
+        """Test that the dispatcher benchmark agrees with the legacy matcher and reports both"""
+        out = StringIO()
+        call_command('benchmark_dispatch', modules=50, lookups=500, stdout=out)
+        output = out.getvalue()
+        self.assertIn('legacy', output)
+        self.assertIn('trie', output)
+
+
+class AsyncModularEngineMiddlewareTest(TestCase):
+    """Tests for the async path of the ModularEngineMiddleware"""
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+        async def dummy_view(request):
+            return HttpResponse("OK")
+
+        self.middleware = ModularEngineMiddleware(dummy_view)
+
+        Module.objects.create(
+            name="Installed Module",
+            module_id="installed_module",
+            version="1.0.0",
+            status="installed",
+            install_date=timezone.now(),
+        )
+        Module.objects.create(
+            name="Uninstalled Module",
+            module_id="uninstalled_module",
+            version="1.0.0",
+            status="not_installed",
+        )
+
+        patcher = patch.object(registry, 'get_mounts', return_value={
+            'installed_module': 'installed_module',
+            'uninstalled_module': 'uninstalled_module',
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_middleware_is_async_when_chain_is_async(self):
+        """Test that the middleware switches to the async path"""
+        from asgiref.sync import iscoroutinefunction
+        self.assertTrue(iscoroutinefunction(self.middleware))
+
+        sync_middleware = ModularEngineMiddleware(lambda request: HttpResponse("OK"))
+        self.assertFalse(iscoroutinefunction(sync_middleware))
+
+    @patch('modular_engine.middleware.settings')
+    async def test_async_middleware_allows_installed_module(self, mock_settings):
+        """Test that the async path allows access to installed modules"""
+        mock_settings.AVAILABLE_MODULES = ['installed_module']
+
+        request = self.factory.get('/installed_module/')
+        response = await self.middleware(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"OK")
+
+    @patch('modular_engine.middleware.settings')
+    async def test_async_middleware_blocks_unavailable_module(self, mock_settings):
+        """Test that the async path blocks modules missing from AVAILABLE_MODULES"""
+        mock_settings.AVAILABLE_MODULES = []
+
+        request = self.factory.get('/installed_module/')
+        with self.assertRaises(Http404):
+            await self.middleware(request)
+
+    @patch('modular_engine.middleware.settings')
+    async def test_async_middleware_blocks_uninstalled_modules(self, mock_settings):
+        """Test that the async path blocks modules that are no longer installed"""
+        mock_settings.AVAILABLE_MODULES = ['uninstalled_module']
+
+        request = self.factory.get('/uninstalled_module/')
+        with self.assertRaises(Http404):
+            await self.middleware(request)
+
+    async def test_async_middleware_allows_non_module_paths(self):
+        """Test that the async path bypasses non-module paths"""
+        for path in ['/', '/admin/', '/modular_engine/module/']:
+            request = self.factory.get(path)
+            response = await self.middleware(request)
+            self.assertEqual(response.status_code, 200)
+
+
+class BenchmarkConnectionsTest(TestCase):
+    """Tests for the connection benchmark command and its helpers"""
+
+    def test_percentile(self):
+        """Test percentile selection on sorted values"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summarize(self):
+        """Test that summaries report throughput and millisecond latencies"""
+        summary = summarize([0.001, 0.002, 0.003, 0.004], elapsed=0.01)
+        self.assertEqual(summary['count'], 4)
+        self.assertAlmostEqual(summary['throughput'], 400.0)
+        self.assertAlmostEqual(summary['p50_ms'], 2.0)
+
+    def test_benchmark_connections_command(self):
+        """Test that the command reports each connection mode"""
+        out = StringIO()
+        call_command('benchmark_connections', requests=2,
+                     host='testserver', stdout=out, stderr=StringIO())
+        output = out.getvalue()
+        self.assertIn('unpooled', output)
+        self.assertIn('persistent', output)
+
+
+class SQLitePragmaTest(SimpleTestCase):
+    """Tests for the SQLite pragmas applied on connect"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.db_path = os.path.join(self.tmpdir, 'pragma.sqlite3')
+
+    def open_connection(self):
+        """Open a file-backed SQLite connection configured like the default alias"""
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        settings_dict = dict(connections['default'].settings_dict, NAME=self.db_path)
+        settings_dict['OPTIONS'] = {'timeout': 0}
+        connection = DatabaseWrapper(settings_dict, alias='pragma_test')
+        connection.ensure_connection()
+        return connection
+
+    def read_count(self):
+        """Count rows from a fresh connection in another thread, like a concurrent request"""
+        def read():
+            connection = self.open_connection()
+            try:
+                started = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT COUNT(*) FROM items')
+                    count = cursor.fetchone()[0]
+                return count, time.perf_counter() - started
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(read).result()
+
+    def start_write(self):
+        """Hold an exclusive write transaction with one uncommitted row"""
+        writer = self.open_connection()
+        self.addCleanup(writer.close)
+        cursor = writer.cursor()
+        cursor.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+        cursor.execute('INSERT INTO items (id) VALUES (1)')
+        cursor.execute('BEGIN EXCLUSIVE')
+        cursor.execute('INSERT INTO items (id) VALUES (2)')
+        self.addCleanup(cursor.execute, 'ROLLBACK')
+        return writer
+
+    def test_pragmas_applied_on_connect(self):
+        """Test that new connections get WAL and the tuned pragmas"""
+        connection = self.open_connection()
+        self.addCleanup(connection.close)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0].lower(), 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], get_sqlite_pragmas()['busy_timeout'])
+
+    def test_readers_do_not_block_on_writers(self):
+        """Test that a reader sees the last commit while a writer holds the lock"""
+        self.start_write()
+
+        count, elapsed = self.read_count()
+        self.assertEqual(count, 1)
+        self.assertLess(elapsed, 1.0)
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'DELETE', 'busy_timeout': 100})
+    def test_readers_block_on_writers_without_wal(self):
+        """Test the rollback-journal baseline, where the same read is locked out"""
+        self.start_write()
+
+        with self.assertRaises(OperationalError):
+            self.read_count()
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'WAL; DROP TABLE items'})
+    def test_invalid_pragma_rejected(self):
+        """Test that pragma values are validated before being interpolated"""
+        with self.assertRaises(ImproperlyConfigured):
+            get_sqlite_pragmas()
+
+
+class ReplicaRouterTest(TestCase):
+    """Tests for read-replica routing, using a second SQLite file as the replica"""
+
+    # Resolved in setUpClass, after the replica alias has been added
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings['replica'] = dict(
+            connections['default'].settings_dict,
+            NAME=os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        )
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(Module)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        shutil.rmtree(cls.replica_dir, ignore_errors=True)
+
+    def setUp(self):
+        # The same module with a different status on each side tells them apart
+        Module.objects.using('default').create(
+            name="Routed Module", module_id="routed_module",
+            version="1.0.0", status="installed")
+        Module.objects.using('replica').create(
+            name="Routed Module", module_id="routed_module",
+            version="1.0.0", status="not_installed")
+
+    def test_reads_default_to_primary(self):
+        """Test that reads outside replica_reads() use the primary"""
+        module = Module.objects.get(module_id="routed_module")
+        self.assertEqual(module.status, "installed")
+
+    def test_opted_in_reads_use_replica(self):
+        """Test that reads inside replica_reads() are served by the replica"""
+        with replica_reads():
+            module = Module.objects.get(module_id="routed_module")
+        self.assertEqual(module.status, "not_installed")
+        self.assertEqual(module._state.db, 'replica')
+
+    def test_write_pins_request_to_primary(self):
+        """Test that reads after a write in the same request use the primary"""
+        with request_scope(), replica_reads():
+            self.assertEqual(
+                Module.objects.get(module_id="routed_module").status, "not_installed")
+
+            Module.objects.filter(module_id="routed_module").update(version="1.0.1")
+
+            self.assertEqual(
+                Module.objects.get(module_id="routed_module").status, "installed")
+
+        # A new request starts unpinned again
+        with request_scope(), replica_reads():
+            self.assertEqual(
+                Module.objects.get(module_id="routed_module").status, "not_installed")
+
+    def test_registry_reads_use_replica(self):
+        """Test that the module list reads come from the replica"""
+        test_registry = ModuleRegistry()
+        test_registry.register_module(
+            module_id="routed_module", name="Routed Module", description="",
+            version="1.0.0", app_name="test_app", url_patterns=[])
+
+        modules = test_registry.get_all_modules()
+        self.assertEqual(modules[0]['status'], "not_installed")
+
+    def test_upgrade_flag_is_written_on_primary(self):
+        """Test that flagging an upgrade doesn't write the replica's copy back to the primary"""
+        Module.objects.using('default').filter(module_id="routed_module").update(base_path="shop")
+        Module.objects.using('replica').filter(module_id="routed_module").update(status="installed")
+        test_registry = ModuleRegistry()
+        test_registry.register_module(
+            module_id="routed_module", name="Routed Module", description="",
+            version="2.0.0", app_name="test_app", url_patterns=[])
+
+        modules = test_registry.get_all_modules()
+        self.assertEqual(modules[0]['status'], "upgrade_available")
+        module = Module.objects.using('default').get(module_id="routed_module")
+        self.assertEqual((module.status, module.base_path), ("upgrade_available", "shop"))
+
+    def test_middleware_reads_use_replica(self):
+        """Test that the middleware gate consults the replica"""
+        middleware = ModularEngineMiddleware(lambda request: HttpResponse("OK"))
+        request = RequestFactory().get('/routed_module/')
+
+        with patch.object(registry, 'get_mounts', return_value={'routed_module': 'routed_module'}), \
+                patch('modular_engine.middleware.settings') as mock_settings:
+            mock_settings.AVAILABLE_MODULES = ['routed_module']
+            # Installed on the primary, but the replica says otherwise
+            with self.assertRaises(Http404):
+                middleware(request)
+
+    def test_replica_is_not_migrated(self):
+        """Test that migrations are never applied to the replica alias"""
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate('replica', 'modular_engine'))
+        self.assertIsNone(router.allow_migrate('default', 'modular_engine'))
+
+
+class ModuleDependencyTest(TestCase):
+    """Tests for dependency-aware, batched module installs"""
+
+    def setUp(self):
+        self.registry = ModuleRegistry()
+        self.setup_calls = []
+        self.setup_threads = {}
+        self.lock = threading.Lock()
+
+        # base <- (catalog, pricing) <- storefront
+        self.register('base')
+        self.register('catalog', requires=['base'])
+        self.register('pricing', requires=['base'])
+        self.register('storefront', requires=['catalog', 'pricing'])
+
+    def register(self, module_id, requires=None, setup_func=None):
+        def record_setup():
+            with self.lock:
+                self.setup_calls.append(module_id)
+                self.setup_threads[module_id] = threading.get_ident()
+
+        self.registry.register_module(
+            module_id=module_id,
+            name=module_id.title(),
+            description="",
+            version="1.0.0",
+            app_name="test_app",
+            setup_func=setup_func or record_setup,
+            url_patterns=[],
+            requires=requires,
+        )
+
+    def test_resolve_install_order(self):
+        """Test that the closure is grouped into topologically ordered levels"""
+        levels = self.registry.resolve_install_order(['storefront'])
+        self.assertEqual(levels, [['base'], ['catalog', 'pricing'], ['storefront']])
+
+    def test_resolve_missing_dependency(self):
+        """Test that unregistered requirements are reported"""
+        self.register('orphan', requires=['missing'])
+        with self.assertRaises(ModuleDependencyError):
+            self.registry.resolve_install_order(['orphan'])
+
+    def test_resolve_circular_dependency(self):
+        """Test that dependency cycles are reported"""
+        self.register('left', requires=['right'])
+        self.register('right', requires=['left'])
+        with self.assertRaisesMessage(ModuleDependencyError, 'left, right'):
+            self.registry.resolve_install_order(['left'])
+
+    def test_install_modules_installs_closure(self):
+        """Test that installing a module installs its dependencies first, reloading once"""
+        with patch.object(self.registry, '_reload_urls') as mock_reload:
+            result = self.registry.install_modules(['storefront'])
+
+        self.assertTrue(result)
+        mock_reload.assert_called_once()
+        self.assertEqual(self.setup_calls[0], 'base')
+        self.assertEqual(set(self.setup_calls[1:3]), {'catalog', 'pricing'})
+        self.assertEqual(self.setup_calls[3], 'storefront')
+        self.assertEqual(
+            Module.objects.filter(status='installed').count(), 4)
+        self.assertEqual(
+            set(self.registry.modules), {'base', 'catalog', 'pricing', 'storefront'})
+
+    def test_independent_setups_run_concurrently(self):
+        """Test that independent setup functions run on pool threads"""
+        with patch.object(self.registry, '_reload_urls'):
+            self.registry.install_modules(['catalog', 'pricing'])
+
+        self.assertEqual(self.setup_threads['base'], threading.get_ident())
+        self.assertNotEqual(self.setup_threads['catalog'], threading.get_ident())
+        self.assertNotEqual(self.setup_threads['pricing'], threading.get_ident())
+
+    def test_installed_dependencies_are_skipped(self):
+        """Test that already installed dependencies are not set up again"""
+        with patch.object(self.registry, '_reload_urls'):
+            self.registry.install_modules(['base'])
+            self.setup_calls.clear()
+            self.registry.install_modules(['catalog'])
+
+        self.assertEqual(self.setup_calls, ['catalog'])
+
+    def test_failing_setup_installs_nothing(self):
+        """Test that a failing setup leaves no module recorded"""
+        self.register('broken', requires=['base'],
+                      setup_func=MagicMock(side_effect=Exception("Setup failed")))
+
+        with patch.object(self.registry, '_reload_urls') as mock_reload:
+            result = self.registry.install_modules(['broken'])
+
+        self.assertFalse(result)
+        mock_reload.assert_not_called()
+        self.assertFalse(Module.objects.filter(status='installed').exists())
+        self.assertEqual(self.registry.modules, {})
+
+    def test_uninstall_blocked_by_dependents(self):
+        """Test that a module cannot be uninstalled while others require it"""
+        with patch.object(self.registry, '_reload_urls'):
+            self.registry.install_modules(['catalog'])
+            self.assertFalse(self.registry.uninstall_module('base'))
+            self.assertTrue(self.registry.uninstall_module('catalog'))
+            self.assertTrue(self.registry.uninstall_module('base'))
+
+
+class ModuleJobTest(TestCase):
+    """Tests for the background module job queue"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password')
+        self.client.login(username='admin', password='password')
+
+        patcher = patch('modular_engine.jobs.get_registry')
+        self.mock_registry = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_idempotency_key_returns_existing_job(self):
+        """Test that resubmitting the same key does not queue a second job"""
+        job, created = enqueue_job('install', 'test_module', idempotency_key='key-1')
+        self.assertTrue(created)
+
+        run_pending_jobs()
+        again, created = enqueue_job('install', 'test_module', idempotency_key='key-1')
+        self.assertFalse(created)
+        self.assertEqual(again.pk, job.pk)
+        self.assertEqual(ModuleJob.objects.count(), 1)
+
+    def test_active_job_is_reused(self):
+        """Test that the same action is not queued twice for a module"""
+        job, _ = enqueue_job('install', 'test_module')
+        again, created = enqueue_job('install', 'test_module')
+        self.assertFalse(created)
+        self.assertEqual(again.pk, job.pk)
+
+    def test_failed_job_is_retried_then_failed(self):
+        """Test that failing jobs are retried with backoff up to max_attempts"""
+        self.mock_registry.install_module.return_value = False
+        job, _ = enqueue_job('install', 'test_module')
+
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+
+        # The retry isn't due yet
+        self.assertIsNone(claim_next_job())
+
+        # Make the remaining attempts due immediately
+        for attempt in range(2, job.max_attempts + 1):
+            ModuleJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            run_pending_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, job.max_attempts)
+        self.assertIn("Failed to install module 'test_module'", job.error)
+
+    def test_exception_in_job_is_recorded(self):
+        """Test that exceptions raised by the registry are stored on the job"""
+        self.mock_registry.upgrade_module.side_effect = RuntimeError("boom")
+        job, _ = enqueue_job('upgrade', 'test_module')
+        ModuleJob.objects.filter(pk=job.pk).update(max_attempts=1)
+
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, "boom")
+
+    def test_stale_running_job_is_requeued(self):
+        """Test that jobs left running by a dead worker are picked up again"""
+        self.mock_registry.install_module.return_value = True
+        job, _ = enqueue_job('install', 'test_module')
+        ModuleJob.objects.filter(pk=job.pk).update(
+            status='running', started_at=timezone.now() - datetime.timedelta(hours=1))
+
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'succeeded')
+
+    def test_job_status_endpoint(self):
+        """Test the JSON status endpoint polled by the module list page"""
+        job, _ = enqueue_job('install', 'test_module')
+
+        response = self.client.get(reverse('modular_engine:job_status'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [entry['id'] for entry in response.json()['jobs']], [job.pk])
+
+        self.mock_registry.install_module.return_value = True
+        run_pending_jobs()
+
+        # Finished jobs drop out of the active list but can be fetched by id
+        response = self.client.get(reverse('modular_engine:job_status'))
+        self.assertEqual(response.json()['jobs'], [])
+        response = self.client.get(
+            reverse('modular_engine:job_status'), {'ids': str(job.pk)})
+        self.assertEqual(response.json()['jobs'][0]['status'], 'succeeded')
+
+    def test_unknown_module_is_not_queued(self):
+        """Test that the view refuses to queue jobs for unregistered modules"""
+        response = self.client.post(
+            reverse('modular_engine:install_module', kwargs={'module_id': 'missing_module'}))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ModuleJob.objects.exists())
+
+
+@override_settings(ALLOWED_HOSTS=['.example.com'])
+class TenantModuleTest(TestCase):
+    """Tests for per-tenant module enablement"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ModularEngineMiddleware(lambda request: HttpResponse("OK"))
+        tenant_modules.invalidate()
+        self.addCleanup(tenant_modules.invalidate)
+
+        self.module = Module.objects.create(
+            name="Tenant Module", module_id="tenant_module",
+            version="1.0.0", status="installed")
+        self.open_module = Module.objects.create(
+            name="Open Module", module_id="open_module",
+            version="1.0.0", status="installed")
+
+        TenantModule.objects.create(tenant='shop.example.com', module=self.module)
+        TenantModule.objects.create(tenant='other.example.com', module=self.module, enabled=False)
+
+        self.group = Group.objects.create(name='Beta Testers')
+        TenantModule.objects.create(tenant_type='group', tenant='Beta Testers', module=self.module)
+
+        settings_patcher = patch('modular_engine.middleware.settings')
+        mock_settings = settings_patcher.start()
+        mock_settings.AVAILABLE_MODULES = ['tenant_module', 'open_module']
+        self.addCleanup(settings_patcher.stop)
+
+        mounts_patcher = patch.object(registry, 'get_mounts', return_value={
+            'tenant_module': 'tenant_module',
+            'open_module': 'open_module',
+        })
+        mounts_patcher.start()
+        self.addCleanup(mounts_patcher.stop)
+
+    def get(self, module_id, host, user=None):
+        request = self.factory.get(f'/{module_id}/', HTTP_HOST=host)
+        request.user = user or AnonymousUser()
+        return self.middleware(request)
+
+    def test_map_lookups(self):
+        """Test the frozenset-backed tenant map"""
+        tenant_map = TenantModuleMap([
+            ('host', 'A.example.com', 'm1', True),
+            ('host', 'b.example.com', 'm1', False),
+            ('group', 'Staff', 'm2', True),
+        ])
+        self.assertTrue(tenant_map.is_scoped('m1'))
+        self.assertFalse(tenant_map.is_scoped('m3'))
+        self.assertTrue(tenant_map.host_allows('a.example.com', 'm1'))
+        self.assertFalse(tenant_map.host_allows('b.example.com', 'm1'))
+        self.assertTrue(tenant_map.needs_groups('m2'))
+        self.assertTrue(tenant_map.groups_allow(['Staff'], 'm2'))
+        self.assertIsInstance(tenant_map.hosts['a.example.com'], frozenset)
+
+    def test_enabled_host_is_allowed(self):
+        """Test that a tenant with the module enabled gets through"""
+        self.assertEqual(self.get('tenant_module', 'shop.example.com:8000').status_code, 200)
+
+    def test_other_hosts_are_blocked(self):
+        """Test that hosts without the module enabled get a 404"""
+        for host in ['other.example.com', 'unknown.example.com']:
+            with self.assertRaises(Http404):
+                self.get('tenant_module', host)
+
+    def test_unscoped_module_is_allowed_everywhere(self):
+        """Test that modules without tenant rows keep the global behaviour"""
+        self.assertEqual(self.get('open_module', 'unknown.example.com').status_code, 200)
+
+    def test_group_enables_module(self):
+        """Test that a user group can enable a module on any host"""
+        user = User.objects.create_user(username='beta', password='password')
+        user.groups.add(self.group)
+        self.assertEqual(self.get('tenant_module', 'unknown.example.com', user).status_code, 200)
+
+    def test_map_is_cached_and_invalidated_on_change(self):
+        """Test that the map is held in memory and rebuilt after a change"""
+        self.get('tenant_module', 'shop.example.com')
+        with self.assertNumQueries(0):
+            tenant_modules.get()
+
+        TenantModule.objects.create(tenant='new.example.com', module=self.module)
+        self.assertEqual(self.get('tenant_module', 'new.example.com').status_code, 200)
+
+        TenantModule.objects.filter(tenant='new.example.com').delete()
+        with self.assertRaises(Http404):
+            self.get('tenant_module', 'new.example.com')
+
+    def test_map_expires(self):
+        """Test that changes made by other processes are picked up once the map expires"""
+        self.get('tenant_module', 'shop.example.com')
+
+        # A queryset update sends no signals, like a write from another worker
+        TenantModule.objects.filter(tenant='shop.example.com').update(enabled=False)
+        self.assertEqual(self.get('tenant_module', 'shop.example.com').status_code, 200)
+
+        with override_settings(MODULE_TENANT_MAP_MAX_AGE=0):
+            with self.assertRaises(Http404):
+                self.get('tenant_module', 'shop.example.com')
+
+    async def test_async_path_checks_tenant(self):
+        """Test that the async middleware path applies the same tenant check"""
+        async def dummy_view(request):
+            return HttpResponse("OK")
+
+        middleware = ModularEngineMiddleware(dummy_view)
+        factory = AsyncRequestFactory()
+
+        request = factory.get('/tenant_module/')
+        request.META['HTTP_HOST'] = 'shop.example.com'
+        request.user = AnonymousUser()
+        response = await middleware(request)
+        self.assertEqual(response.status_code, 200)
+
+        request = factory.get('/tenant_module/')
+        request.META['HTTP_HOST'] = 'other.example.com'
+        request.user = AnonymousUser()
+        with self.assertRaises(Http404):
+            await middleware(request)
+
+
+def canary_view(request):
+    return HttpResponse("v2")
+
+
+class CanaryRoutingTest(TestCase):
+    """Tests for percentage rollout of a new module version"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.registry = ModuleRegistry()
+        self.registry.register_module(
+            module_id='shop', name='Shop', description='', version='1.0.0', app_name='shop')
+        self.registry.modules['shop'] = self.registry.available_modules['shop']
+
+        self.canary = CanaryRelease('shop', '2.0.0', [path('', canary_view, name='canary_home')], 100)
+        self.canary.base_path = 'shop'
+        self.registry.canaries['shop'] = self.canary
+        self.registry.mounts = {'shop': 'shop'}
+
+        Module.objects.create(name='Shop', module_id='shop', version='1.0.0', status='installed')
+
+        patcher = patch('modular_engine.middleware.get_registry', return_value=self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        settings_patcher = patch('modular_engine.middleware.settings')
+        settings_patcher.start().AVAILABLE_MODULES = ['shop']
+        self.addCleanup(settings_patcher.stop)
+
+        version_stats.reset()
+        self.addCleanup(version_stats.reset)
+
+    def request(self, path='/shop/', session_key='session-1'):
+        request = self.factory.get(path)
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+        return request
+
+    def test_bucket_is_consistent(self):
+        """Test that a client always lands in the same bucket"""
+        bucket = canary_bucket('shop', 'session-1')
+        self.assertEqual(bucket, canary_bucket('shop', 'session-1'))
+        self.assertTrue(0 <= bucket < 100)
+
+    def test_percentage_split(self):
+        """Test that roughly the configured share of clients gets the canary"""
+        self.canary.percent = 20
+        routed = sum(
+            self.canary.routes_to_canary(self.request(session_key=f'session-{i}')) for i in range(2000))
+        self.assertTrue(300 < routed < 500, routed)
+
+    def test_users_keep_their_bucket_on_login(self):
+        """Test that logged in users are bucketed by id, whatever their session key"""
+        user = User.objects.create_user(username='shopper', password='password')
+        self.canary.percent = 50
+        routed = {
+            self.canary.routes_to_canary(self.request(session_key=f'session-{i}'), user) for i in range(50)}
+        self.assertEqual(len(routed), 1)
+        self.assertEqual(routed.pop(), canary_bucket('shop', f'user:{user.pk}') < 50)
+        # Anonymous clients still go by their session
+        self.assertEqual(self.canary.routes_to_canary(self.request(session_key='session-1'), AnonymousUser()),
+                         canary_bucket('shop', 'session-1') < 50)
+
+    def test_canary_request_uses_canary_urlconf(self):
+        """Test that canary clients resolve against the new url_patterns without a query"""
+        middleware = ModularEngineMiddleware(lambda request: HttpResponse("OK"))
+        request = self.request()
+
+        with self.assertNumQueries(0):
+            module_version = middleware.route_canary(request, 'shop')
+
+        self.assertEqual(module_version, ('shop', '2.0.0'))
+        self.assertEqual(resolve('/shop/', urlconf=request.urlconf).func, canary_view)
+
+    def test_other_clients_keep_current_version(self):
+        """Test that clients outside the percentage stay on the registered version"""
+        self.canary.percent = 0
+        middleware = ModularEngineMiddleware(lambda request: HttpResponse("OK"))
+        request = self.request()
+
+        self.assertEqual(middleware.route_canary(request, 'shop'), ('shop', '1.0.0'))
+        self.assertFalse(hasattr(request, 'urlconf'))
+
+    def test_unrelated_and_core_paths_are_not_routed(self):
+        """Test that only paths under the module's mount point are routed"""
+        middleware = ModularEngineMiddleware(lambda request: HttpResponse("OK"))
+        self.assertNotIn('X-Module-Version', middleware(self.request('/other/')))
+
+        self.canary.base_path = '/'
+        self.registry.mounts = {'/': 'shop'}
+        self.assertNotIn('X-Module-Version', middleware(self.request('/admin/')))
+        self.assertEqual(middleware(self.request('/'))['X-Module-Version'], '2.0.0')
+
+    def test_version_counters(self):
+        """Test that latency and errors are counted per version"""
+        status_codes = iter([200, 500])
+        middleware = ModularEngineMiddleware(lambda request: HttpResponse(status=next(status_codes)))
+
+        for _ in range(2):
+            response = middleware(self.request())
+            self.assertEqual(response['X-Module-Version'], '2.0.0')
+
+        stats = version_stats.snapshot('shop')
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['version'], '2.0.0')
+        self.assertEqual(stats[0]['requests'], 2)
+        self.assertEqual(stats[0]['errors'], 1)
+        self.assertEqual(stats[0]['error_rate'], 0.5)
+
+    async def test_async_path_routes_canary(self):
+        """Test that the async middleware path routes and counts the same way"""
+        async def dummy_view(request):
+            return HttpResponse("OK")
+
+        middleware = ModularEngineMiddleware(dummy_view)
+        request = AsyncRequestFactory().get('/shop/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = 'session-1'
+
+        response = await middleware(request)
+        self.assertEqual(response['X-Module-Version'], '2.0.0')
+        self.assertEqual(version_stats.snapshot('shop')[0]['requests'], 1)
+
+    def test_promote_canary(self):
+        """Test that promoting makes the canary the installed version"""
+        with patch.object(self.registry, '_reload_urls'):
+            self.assertTrue(self.registry.promote_canary('shop'))
+
+        self.assertEqual(Module.objects.get(module_id='shop').version, '2.0.0')
+        self.assertEqual(self.registry.modules['shop']['version'], '2.0.0')
+        self.assertNotIn('shop', self.registry.canaries)
+        self.assertFalse(self.registry.promote_canary('shop'))
+
+    def test_canary_stats_view(self):
+        """Test the staff-only canary stats endpoint"""
+        version_stats.record('shop', '2.0.0', 0.01, error=False)
+        user = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.force_login(user)
+
+        with patch('modular_engine.views.get_registry', return_value=self.registry):
+            response = self.client.get(reverse('modular_engine:canary_stats'))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['canaries'][0]['percent'], 100)
+        self.assertEqual(data['versions'][0]['requests'], 1)
+
+
+class ReverseCacheTest(SimpleTestCase):
+    """Tests for the cached URL building used by module templates"""
+
+    def setUp(self):
+        urlconf = type(os)('reverse_cache_urls')
+        urlconf.urlpatterns = [
+            path('items/', canary_view, name='item_list'),
+            path('items/<int:pk>/', canary_view, name='item_detail'),
+            path('items/<str:slug>/edit/', canary_view, name='item_edit'),
+            path('module/', include(([path('', canary_view, name='home')], 'engine'))),
+        ]
+        set_urlconf(urlconf)
+        self.addCleanup(set_urlconf, None)
+        url_cache.clear()
+
+    def test_matches_reverse(self):
+        """Test that cached URLs are identical to reverse()"""
+        cases = [
+            ('item_list', (), {}),
+            ('item_detail', (42,), {}),
+            ('item_detail', (), {'pk': 7}),
+            ('item_edit', ('a b%ü',), {}),
+            ('engine:home', (), {}),
+        ]
+        for viewname, args, kwargs in cases:
+            with self.subTest(viewname=viewname, args=args, kwargs=kwargs):
+                self.assertEqual(
+                    url_cache.reverse(viewname, args=args, kwargs=kwargs),
+                    reverse(viewname, args=args, kwargs=kwargs))
+
+    def test_script_prefix(self):
+        """Test that the current script prefix is applied"""
+        set_script_prefix('/shop/')
+        self.addCleanup(clear_script_prefix)
+        self.assertEqual(url_cache.reverse('item_detail', args=[1]), '/shop/items/1/')
+
+    def test_invalid_arguments_raise(self):
+        """Test that arguments failing the route's converter raise NoReverseMatch"""
+        with self.assertRaises(NoReverseMatch):
+            url_cache.reverse('item_detail', args=['abc'])
+        with self.assertRaises(NoReverseMatch):
+            url_cache.reverse('missing')
+
+    def test_templates_are_cached_until_urls_reload(self):
+        """Test that route templates are reused and dropped on reload"""
+        routes = url_cache.get_routes('item_detail')
+        self.assertIs(url_cache.get_routes('item_detail'), routes)
+
+        with patch('importlib.reload'):
+            ModuleRegistry()._reload_urls()
+        self.assertEqual(len(url_cache._templates), 0)
+
+    def test_template_tag(self):
+        """Test the module_url template tag"""
+        template = Template("{% load module_urls %}{% module_url 'item_detail' pk %}")
+        self.assertEqual(template.render(Context({'pk': 3})), '/items/3/')
+
+
+class ModuleHealthTest(TestCase):
+    """Tests for worker warmup and the readiness endpoint"""
+
+    def setUp(self):
+        self.registry = ModuleRegistry()
+        self.warmed = []
+        self.healthy = {'alpha': True, 'beta': True}
+
+        for module_id in ['alpha', 'beta']:
+            self.registry.register_module(
+                module_id=module_id, name=module_id, description='', version='1.0.0', app_name=module_id,
+                warmup_func=lambda module_id=module_id: self.warmed.append(module_id),
+                healthcheck_func=lambda module_id=module_id: self.healthy[module_id])
+            self.registry.modules[module_id] = self.registry.available_modules[module_id]
+
+        patcher = patch('modular_engine.health.get_registry', return_value=self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch('modular_engine.health.warm_up_engine')
+        self.warm_up_engine = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        readiness.reset()
+        self.addCleanup(readiness.reset)
+
+    def test_cold_worker_is_not_ready(self):
+        """Test that the endpoint returns 503 before warmup"""
+        response = self.client.get(reverse('modular_engine:module_health'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'cold')
+
+    def test_warmup_runs_every_module_hook(self):
+        """Test that warmup runs the engine and module warmups, then reports ready"""
+        warm_up_worker()
+
+        self.warm_up_engine.assert_called_once()
+        self.assertEqual(sorted(self.warmed), ['alpha', 'beta'])
+        self.assertEqual(readiness.state, 'ready')
+
+        response = self.client.get(reverse('modular_engine:module_health'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ready')
+        self.assertTrue(response.json()['modules']['alpha']['ok'])
+
+    def test_failed_warmup_does_not_block_readiness(self):
+        """Test that a failing warmup is recorded and the health checks decide"""
+        def broken_warmup():
+            raise RuntimeError("cold cache")
+        self.registry.available_modules['alpha']['warmup_func'] = broken_warmup
+
+        warm_up_worker()
+        self.assertEqual(readiness.state, 'ready')
+        self.assertFalse(readiness.warmup_results['alpha']['ok'])
+        self.assertEqual(readiness.warmup_results['alpha']['error'], 'cold cache')
+
+    def test_failing_health_check(self):
+        """Test that an unhealthy module takes the worker out of rotation"""
+        warm_up_worker()
+        self.healthy['beta'] = False
+
+        response = self.client.get(reverse('modular_engine:module_health'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'unhealthy')
+        self.assertFalse(response.json()['modules']['beta']['ok'])
+
+    @override_settings(MODULE_WARMUP=False)
+    def test_warmup_can_be_disabled(self):
+        """Test that MODULE_WARMUP = False skips the boot warmup"""
+        warm_up_worker()
+        self.assertEqual(readiness.state, 'cold')
+        self.assertEqual(self.warmed, [])
+
+
+class HotReloadTest(TestCase):
+    """Tests for re-importing a module's code in a running process"""
+
+    def setUp(self):
+        self.package_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.package_dir, ignore_errors=True)
+        sys.path.insert(0, self.package_dir)
+        self.addCleanup(sys.path.remove, self.package_dir)
+        self.addCleanup(self.unload)
+
+        self.write('__init__.py', '')
+        self.write_views('v1')
+        self.write('urls.py', 'from django.urls import path\nfrom hotmod import views\n\n'
+                              'url_patterns = [path("", views.index, name="hotmod_index")]\n')
+        self.write_module('1.0.0')
+
+        self.registry = ModuleRegistry()
+        import hotmod.module
+        hotmod.module.register(self.registry)
+        self.registry.modules['hotmod'] = self.registry.available_modules['hotmod']
+
+        patcher = patch.object(self.registry, '_reload_urls')
+        self.reload_urls = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, filename, source):
+        path = os.path.join(self.package_dir, 'hotmod', filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(source)
+        # Make sure rewritten source is never mistaken for the cached bytecode
+        self.mtime = getattr(self, 'mtime', time.time()) + 10
+        os.utime(path, (self.mtime, self.mtime))
+
+    def write_views(self, content):
+        self.write('views.py', 'from django.http import HttpResponse\n\n'
+                               f'def index(request):\n    return HttpResponse("{content}")\n')
+
+    def write_module(self, version):
+        self.write('module.py', 'def register(registry):\n'
+                                '    from hotmod.urls import url_patterns\n'
+                                f'    registry.register_module("hotmod", "Hot", "", "{version}", "hotmod",\n'
+                                '                             url_patterns=url_patterns)\n')
+
+    def unload(self):
+        for name in [name for name in sys.modules if name == 'hotmod' or name.startswith('hotmod.')]:
+            del sys.modules[name]
+
+    def get_view(self):
+        return self.registry.available_modules['hotmod']['url_patterns'][0].callback
+
+    def test_hot_reload_swaps_code(self):
+        """Test that new views, url_patterns and version are picked up"""
+        old_view = self.get_view()
+        self.write_views('v2')
+        self.write_module('1.1.0')
+
+        self.assertTrue(self.registry.hot_reload_module('hotmod'))
+
+        self.assertEqual(self.get_view()(None).content, b"v2")
+        self.assertEqual(self.registry.modules['hotmod']['version'], '1.1.0')
+        self.reload_urls.assert_called_once()
+
+        # Code that was already running keeps the old implementation
+        self.assertEqual(old_view(None).content, b"v1")
+
+    def test_broken_code_keeps_old_version(self):
+        """Test that an import error leaves the running code in place"""
+        old_views = sys.modules['hotmod.views']
+        self.write('views.py', 'def index(request:\n')
+
+        self.assertFalse(self.registry.hot_reload_module('hotmod'))
+
+        self.assertIs(sys.modules['hotmod.views'], old_views)
+        self.assertIs(sys.modules['hotmod'].views, old_views)
+        self.assertEqual(self.get_view()(None).content, b"v1")
+        self.reload_urls.assert_not_called()
+
+    def test_canary_lifecycle_views(self):
+        """Test starting, adjusting, promoting and stopping a canary of the code on disk"""
+        Module.objects.create(name='Hot', module_id='hotmod', version='1.0.0', status='installed')
+        self.client.force_login(User.objects.create_user(username='staff', password='password', is_staff=True))
+        patcher = patch('modular_engine.views.get_registry', return_value=self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # The code on disk must be a new version
+        response = self.client.post(reverse('modular_engine:start_canary', args=['hotmod']), {'percent': 10})
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('hotmod', self.registry.canaries)
+
+        self.write_views('v2')
+        self.write_module('1.1.0')
+        self.client.post(reverse('modular_engine:start_canary', args=['hotmod']), {'percent': 10})
+        canary = self.registry.canaries['hotmod']
+        self.assertEqual((canary.version, canary.percent), ('1.1.0', 10))
+        self.assertEqual(canary.url_patterns[0].callback(None).content, b"v2")
+        # Everyone else keeps the running code
+        self.assertEqual(self.get_view()(None).content, b"v1")
+
+        self.client.post(reverse('modular_engine:set_canary_percent', args=['hotmod']), {'percent': 50})
+        self.assertEqual(canary.percent, 50)
+        self.client.post(reverse('modular_engine:set_canary_percent', args=['hotmod']), {'percent': 'all'})
+        self.assertEqual(canary.percent, 50)
+
+        self.client.post(reverse('modular_engine:promote_canary', args=['hotmod']))
+        self.assertNotIn('hotmod', self.registry.canaries)
+        self.assertEqual(self.registry.modules['hotmod']['version'], '1.1.0')
+        self.assertEqual(Module.objects.get(module_id='hotmod').version, '1.1.0')
+        self.assertEqual(self.get_view()(None).content, b"v2")
+
+        self.write_module('1.2.0')
+        self.client.post(reverse('modular_engine:start_canary', args=['hotmod']), {'percent': 5})
+        self.assertEqual(self.registry.canaries['hotmod'].version, '1.2.0')
+        self.client.post(reverse('modular_engine:stop_canary', args=['hotmod']))
+        self.assertNotIn('hotmod', self.registry.canaries)
+        self.assertEqual(self.registry.modules['hotmod']['version'], '1.1.0')
+
+    def test_reload_reaches_every_worker(self):
+        """Test that workers reload code once another worker bumped its generation"""
+        Module.objects.create(name='Hot', module_id='hotmod', version='1.0.0', status='installed')
+        middleware = ModularEngineMiddleware(lambda request: HttpResponse("OK"))
+        patcher = patch('modular_engine.middleware.get_registry', return_value=self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # Boot: the code that was just loaded is the current generation
+        self.registry.sync_code_generations()
+        self.assertEqual(self.registry.code_generations['hotmod'], 0)
+
+        # Another worker asks for a reload of new code
+        self.write_views('v2')
+        Module.objects.filter(module_id='hotmod').update(code_generation=F('code_generation') + 1)
+        with override_settings(MODULE_CODE_CHECK_SECONDS=60):
+            middleware(RequestFactory().get('/other/'))
+        self.assertEqual(self.get_view()(None).content, b"v1")
+
+        with override_settings(MODULE_CODE_CHECK_SECONDS=0):
+            middleware(RequestFactory().get('/other/'))
+        self.assertEqual(self.get_view()(None).content, b"v2")
+        self.assertEqual(self.registry.get_all_modules()[0]['code_generation'], 1)
+
+        # Asking here reloads right away and publishes the next generation
+        self.write_views('v3')
+        self.assertTrue(self.registry.request_hot_reload('hotmod'))
+        self.assertEqual(self.get_view()(None).content, b"v3")
+        self.assertEqual(Module.objects.get(module_id='hotmod').code_generation, 2)
+        self.assertEqual(self.registry.code_generations['hotmod'], 2)
+
+    def test_reload_keeps_unchanged_throttle(self):
+        """Test that re-registering keeps a throttle whose in-flight slots are held"""
+        self.registry.register_module('hotmod', 'Hot', '', '1.0.0', 'hotmod', max_concurrency=2)
+        throttle = self.registry.throttles['hotmod']
+        self.registry.register_module('hotmod', 'Hot', '', '1.1.0', 'hotmod', max_concurrency=2)
+        self.assertIs(self.registry.throttles['hotmod'], throttle)
+        self.registry.register_module('hotmod', 'Hot', '', '1.1.0', 'hotmod', max_concurrency=3)
+        self.assertIsNot(self.registry.throttles['hotmod'], throttle)
+
+    def test_unknown_module(self):
+        """Test that only registered modules can be reloaded"""
+        self.assertFalse(self.registry.hot_reload_module('missing'))
+
+    def test_evict_templates_is_targeted(self):
+        """Test that only the module's cached templates are evicted"""
+        from django.template import engines
+        from django.template.loader import get_template
+        get_template('product/product_list.html')
+        get_template('base.html')
+
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertGreaterEqual(evict_templates([], 'product/'), 1)
+
+        self.assertNotIn('product/product_list.html', loader.get_template_cache)
+        self.assertIn('base.html', loader.get_template_cache)
+
+
+class ModuleThrottleTest(TestCase):
+    """Tests for per-module rate limits and concurrency caps"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.registry = ModuleRegistry()
+        self.registry.mounts = {'busy': 'busy'}
+        Module.objects.create(name='Busy', module_id='busy', version='1.0.0', status='installed')
+
+        patcher = patch('modular_engine.middleware.get_registry', return_value=self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        settings_patcher = patch('modular_engine.middleware.settings')
+        settings_patcher.start().AVAILABLE_MODULES = ['busy']
+        self.addCleanup(settings_patcher.stop)
+
+    def register(self, **limits):
+        self.registry.register_module(
+            module_id='busy', name='Busy', description='', version='1.0.0', app_name='busy', **limits)
+
+    def test_parse_rate(self):
+        """Test the supported rate formats"""
+        self.assertEqual(parse_rate('100/s'), (100, 1))
+        self.assertEqual(parse_rate('600/min'), (600, 60))
+        self.assertEqual(parse_rate(5), (5, 1))
+        with self.assertRaises(ImproperlyConfigured):
+            parse_rate('fast')
+
+    def test_token_bucket(self):
+        """Test that the bucket allows a burst and then asks the client to wait"""
+        bucket = TokenBucket(2, 1)
+        self.assertEqual(bucket.consume(), 0)
+        self.assertEqual(bucket.consume(), 0)
+        self.assertGreater(bucket.consume(), 0)
+
+    def test_unthrottled_modules_have_no_throttle(self):
+        """Test that modules without limits skip the throttle entirely"""
+        self.register()
+        self.assertNotIn('busy', self.registry.throttles)
+
+    def test_rate_limit_returns_429_without_queries(self):
+        """Test that requests over the rate are rejected before any database work"""
+        self.register(rate_limit='1/m')
+        middleware = ModularEngineMiddleware(lambda request: HttpResponse("OK"))
+
+        self.assertEqual(middleware(self.factory.get('/busy/')).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = middleware(self.factory.get('/busy/'))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_concurrency_cap_returns_503(self):
+        """Test that requests beyond max_concurrency are turned away while one runs"""
+        self.register(max_concurrency=1)
+        nested = []
+
+        def busy_view(request):
+            # A second request arriving while this one is still running
+            nested.append(middleware(self.factory.get('/busy/')))
+            return HttpResponse("OK")
+
+        middleware = ModularEngineMiddleware(busy_view)
+        self.assertEqual(middleware(self.factory.get('/busy/')).status_code, 200)
+        self.assertEqual(nested[0].status_code, 503)
+
+        # The slot is free again once the request is done
+        self.assertEqual(self.registry.throttles['busy'].concurrency_limiter.active, 0)
+
+    def test_slot_is_released_on_error(self):
+        """Test that a failing request gives its concurrency slot back"""
+        self.register(max_concurrency=1)
+
+        def failing_view(request):
+            raise RuntimeError("boom")
+
+        middleware = ModularEngineMiddleware(failing_view)
+        with self.assertRaises(RuntimeError):
+            middleware(self.factory.get('/busy/'))
+        self.assertEqual(self.registry.throttles['busy'].concurrency_limiter.active, 0)
+
+    @override_settings(MODULE_THROTTLE_CACHE='default')
+    def test_shared_counters(self):
+        """Test that workers sharing the cache share the limits"""
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        worker_a = ModuleThrottle('shared', max_concurrency=1, rate_limit='2/m')
+        worker_b = ModuleThrottle('shared', max_concurrency=1, rate_limit='2/m')
+
+        self.assertEqual(worker_a.acquire(), (None, True))
+        rejection, held = worker_b.acquire()
+        self.assertEqual(rejection.status_code, 503)
+        self.assertFalse(held)
+
+        worker_a.release()
+        rejection, _ = worker_b.acquire()
+        self.assertEqual(rejection.status_code, 429)
+
+    @override_settings(MODULE_THROTTLE_CACHE='default')
+    def test_shared_counters_fail_open(self):
+        """Test that a cache outage lets requests through"""
+        throttle = ModuleThrottle('shared', max_concurrency=1)
+        with patch.object(throttle.concurrency_limiter.cache, 'incr', side_effect=ConnectionError):
+            self.assertEqual(throttle.acquire(), (None, False))
+
+    async def test_async_path_rejects(self):
+        """Test that the async middleware path applies the same limits"""
+        self.register(rate_limit='1/m')
+
+        async def dummy_view(request):
+            return HttpResponse("OK")
+
+        middleware = ModularEngineMiddleware(dummy_view)
+        factory = AsyncRequestFactory()
+        self.assertEqual((await middleware(factory.get('/busy/'))).status_code, 200)
+        self.assertEqual((await middleware(factory.get('/busy/'))).status_code, 429)
+
+
+class ResourceAccountingTest(TestCase):
+    """Tests for per-module resource accounting"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.registry = ModuleRegistry()
+        self.registry.mounts = {'shop': 'shop'}
+        Module.objects.create(name='Shop', module_id='shop', version='1.0.0', status='installed')
+        # As at boot, so the code generation check isn't counted against a request
+        self.registry.sync_code_generations()
+
+        patcher = patch('modular_engine.middleware.get_registry', return_value=self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        settings_patcher = patch('modular_engine.middleware.settings')
+        settings_patcher.start().AVAILABLE_MODULES = ['shop']
+        self.addCleanup(settings_patcher.stop)
+
+        resource_accounting.reset()
+        self.addCleanup(resource_accounting.reset)
+
+    def test_histogram_is_bounded(self):
+        """Test that the histogram keeps fixed buckets and estimates percentiles"""
+        histogram = Histogram((1, 10, 100))
+        for value in [0.5] * 90 + [50] * 9 + [10 ** 6]:
+            histogram.add(value)
+
+        self.assertEqual(histogram.counts, [90, 0, 9, 1])
+        self.assertEqual(histogram.percentile(50), 1)
+        self.assertEqual(histogram.percentile(95), 100)
+        self.assertEqual(histogram.percentile(100), 100)
+
+    def test_request_is_attributed_to_module(self):
+        """Test that time, queries and response size are counted against the module"""
+        def shop_view(request):
+            list(User.objects.all())
+            list(Group.objects.all())
+            return HttpResponse("x" * 100)
+
+        middleware = ModularEngineMiddleware(shop_view)
+        with CaptureQueriesContext(connection) as queries:
+            middleware(self.factory.get('/shop/items/'))
+        # Requests outside any module are not accounted
+        middleware(self.factory.get('/admin/'))
+
+        usage = resource_accounting.snapshot()
+        self.assertEqual(list(usage), ['shop'])
+        self.assertEqual(usage['shop']['requests'], 1)
+        self.assertEqual(usage['shop']['queries'], len(queries))
+        self.assertEqual(usage['shop']['response_bytes'], 100)
+        self.assertIsNotNone(usage['shop']['avg_cpu_ms'])
+        self.assertEqual(sum(usage['shop']['histograms']['wall_ms']['counts']), 1)
+
+    def test_errors_are_counted(self):
+        """Test that failing requests count as errors"""
+        def failing_view(request):
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            ModularEngineMiddleware(failing_view)(self.factory.get('/shop/'))
+        ModularEngineMiddleware(lambda request: HttpResponse(status=503))(self.factory.get('/shop/'))
+
+        usage = resource_accounting.snapshot('shop')['shop']
+        self.assertEqual(usage['requests'], 2)
+        self.assertEqual(usage['errors'], 2)
+
+    def test_rolling_window(self):
+        """Test that usage older than the window is dropped"""
+        accounting = ResourceAccounting(window=120, slot_seconds=60)
+
+        with patch('modular_engine.accounting.time.time', return_value=0):
+            with accounting.measure('shop') as usage:
+                usage.finish(HttpResponse())
+        with patch('modular_engine.accounting.time.time', return_value=60):
+            self.assertEqual(accounting.snapshot()['shop']['requests'], 1)
+        with patch('modular_engine.accounting.time.time', return_value=120):
+            self.assertEqual(accounting.snapshot(), {})
+
+        # At most window / slot_seconds slots are kept per module
+        for now in range(0, 600, 60):
+            with patch('modular_engine.accounting.time.time', return_value=now):
+                with accounting.measure('shop'):
+                    pass
+        self.assertEqual(len(accounting._slots['shop']), 2)
+
+    async def test_async_queries_are_counted(self):
+        """Test that queries run in sync_to_async threads count against the module"""
+        async def shop_view(request):
+            await User.objects.acount()
+            return HttpResponse("OK")
+
+        middleware = ModularEngineMiddleware(shop_view)
+        await middleware(AsyncRequestFactory().get('/shop/'))
+
+        usage = resource_accounting.snapshot('shop')['shop']
+        # The module access check and the view's count
+        self.assertGreaterEqual(usage['queries'], 2)
+        self.assertIsNone(usage['avg_cpu_ms'])
+
+    def test_usage_view(self):
+        """Test the staff-only usage endpoint and the module list table"""
+        with resource_accounting.measure('shop') as usage:
+            usage.finish(HttpResponse("OK"))
+        user = User.objects.create_user(username='staff', password='password', is_staff=True)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('modular_engine:module_usage'))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['modules'][0]['module_id'], 'shop')
+        self.assertEqual(data['modules'][0]['wall_share'], 100)
+
+        response = self.client.get(reverse('modular_engine:module_list'))
+        self.assertContains(response, 'Resource Usage')
@@ -0,0 +1,196 @@
+import logging
+import math
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """
+    Parse a rate such as '100/s', '600/m' or '5000/h' into a
+    (requests, seconds) tuple. A bare number means requests per second.
+    """
+    if isinstance(rate, (int, float)):
+        return rate, 1
+
+    try:
+        requests, period = str(rate).split('/')
+        return int(requests), RATE_PERIODS[period.strip()[0].lower()]
+    except (ValueError, KeyError, IndexError):
+        raise ImproperlyConfigured(f"Invalid module rate limit '{rate}'")
+
+
+class TokenBucket:
+    """In-process token bucket allowing bursts of up to `capacity` requests"""
+
+    def __init__(self, requests, seconds):
+        self.capacity = requests
+        self.refill_rate = requests / seconds
+        self.tokens = float(requests)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self):
+        """Take a token; return 0 on success or the seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.refill_rate
+
+
+class ConcurrencyLimiter:
+    """Non-blocking in-process semaphore; a full limiter rejects instead of queueing"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+class CacheRateLimiter:
+    """Fixed-window request counter shared by every worker through the cache"""
+
+    def __init__(self, cache, key, requests, seconds):
+        self.cache = cache
+        self.key = key
+        self.requests = requests
+        self.seconds = seconds
+
+    def consume(self):
+        window = int(time.time() // self.seconds)
+        key = f"{self.key}:{window}"
+        self.cache.add(key, 0, self.seconds + 1)
+        if self.cache.incr(key) <= self.requests:
+            return 0
+        return (window + 1) * self.seconds - time.time()
+
+
+class CacheConcurrencyLimiter:
+    """In-flight request counter shared by every worker through the cache"""
+
+    def __init__(self, cache, key, limit, timeout):
+        self.cache = cache
+        self.key = key
+        self.limit = limit
+        # Bounds how long counts leaked by a crashed worker can linger
+        self.timeout = timeout
+
+    def acquire(self):
+        self.cache.add(self.key, 0, self.timeout)
+        if self.cache.incr(self.key) <= self.limit:
+            return True
+        self.cache.decr(self.key)
+        return False
+
+    def release(self):
+        try:
+            self.cache.decr(self.key)
+        except ValueError:
+            # The key expired while the request was running
+            pass
+
+
+class ModuleThrottle:
+    """
+    Rate limit and concurrency cap of one module.
+
+    Counters are kept in process unless settings.MODULE_THROTTLE_CACHE names
+    a cache alias, in which case they are shared by all workers using it.
+    If the shared cache fails, requests are let through.
+    """
+
+    def __init__(self, module_id, max_concurrency=None, rate_limit=None):
+        self.module_id = module_id
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+
+        cache_alias = getattr(settings, 'MODULE_THROTTLE_CACHE', None)
+        self.shared = cache_alias is not None
+        self.rate_limiter = None
+        self.concurrency_limiter = None
+
+        if self.shared:
+            cache = caches[cache_alias]
+            key = f"modular_engine:throttle:{module_id}"
+            if rate_limit:
+                self.rate_limiter = CacheRateLimiter(cache, f"{key}:rate", *parse_rate(rate_limit))
+            if max_concurrency:
+                self.concurrency_limiter = CacheConcurrencyLimiter(
+                    cache, f"{key}:active", max_concurrency,
+                    getattr(settings, 'MODULE_THROTTLE_CONCURRENCY_TIMEOUT', 300))
+        else:
+            if rate_limit:
+                self.rate_limiter = TokenBucket(*parse_rate(rate_limit))
+            if max_concurrency:
+                self.concurrency_limiter = ConcurrencyLimiter(max_concurrency)
+
+    def acquire(self):
+        """
+        Admit a request. Returns a (rejection, held) tuple: the response to
+        send instead of running the request, or None, and whether a
+        concurrency slot was taken that release() must give back.
+        """
+        try:
+            if self.rate_limiter is not None:
+                retry_after = self.rate_limiter.consume()
+                if retry_after:
+                    return self.reject(429, "Too many requests", retry_after), False
+
+            if self.concurrency_limiter is None:
+                return None, False
+            if not self.concurrency_limiter.acquire():
+                return self.reject(503, "Service temporarily unavailable", 1), False
+            return None, True
+        except Exception as e:
+            if not self.shared:
+                raise
+            logger.warning(f"Module throttle cache failed for {self.module_id}: {e}")
+            return None, False
+
+    def release(self):
+        try:
+            self.concurrency_limiter.release()
+        except Exception as e:
+            if not self.shared:
+                raise
+            logger.warning(f"Module throttle cache failed for {self.module_id}: {e}")
+
+    async def aacquire(self):
+        if self.shared:
+            return await sync_to_async(self.acquire)()
+        return self.acquire()
+
+    async def arelease(self):
+        if self.shared:
+            return await sync_to_async(self.release)()
+        return self.release()
+
+    def reject(self, status, message, retry_after):
+        response = HttpResponse(
+            f"{message} for module '{self.module_id}'", status=status, content_type='text/plain')
+        response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
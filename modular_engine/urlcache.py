@@ -0,0 +1,158 @@
+import re
+import threading
+import weakref
+from urllib.parse import quote
+from django.urls import get_resolver, get_script_prefix, get_urlconf, reverse
+from django.utils.http import RFC3986_SUBDELIMS, escape_leading_slashes
+from django.utils.translation import get_language
+
+
+class RouteTemplate:
+    """
+    One precompiled way of building a named URL: the path format string
+    (e.g. 'product/%(pk)s/'), its parameter names and converters, and the
+    compiled pattern used to validate the interpolated path.
+    """
+
+    __slots__ = ('format', 'params', 'converters', 'defaults', 'regex')
+
+    def __init__(self, format, params, pattern, defaults, converters):
+        self.format = format
+        self.params = params
+        self.converters = converters
+        self.defaults = defaults
+        self.regex = re.compile('^' + pattern)
+
+    def build(self, args, kwargs):
+        """Return the interpolated path, or None if the arguments don't fit this route"""
+        if args:
+            if len(args) != len(self.params):
+                return None
+            candidate_subs = dict(zip(self.params, args))
+        else:
+            if set(kwargs).symmetric_difference(self.params).difference(self.defaults):
+                return None
+            for key, value in self.defaults.items():
+                if key not in self.params and kwargs.get(key, value) != value:
+                    return None
+            candidate_subs = kwargs
+
+        text_subs = {}
+        for key, value in candidate_subs.items():
+            converter = self.converters.get(key)
+            if converter is None:
+                text_subs[key] = str(value)
+                continue
+            try:
+                text_subs[key] = converter.to_url(value)
+            except ValueError:
+                return None
+
+        url = self.format % text_subs
+        if not self.regex.search(url):
+            return None
+        return url
+
+
+class BoundReverse:
+    """
+    URL building for one URLconf, script prefix and language, captured once
+    so a template rendering many URLs doesn't look them up for every tag.
+    """
+
+    __slots__ = ('cache', 'resolver', 'prefix', 'language', 'routes_by_name')
+
+    def __init__(self, cache, resolver, prefix, language, routes_by_name):
+        self.cache = cache
+        self.resolver = resolver
+        self.prefix = prefix
+        self.language = language
+        self.routes_by_name = routes_by_name
+
+    def reverse(self, viewname, args=None, kwargs=None):
+        """Drop-in for reverse() for non-namespaced URL names"""
+        if not isinstance(viewname, str) or ':' in viewname:
+            return reverse(viewname, args=args, kwargs=kwargs)
+
+        args = args or ()
+        kwargs = kwargs or {}
+        if args and kwargs:
+            # Let reverse() raise its usual error
+            return reverse(viewname, args=args, kwargs=kwargs)
+
+        routes = self.routes_by_name.get(viewname)
+        if routes is None:
+            routes = self.cache.compile(self.resolver, self.language, viewname)
+
+        for route in routes:
+            path = route.build(args, kwargs)
+            if path is not None:
+                # The quoted URL is plain ASCII, so iri_to_uri() would not change it
+                return escape_leading_slashes(
+                    quote(self.prefix + path, safe=RFC3986_SUBDELIMS + "/~:@"))
+
+        # No match: reverse() raises NoReverseMatch with the full explanation
+        return reverse(viewname, args=args, kwargs=kwargs)
+
+
+class ReverseCache:
+    """
+    Cache of RouteTemplates per URL name, kept per resolver and language.
+
+    get_resolver() hands out a new resolver whenever the URL caches are
+    cleared, so a reloaded URLconf never sees templates compiled for the
+    previous one. ModuleRegistry also clears the cache explicitly when it
+    reloads URLs. Namespaced names, which may depend on the current app,
+    always go through reverse().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._templates = weakref.WeakKeyDictionary()
+
+    def bind(self):
+        """Capture the current thread's URLconf, script prefix and language"""
+        resolver = get_resolver(get_urlconf())
+        language = get_language()
+
+        by_language = self._templates.get(resolver)
+        if by_language is None:
+            with self._lock:
+                by_language = self._templates.setdefault(resolver, {})
+
+        routes_by_name = by_language.get(language)
+        if routes_by_name is None:
+            with self._lock:
+                routes_by_name = by_language.setdefault(language, {})
+
+        return BoundReverse(self, resolver, get_script_prefix(), language, routes_by_name)
+
+    def reverse(self, viewname, args=None, kwargs=None):
+        return self.bind().reverse(viewname, args=args, kwargs=kwargs)
+
+    def get_routes(self, viewname):
+        bound = self.bind()
+        routes = bound.routes_by_name.get(viewname)
+        if routes is None:
+            routes = self.compile(bound.resolver, bound.language, viewname)
+        return routes
+
+    def compile(self, resolver, language, viewname):
+        """Build and store the RouteTemplates for a URL name"""
+        routes = [
+            RouteTemplate(format, params, pattern, defaults, converters)
+            for possibility, pattern, defaults, converters in resolver.reverse_dict.getlist(viewname)
+            for format, params in possibility
+        ]
+
+        with self._lock:
+            by_language = self._templates.setdefault(resolver, {})
+            by_language.setdefault(language, {})[viewname] = routes
+        return routes
+
+    def clear(self):
+        with self._lock:
+            self._templates = weakref.WeakKeyDictionary()
+
+
+url_cache = ReverseCache()
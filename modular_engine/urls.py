@@ -8,6 +8,15 @@ urlpatterns = [
     path('install/<str:module_id>/', views.install_module, name='install_module'),
     path('uninstall/<str:module_id>/', views.uninstall_module, name='uninstall_module'),
     path('upgrade/<str:module_id>/', views.upgrade_module_view, name='upgrade_module'),
+    path('hot-reload/<str:module_id>/', views.hot_reload_module, name='hot_reload_module'),
     path('update-path/<str:module_id>/', views.update_module_path, name='update_module_path'),
     path('reload-urls/', views.reload_urls, name='reload_urls'),
+    path('jobs/status/', views.job_status, name='job_status'),
+    path('health/', views.module_health, name='module_health'),
+    path('usage/', views.module_usage, name='module_usage'),
+    path('canary/stats/', views.canary_stats, name='canary_stats'),
+    path('canary/start/<str:module_id>/', views.start_canary, name='start_canary'),
+    path('canary/percent/<str:module_id>/', views.set_canary_percent, name='set_canary_percent'),
+    path('canary/promote/<str:module_id>/', views.promote_canary, name='promote_canary'),
+    path('canary/stop/<str:module_id>/', views.stop_canary, name='stop_canary'),
 ] 
@@ -1,12 +1,18 @@
+import uuid
 from django.contrib import messages
+from django.http import JsonResponse
 from django.shortcuts import redirect
-from django.urls import reverse, clear_url_caches, set_urlconf
-from django.views.decorators.http import require_POST
+from django.urls import reverse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import ListView
-from django.conf import settings
 
+from modular_engine.accounting import resource_accounting
+from modular_engine.canary import version_stats
+from modular_engine.health import readiness
+from modular_engine.jobs import enqueue_job, worker, ACTIVE_STATUSES
 from modular_engine.module_registry import get_registry, register_modules_from_settings
-from modular_engine.models import Module
+from modular_engine.models import Module, ModuleJob
 from .decorators import staff_required
 
 
@@ -34,28 +40,75 @@ class ModuleListView(ListView):
 
         return modules
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
 
-@require_POST
-@staff_required
-def install_module(request, module_id):
-    """View to install a module"""
+        # Jobs still in progress are polled from the page
+        active_jobs = list(ModuleJob.objects.filter(status__in=ACTIVE_STATUSES))
+        if active_jobs:
+            # Make sure queued jobs get picked up, e.g. after a restart
+            worker.wake()
+        context['active_jobs'] = active_jobs
+
+        # Per-render token for idempotency keys, so a resubmitted form reuses its job
+        context['form_token'] = uuid.uuid4().hex
+
+        context['module_usage'] = get_module_usage()
+        context['usage_window_minutes'] = resource_accounting.window // 60
+        return context
+
+
+def get_module_usage(module_id=None):
+    """
+    Return the rolling resource usage summaries of this worker as a list,
+    each with the module's share of the total wall and CPU time.
+    """
+    usage = resource_accounting.snapshot(module_id)
+    total_wall = sum(summary['wall_seconds'] for summary in usage.values())
+    total_cpu = sum(summary['cpu_seconds'] for summary in usage.values())
+
+    modules = []
+    for usage_module_id, summary in usage.items():
+        summary['module_id'] = usage_module_id
+        summary['wall_share'] = summary['wall_seconds'] / total_wall * 100 if total_wall else 0.0
+        summary['cpu_share'] = summary['cpu_seconds'] / total_cpu * 100 if total_cpu else 0.0
+        modules.append(summary)
+    return modules
+
+
+def _enqueue_module_job(request, action, module_id, base_path=None):
+    """Queue a module job from a POST request and report it through messages"""
     registry = get_registry()
 
-    # Get the base path from the POST data if provided
-    base_path = request.POST.get('base_path', None)
+    if module_id not in registry.available_modules:
+        messages.error(
+            request, f"Module '{module_id}' not found", extra_tags='danger')
+        return redirect(reverse('modular_engine:module_list'))
 
-    success = registry.install_module(module_id, base_path=base_path)
+    job, created = enqueue_job(
+        action, module_id, base_path=base_path,
+        idempotency_key=request.POST.get('idempotency_key') or None)
 
-    if success:
+    if created:
         messages.success(
-            request, f"Module '{module_id}' installed successfully")
+            request, f"Module '{module_id}' {action} has been queued")
     else:
-        messages.error(
-            request, f"Failed to install module '{module_id}'", extra_tags='danger')
+        messages.info(
+            request, f"Module '{module_id}' {action} is already {job.status}")
 
     return redirect(reverse('modular_engine:module_list'))
 
 
+@require_POST
+@staff_required
+def install_module(request, module_id):
+    """View to queue the installation of a module"""
+    # Get the base path from the POST data if provided
+    base_path = request.POST.get('base_path', None)
+
+    return _enqueue_module_job(request, 'install', module_id, base_path=base_path)
+
+
 @require_POST
 @staff_required
 def uninstall_module(request, module_id):
@@ -77,16 +130,159 @@ def uninstall_module(request, module_id):
 @require_POST
 @staff_required
 def upgrade_module_view(request, module_id):
-    """View to upgrade a module"""
+    """View to queue the upgrade of a module"""
+    return _enqueue_module_job(request, 'upgrade', module_id)
+
+
+@require_POST
+@staff_required
+def hot_reload_module(request, module_id):
+    """
+    View to re-import a module's code without a restart: here right away,
+    and in the other workers within MODULE_CODE_CHECK_SECONDS
+    """
     registry = get_registry()
 
-    success = registry.upgrade_module(module_id)
+    if registry.request_hot_reload(module_id):
+        messages.success(
+            request, f"Module '{module_id}' code reloaded; other workers follow shortly")
+    else:
+        messages.error(
+            request, f"Failed to reload code of module '{module_id}'", extra_tags='danger')
 
-    if success:
+    return redirect(reverse('modular_engine:module_list'))
+
+
+@require_GET
+@staff_required
+def job_status(request):
+    """Lightweight JSON status of module jobs, polled by the module list page"""
+    jobs = ModuleJob.objects.order_by('id')
+
+    ids = [job_id for job_id in request.GET.get('ids', '').split(',') if job_id.isdigit()]
+    if ids:
+        jobs = jobs.filter(pk__in=ids)
+    else:
+        jobs = jobs.filter(status__in=ACTIVE_STATUSES)
+
+    return JsonResponse({
+        'jobs': list(jobs.values(
+            'id', 'action', 'module_id', 'status', 'attempts', 'max_attempts', 'error')),
+    })
+
+
+@never_cache
+@require_GET
+def module_health(request):
+    """
+    Readiness endpoint for load balancers: 503 until this worker has warmed
+    up, then the result of every installed module's health check.
+    """
+    status, payload = readiness.check()
+    return JsonResponse(payload, status=status)
+
+
+@require_GET
+@staff_required
+def canary_stats(request):
+    """JSON view of running canaries and per-version request, error and latency counters"""
+    registry = get_registry()
+
+    return JsonResponse({
+        'canaries': [
+            {
+                'module_id': canary.module_id,
+                'version': canary.version,
+                'percent': canary.percent,
+                'base_path': canary.base_path,
+            }
+            for canary in registry.canaries.values()
+        ],
+        'versions': version_stats.snapshot(request.GET.get('module_id') or None),
+    })
+
+
+@require_GET
+@staff_required
+def module_usage(request):
+    """JSON view of the rolling per-module resource usage of this worker"""
+    return JsonResponse({
+        'window_seconds': resource_accounting.window,
+        'modules': get_module_usage(request.GET.get('module_id') or None),
+    })
+
+
+def _get_percent(request):
+    """The canary percentage posted with the request, or None if it isn't a number"""
+    try:
+        return int(request.POST.get('percent', ''))
+    except ValueError:
+        return None
+
+
+@require_POST
+@staff_required
+def start_canary(request, module_id):
+    """View to serve a module's code on disk, as a new version, to a percentage of clients"""
+    registry = get_registry()
+    percent = _get_percent(request)
+
+    if percent is not None and registry.start_canary_from_code(module_id, percent):
         messages.success(
-            request, f"Module '{module_id}' upgraded successfully")
+            request, f"Canary {registry.canaries[module_id].version} of module '{module_id}' "
+                     f"started for {percent}% of clients")
     else:
-        messages.error(request, f"Failed to upgrade module '{module_id}'", extra_tags='danger')
+        messages.error(
+            request, f"Failed to start a canary of module '{module_id}'", extra_tags='danger')
+
+    return redirect(reverse('modular_engine:module_list'))
+
+
+@require_POST
+@staff_required
+def set_canary_percent(request, module_id):
+    """View to change the share of clients routed to a module's canary"""
+    registry = get_registry()
+    percent = _get_percent(request)
+
+    if percent is not None and registry.set_canary_percent(module_id, percent):
+        messages.success(
+            request, f"Canary of module '{module_id}' now serves {percent}% of clients")
+    else:
+        messages.error(
+            request, f"Failed to change the canary of module '{module_id}'", extra_tags='danger')
+
+    return redirect(reverse('modular_engine:module_list'))
+
+
+@require_POST
+@staff_required
+def promote_canary(request, module_id):
+    """View to make a module's canary version the version served to everyone"""
+    registry = get_registry()
+
+    if registry.promote_canary(module_id):
+        messages.success(
+            request, f"Canary of module '{module_id}' promoted successfully")
+    else:
+        messages.error(
+            request, f"Failed to promote canary of module '{module_id}'", extra_tags='danger')
+
+    return redirect(reverse('modular_engine:module_list'))
+
+
+@require_POST
+@staff_required
+def stop_canary(request, module_id):
+    """View to route every client back to the current version of a module"""
+    registry = get_registry()
+
+    if registry.stop_canary(module_id):
+        messages.success(
+            request, f"Canary of module '{module_id}' stopped")
+    else:
+        messages.error(
+            request, f"Module '{module_id}' has no running canary", extra_tags='danger')
 
     return redirect(reverse('modular_engine:module_list'))
 
@@ -119,21 +315,12 @@ def update_module_path(request, module_id):
     return redirect(reverse('modular_engine:module_list'))
 
 
+@require_POST
+@staff_required
 def reload_urls(request):
     """View to manually force URL reload"""
-    # Clear URL caches
-    clear_url_caches()
-
-    # Reset the URLconf for the current thread
-    set_urlconf(None)
-
-    # Reload main URLconf module if needed
-    if hasattr(settings, 'ROOT_URLCONF'):
-        import sys
-        import importlib
-        urlconf = settings.ROOT_URLCONF
-        if urlconf in sys.modules:
-            importlib.reload(sys.modules[urlconf])
+    # Rebuilds the root URLconf and the canary URLconfs derived from it
+    get_registry()._reload_urls()
 
     messages.success(request, "URL patterns reloaded successfully")
     return redirect(reverse('modular_engine:module_list'))
@@ -1,15 +1,198 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from product.models import Product
-from product.permissions import PRODUCT_USER_GROUP, PRODUCT_MANAGER_GROUP
+from product.models import InventorySummary, PriceHistory, Product, ProductChange, StockMovement, StockSnapshot
+from product.forms import PriceAdjustmentForm
+from product.permissions import PRODUCT_USER_GROUP, PRODUCT_MANAGER_GROUP, user_can_update_price
+from product.archive import archive_products, restore_products
+from product.pricing import apply_price_update, preview_price_update
+from product.stock import open_stock_ledger
+
+class ArchivedListFilter(admin.SimpleListFilter):
+    title = 'status'
+    parameter_name = 'archived'
+
+    def lookups(self, request, model_admin):
+        return [('no', 'Active'), ('yes', 'Archived')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'no':
+            return queryset.alive()
+        if self.value() == 'yes':
+            return queryset.archived()
+        return queryset
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'barcode', 'price', 'stock', 'created_at', 'updated_at')
+    """
+    Lists archived products too. The bulk delete action is replaced by
+    archiving, which updates the selected products in a few statements
+    instead of loading and deleting them one by one, and the delete button
+    archives as well. Stock is read-only
+    once a product exists; it is changed from the product stock page.
+    """
+    list_display = ('name', 'barcode', 'price', 'stock', 'created_at', 'updated_at', 'deleted_at')
     search_fields = ('name', 'barcode')
-    list_filter = ('created_at', 'updated_at')
-    readonly_fields = ('created_at', 'updated_at')
+    list_filter = (ArchivedListFilter, 'created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'deleted_at')
+    actions = ['bulk_update_prices', 'archive_selected', 'restore_selected']
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly_fields = list(super().get_readonly_fields(request, obj))
+        if obj is not None:
+            # Stock only changes through movements in the stock ledger
+            readonly_fields.append('stock')
+            # Like the site form, only users who can update prices change them
+            if not self.has_update_price_permission(request):
+                readonly_fields.append('price')
+        return readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            # The initial stock is the product's opening balance in the ledger
+            open_stock_ledger(obj, user=request.user)
+
+    def delete_model(self, request, obj):
+        # The delete button archives too, keeping the ledger and price history
+        archive_products(Product.all_objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        archive_products(queryset)
+
+    def get_deleted_objects(self, objs, request):
+        # Archiving leaves the rows that reference the products in place
+        objs = list(objs)
+        return [str(obj) for obj in objs], {Product._meta.verbose_name_plural: len(objs)}, set(), []
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def has_update_price_permission(self, request):
+        return user_can_update_price(request.user)
+
+    @admin.action(description="Delete selected products (archive)", permissions=['delete'])
+    def archive_selected(self, request, queryset):
+        archived = archive_products(queryset)
+        self.message_user(request, f"Archived {archived} products", messages.SUCCESS)
+
+    @admin.action(description="Restore selected archived products", permissions=['delete'])
+    def restore_selected(self, request, queryset):
+        restored = restore_products(queryset)
+        self.message_user(request, f"Restored {restored} products", messages.SUCCESS)
+
+    @admin.action(description="Adjust prices of selected products", permissions=['update_price'])
+    def bulk_update_prices(self, request, queryset):
+        """
+        Ask for the adjustment, show an aggregate preview of its effect and
+        apply it with set-based updates once confirmed.
+        """
+        form = PriceAdjustmentForm(request.POST if 'mode' in request.POST else None)
+        preview = None
+        # Archived products aren't repriced
+        queryset = queryset.alive()
+
+        if form.is_valid():
+            adjustment = form.cleaned_data['adjustment']
+            if 'apply' in request.POST:
+                updated = apply_price_update(queryset, adjustment)
+                self.message_user(request, f"Repriced {updated} products by {adjustment}", messages.SUCCESS)
+                return None
+            preview = preview_price_update(queryset, adjustment)
+
+        return TemplateResponse(request, 'admin/product/bulk_price_update.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Adjust prices',
+            'opts': self.model._meta,
+            'form': form,
+            'preview': preview,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'product_count': queryset.count() if preview is None else preview['products'],
+        })
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Read-only view of the stock ledger; movements are recorded from the product stock page"""
+    list_display = ('product', 'quantity', 'reason', 'note', 'created_by', 'created_at')
+    list_filter = ('reason',)
+    list_select_related = ('product', 'created_by')
+    search_fields = ('product__name', 'product__barcode')
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    """Read-only; entries are recorded whenever a product's price changes"""
+    list_display = ('product', 'old_price', 'price', 'changed_at')
+    list_select_related = ('product',)
+    search_fields = ('product__name', 'product__barcode')
+    date_hierarchy = 'changed_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductChange)
+class ProductChangeAdmin(admin.ModelAdmin):
+    """Read-only; the change log behind the product change feed"""
+    list_display = ('id', 'product_id', 'action', 'changed_at')
+    list_filter = ('action',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(InventorySummary)
+class InventorySummaryAdmin(admin.ModelAdmin):
+    """Read-only; the totals are maintained by signals and the reconcile_inventory command"""
+    list_display = ('product_count', 'total_units', 'total_value', 'low_stock_count',
+                    'out_of_stock_count', 'updated_at', 'reconciled_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('product', 'stock', 'movement_count', 'taken_at')
+    list_select_related = ('product',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # Custom admin action to add users to product groups
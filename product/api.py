@@ -0,0 +1,71 @@
+from product.models import Product
+
+# Fields the JSON API can return; ?fields= picks a subset
+API_FIELDS = ('id', 'name', 'barcode', 'price', 'stock', 'created_at', 'updated_at')
+DEFAULT_API_FIELDS = ('id', 'name', 'barcode', 'price', 'stock')
+
+# Lookups for batch fetches: query parameter -> unique field
+BATCH_KEYS = {'ids': 'id', 'barcodes': 'barcode'}
+
+
+def parse_fields(value):
+    """
+    Return the projection for a comma separated ?fields= value, always
+    starting with id. Raises ValueError for unknown fields.
+    """
+    if not value:
+        return DEFAULT_API_FIELDS
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = sorted(set(fields) - set(API_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return ('id',) + tuple(dict.fromkeys(field for field in fields if field != 'id'))
+
+
+def parse_batch(key, value, max_size):
+    """Return the list of ids or barcodes of a batch fetch. Raises ValueError if invalid."""
+    values = list(dict.fromkeys(item.strip() for item in value.split(',') if item.strip()))
+    if key == 'ids':
+        try:
+            values = [int(item) for item in values]
+        except ValueError:
+            raise ValueError("ids must be integers")
+    if not values:
+        raise ValueError(f"{key} can't be empty")
+    if len(values) > max_size:
+        raise ValueError(f"At most {max_size} {key} can be fetched at once")
+    return values
+
+
+async def aget_product_page(fields, after=0, limit=100):
+    """
+    Return a page of products in id order after id `after`, as dicts of
+    `fields` built from value tuples, and the `after` of the next page (None
+    on the last page). Keyset pagination: every page is a range scan of the
+    primary key, however deep it is.
+    """
+    rows = [
+        row async for row in Product.objects.filter(id__gt=after)
+        .order_by('id').values_list(*fields)[:limit + 1]
+    ]
+    results = [dict(zip(fields, row)) for row in rows[:limit]]
+    next_after = results[-1]['id'] if len(rows) > limit else None
+    return results, next_after
+
+
+async def aget_products_by(key, values, fields):
+    """
+    Fetch the products whose `key` ('ids' or 'barcodes') is in values with a
+    single in_bulk() query deferring the fields that weren't asked for.
+    Returns ({value: product dict}, [values not found]).
+    """
+    field_name = BATCH_KEYS[key]
+    only = set(fields) | {field_name}
+    products = await Product.objects.only(*only).ain_bulk(values, field_name=field_name)
+
+    results = {
+        value: {field: getattr(product, field) for field in fields}
+        for value, product in products.items()
+    }
+    missing = [value for value in values if value not in products]
+    return results, missing
@@ -0,0 +1,91 @@
+import time
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+from product.changes import record_product_changes
+from product.inventory import SUMMARY_FIELDS, apply_inventory_delta, compute_inventory
+from product.models import Product, ProductChange
+
+
+def _change_archived(queryset, deleted_at, action, sign, chunk_size):
+    """
+    Set deleted_at on the products of the queryset in chunks of `chunk_size`
+    primary keys, moving the inventory summary by `sign` times their totals
+    and logging `action` for each. Returns the number of changed products.
+    """
+    queryset = queryset.order_by()
+    changed = 0
+    with transaction.atomic():
+        while True:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return changed
+
+            chunk = Product.all_objects.filter(pk__in=ids)
+            totals = compute_inventory(chunk)
+            chunk.update(deleted_at=deleted_at, updated_at=timezone.now())
+            apply_inventory_delta({field: sign * totals[field] for field in SUMMARY_FIELDS if totals[field]})
+            record_product_changes(ids, action)
+            changed += len(ids)
+
+
+def archive_products(queryset, chunk_size=1000):
+    """
+    Soft delete the products of the queryset with set-based UPDATEs, without
+    loading them. They leave the inventory summary and the change feed
+    reports them as deleted. Returns the number of archived products.
+    """
+    return _change_archived(
+        queryset.filter(deleted_at__isnull=True), timezone.now(), ProductChange.DELETED, -1, chunk_size)
+
+
+def restore_products(queryset, chunk_size=1000):
+    """Undo archive_products() for the archived products of the queryset"""
+    return _change_archived(
+        queryset.filter(deleted_at__isnull=False), None, ProductChange.CREATED, 1, chunk_size)
+
+
+def purge_archived_products(before, chunk_size=1000, pause=0):
+    """
+    Hard-delete the products archived at or before `before`, together with
+    the rows that reference them, in chunks of `chunk_size` products. Returns
+    the number of purged products.
+
+    Each chunk is its own short transaction of raw DELETE ... WHERE IN
+    statements: no objects are loaded and no signals are sent, so memory
+    stays flat and locks are only held briefly. `pause` seconds between
+    chunks leave room for other writers. Archived products are already out
+    of the inventory summary and logged as deleted, so there's nothing else
+    to update. The change log is kept.
+    """
+    alias = router.db_for_write(Product)
+    connection = connections[alias]
+    qn = connection.ops.quote_name
+    # Rows deleted along with a product; on_delete isn't applied by raw deletes
+    cascades = [
+        (relation.related_model._meta.db_table, relation.field.column)
+        for relation in Product._meta.related_objects
+        if relation.on_delete is models.CASCADE
+    ]
+    archived = Product.all_objects.using(alias).filter(deleted_at__lte=before)
+
+    purged = 0
+    while True:
+        with transaction.atomic(using=alias):
+            # The product_archived_idx partial index only holds archived products
+            ids = list(archived.order_by('deleted_at').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return purged
+
+            placeholders = ', '.join(['%s'] * len(ids))
+            with connection.cursor() as cursor:
+                for table, column in cascades:
+                    cursor.execute(f"DELETE FROM {qn(table)} WHERE {qn(column)} IN ({placeholders})", ids)
+                cursor.execute(
+                    f"DELETE FROM {qn(Product._meta.db_table)} "
+                    f"WHERE {qn(Product._meta.pk.column)} IN ({placeholders}) AND {qn('deleted_at')} IS NOT NULL",
+                    ids,
+                )
+                purged += cursor.rowcount
+
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,193 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from product.changes import get_settled_changes, get_settled_cursor
+from product.models import Product
+
+# Fields of the product snapshots returned by barcode lookups
+SNAPSHOT_FIELDS = ('id', 'name', 'barcode', 'price', 'stock')
+
+
+class BloomFilter:
+    """
+    Set membership in `size` bits with no false negatives and a false
+    positive rate of about `error_rate` up to `capacity` items.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: the k positions are derived from two 64 bit hashes
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, item):
+        """Add an item; `count` only grows for items that weren't (seemingly) in already"""
+        new = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                new = True
+        self.count += new
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BarcodeIndex:
+    """
+    Per-process barcode lookups that skip the database when they can.
+
+    A Bloom filter of every barcode in the product table, archived products
+    included, answers "definitely not taken" without a query. Barcodes that
+    may exist are looked up through an LRU of product snapshots, or None
+    for barcodes of no (active) product, before falling back to the
+    database.
+
+    Saves in this process update the index right away. Changes made by
+    other processes, or by queryset updates, are read from the product
+    change log at most every PRODUCT_BARCODE_REFRESH_SECONDS, so other
+    processes' new barcodes can be missed for that long. The unique
+    constraint on Product.barcode still rejects duplicates at insert time.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything; the next lookup rebuilds the filter"""
+        with self._lock:
+            self._bloom = None
+            # barcode -> snapshot or None, least recently used first
+            self._snapshots = OrderedDict()
+            # product id -> barcode of its cached snapshot
+            self._cached_ids = {}
+            # Bumped by every eviction, so lookups racing a save don't cache stale rows
+            self._generation = 0
+            self._cursor = 0
+            self._refreshed_at = 0.0
+            self.stats = {'bloom_rejects': 0, 'cache_hits': 0, 'queries': 0}
+
+    @property
+    def cache_size(self):
+        return getattr(settings, 'PRODUCT_BARCODE_CACHE_SIZE', 10000)
+
+    def warm(self):
+        """Build the Bloom filter from the product table, sized for twice the current catalog"""
+        # Built without the lock, so lookups carry on with the old filter meanwhile
+        last_change = get_settled_cursor()
+        count = Product.all_objects.count()
+        bloom = BloomFilter(
+            max(count * 2, 10000), getattr(settings, 'PRODUCT_BARCODE_BLOOM_ERROR_RATE', 0.01))
+        for barcode in Product.all_objects.values_list('barcode', flat=True).iterator(chunk_size=10000):
+            bloom.add(barcode)
+
+        with self._lock:
+            self._bloom = bloom
+            self._snapshots.clear()
+            self._cached_ids.clear()
+            self._generation += 1
+            # Changes logged while the filter was built, or maybe not committed yet, are read again
+            self._cursor = last_change
+            self._refreshed_at = time.monotonic()
+
+    def _refresh(self):
+        """Apply the changes logged since the last refresh, at most every few seconds"""
+        interval = getattr(settings, 'PRODUCT_BARCODE_REFRESH_SECONDS', 1.0)
+        if self._bloom is not None and time.monotonic() - self._refreshed_at < interval:
+            return
+
+        with self._lock:
+            if self._bloom is None:
+                # Nothing to answer lookups with until the first filter is built
+                self.warm()
+                return
+            if time.monotonic() - self._refreshed_at < interval:
+                # Another thread just refreshed
+                return
+            self._refreshed_at = time.monotonic()
+
+            changes = get_settled_changes(self._cursor, 10000)
+            if not changes:
+                return
+            self._cursor = changes[-1][0]
+            product_ids = {product_id for _, product_id, _ in changes}
+            barcodes = list(Product.all_objects.filter(pk__in=product_ids).values_list('barcode', flat=True))
+            for barcode in barcodes:
+                self._bloom.add(barcode)
+            self._evict(product_ids, barcodes)
+            outgrown = self._bloom.count > self._bloom.capacity
+
+        if outgrown:
+            # Past its capacity the filter's false positive rate climbs
+            self.warm()
+
+    def _evict(self, product_ids, barcodes):
+        """Drop the cached snapshots of these products, and cached misses of these barcodes"""
+        self._generation += 1
+        for product_id in product_ids:
+            self._snapshots.pop(self._cached_ids.pop(product_id, None), None)
+        for barcode in barcodes:
+            snapshot = self._snapshots.pop(barcode, None)
+            if snapshot is not None:
+                self._cached_ids.pop(snapshot['id'], None)
+
+    def product_saved(self, product):
+        """Index a product saved by this process"""
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(product.barcode)
+                self._evict([product.pk], [product.barcode])
+
+    def might_exist(self, barcode):
+        """False if no product, archived ones included, has this barcode"""
+        self._refresh()
+        with self._lock:
+            if barcode in self._bloom:
+                return True
+            self.stats['bloom_rejects'] += 1
+            return False
+
+    def lookup(self, barcode):
+        """
+        Return a snapshot dict of the active product with this barcode, or
+        None. Snapshots are shared between callers and must not be changed.
+        """
+        if not self.might_exist(barcode):
+            return None
+
+        with self._lock:
+            if barcode in self._snapshots:
+                self._snapshots.move_to_end(barcode)
+                self.stats['cache_hits'] += 1
+                return self._snapshots[barcode]
+            generation = self._generation
+
+        snapshot = Product.objects.filter(barcode=barcode).values(*SNAPSHOT_FIELDS).first()
+        with self._lock:
+            self.stats['queries'] += 1
+            if generation == self._generation:
+                self._snapshots[barcode] = snapshot
+                if snapshot is not None:
+                    self._cached_ids[snapshot['id']] = barcode
+                if len(self._snapshots) > self.cache_size:
+                    _, evicted = self._snapshots.popitem(last=False)
+                    if evicted is not None:
+                        self._cached_ids.pop(evicted['id'], None)
+        return snapshot
+
+
+# The index of this process
+barcode_index = BarcodeIndex()
@@ -0,0 +1,124 @@
+import datetime
+from django.conf import settings
+from django.utils import timezone
+from product.models import Product, ProductChange
+
+# Fields of the current product state included in the feed
+FEED_FIELDS = ('id', 'name', 'barcode', 'price', 'stock', 'updated_at')
+
+
+def record_product_change(product_id, action):
+    """Append an entry for one product to the change log"""
+    return ProductChange.objects.create(product_id=product_id, action=action)
+
+
+def record_product_changes(product_ids, action, batch_size=1000):
+    """Append an entry per product to the change log with batched INSERTs"""
+    now = timezone.now()
+    return ProductChange.objects.bulk_create(
+        [ProductChange(product_id=product_id, action=action, changed_at=now) for product_id in product_ids],
+        batch_size=batch_size,
+    )
+
+
+def get_settle_time():
+    """
+    Entries older than this are taken as committed. Ids are allocated when a
+    transaction inserts its entry, not when it commits, so a newer entry can
+    become visible before an older one; transactions that log product
+    changes must finish within PRODUCT_CHANGES_SETTLE_SECONDS.
+    """
+    return timezone.now() - datetime.timedelta(seconds=getattr(settings, 'PRODUCT_CHANGES_SETTLE_SECONDS', 60))
+
+
+def settled_entries(entries, since):
+    """
+    Cut change log entries, tuples ordered by id that start with the id and
+    end with changed_at, before the first gap in the ids after `since` that
+    may still be filled by an uncommitted transaction. Gaps in front of
+    entries older than the settle time are rolled back inserts and skipped.
+    """
+    settled_before = get_settle_time()
+    previous = since
+    for index, entry in enumerate(entries):
+        if entry[0] != previous + 1 and entry[-1] > settled_before:
+            return entries[:index]
+        previous = entry[0]
+    return entries
+
+
+def get_settled_changes(since, limit):
+    """Return up to `limit` settled (id, product_id, changed_at) log entries after cursor `since`"""
+    return settled_entries(list(
+        ProductChange.objects.filter(id__gt=since)
+        .order_by('id').values_list('id', 'product_id', 'changed_at')[:limit]
+    ), since)
+
+
+def get_settled_cursor():
+    """
+    Return a cursor below every entry that may still be uncommitted, for
+    readers that load the current product state and follow the log from there.
+    """
+    return (
+        ProductChange.objects.filter(changed_at__lte=get_settle_time())
+        .order_by('-id').values_list('id', flat=True).first() or 0
+    )
+
+
+def serialize_product(product):
+    data = {field: getattr(product, field) for field in FEED_FIELDS}
+    data['price'] = str(data['price'])
+    data['updated_at'] = data['updated_at'].isoformat()
+    return data
+
+
+async def aget_product_changes(since=0, limit=100):
+    """
+    Return a page of the change feed after cursor `since`:
+    {'changes': [...], 'cursor': ..., 'has_more': ...}.
+
+    The page scans at most `limit` log entries along the primary key. A
+    product changed several times within the page appears once, at its
+    latest entry, with its current state; deleted products have none. Pass
+    the returned cursor as `since` to fetch the next page.
+
+    The page stops in front of entries that may still be committed below
+    them (see settled_entries()), so the cursor never passes an entry the
+    feed hasn't returned.
+    """
+    entries = [
+        entry async for entry in ProductChange.objects.filter(id__gt=since)
+        .order_by('id').values_list('id', 'product_id', 'action', 'changed_at')[:limit + 1]
+    ]
+    settled = settled_entries(entries[:limit], since)
+    has_more = len(entries) > limit and len(settled) == limit
+    entries = settled
+
+    # Keep each product's latest entry of the page
+    latest = {}
+    for entry in entries:
+        latest.pop(entry[1], None)
+        latest[entry[1]] = entry
+    products = await Product.objects.only(*FEED_FIELDS).ain_bulk(
+        [product_id for _, product_id, action, _ in latest.values() if action != ProductChange.DELETED])
+
+    changes = []
+    for change_id, product_id, action, changed_at in latest.values():
+        product = products.get(product_id)
+        if product is None:
+            # Deleted after this entry was written; its delete entry follows
+            action = ProductChange.DELETED
+        changes.append({
+            'id': change_id,
+            'product_id': product_id,
+            'action': action,
+            'changed_at': changed_at.isoformat(),
+            'product': serialize_product(product) if product is not None else None,
+        })
+
+    return {
+        'changes': changes,
+        'cursor': entries[-1][0] if entries else since,
+        'has_more': has_more,
+    }
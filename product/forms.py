@@ -0,0 +1,66 @@
+from django import forms
+from product.barcodes import barcode_index
+from product.models import Product, StockMovement
+from product.pricing import ADJUSTMENT_MODES, PERCENT, PriceAdjustment
+
+
+class ProductForm(forms.ModelForm):
+    """
+    Product form whose barcode uniqueness check skips the database when the
+    barcode index knows the barcode isn't taken, the common case for new
+    products.
+    """
+
+    class Meta:
+        model = Product
+        fields = ['name', 'barcode', 'price', 'stock']
+
+    def validate_unique(self):
+        exclude = self._get_validation_exclusions()
+        barcode = self.cleaned_data.get('barcode')
+        if barcode and 'barcode' not in exclude and not barcode_index.might_exist(barcode):
+            exclude.add('barcode')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except forms.ValidationError as e:
+            self._update_errors(e)
+
+
+class StockMovementForm(forms.ModelForm):
+    """Form for recording a stock movement; negative quantities remove stock"""
+
+    class Meta:
+        model = StockMovement
+        fields = ['quantity', 'reason', 'note']
+        help_texts = {
+            'quantity': 'Units added to stock; use a negative number to remove units.',
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Opening balances are only recorded when a product is created
+        self.fields['reason'].choices = [
+            choice for choice in self.fields['reason'].choices if choice[0] != StockMovement.OPENING]
+
+    def clean_quantity(self):
+        quantity = self.cleaned_data['quantity']
+        if quantity == 0:
+            raise forms.ValidationError('Quantity must not be zero.')
+        return quantity
+
+
+class PriceAdjustmentForm(forms.Form):
+    """Form for a bulk price adjustment by percentage or absolute amount"""
+    mode = forms.ChoiceField(choices=ADJUSTMENT_MODES, initial=PERCENT)
+    amount = forms.DecimalField(
+        max_digits=10, decimal_places=2,
+        help_text='E.g. 5 for +5% or -1.50 to take 1.50 off every price.')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'mode' in cleaned_data and 'amount' in cleaned_data:
+            try:
+                cleaned_data['adjustment'] = PriceAdjustment(cleaned_data['mode'], cleaned_data['amount'])
+            except ValueError as e:
+                raise forms.ValidationError(str(e))
+        return cleaned_data
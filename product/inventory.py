@@ -0,0 +1,134 @@
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+from product.models import InventorySummary, Product
+
+# The summary is a single row
+SUMMARY_PK = 1
+
+SUMMARY_FIELDS = ('product_count', 'total_units', 'total_value', 'low_stock_count', 'out_of_stock_count')
+
+# Product fields whose changes move the summary
+INVENTORY_FIELDS = ('price', 'stock')
+
+
+def get_low_stock_threshold():
+    """Products with at most this many units (but not none) count as low on stock"""
+    return getattr(settings, 'PRODUCT_LOW_STOCK_THRESHOLD', 5)
+
+
+def inventory_contribution(price, stock, threshold=None):
+    """Return what one product with the given price and stock adds to the summary"""
+    if threshold is None:
+        threshold = get_low_stock_threshold()
+    # Unsaved instances may still hold the raw value, e.g. a string
+    price = Decimal(str(price))
+    stock = int(stock)
+    return {
+        'product_count': 1,
+        'total_units': stock,
+        'total_value': price * stock,
+        'low_stock_count': int(0 < stock <= threshold),
+        'out_of_stock_count': int(stock == 0),
+    }
+
+
+def remember_inventory_state(instance):
+    """Remember the (price, stock) a product was loaded or saved with"""
+    values = instance.__dict__
+    if all(field in values for field in INVENTORY_FIELDS):
+        instance._inventory_state = tuple(values[field] for field in INVENTORY_FIELDS)
+    else:
+        # Deferred fields are only fetched if the instance is saved or deleted
+        instance._inventory_state = None
+
+
+def inventory_delta(old_state, new_state):
+    """
+    Return the change to the summary when a product's (price, stock) goes
+    from old_state to new_state; either may be None for a created or
+    deleted product.
+    """
+    threshold = get_low_stock_threshold()
+    old = inventory_contribution(*old_state, threshold) if old_state else None
+    new = inventory_contribution(*new_state, threshold) if new_state else None
+
+    delta = {}
+    for field in SUMMARY_FIELDS:
+        change = (new[field] if new else 0) - (old[field] if old else 0)
+        if change:
+            delta[field] = change
+    return delta
+
+
+def apply_inventory_delta(delta):
+    """Add the delta to the summary row in a single UPDATE, creating the row if needed"""
+    if not delta:
+        return
+
+    updated = InventorySummary.objects.filter(pk=SUMMARY_PK).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + change for field, change in delta.items()},
+    )
+    if not updated:
+        # First change ever: the full computation already includes it
+        reconcile_inventory()
+
+
+def compute_inventory(queryset=None):
+    """Aggregate the summary over the products of the queryset, by default all of them"""
+    threshold = get_low_stock_threshold()
+    if queryset is None:
+        queryset = Product.objects.all()
+    totals = queryset.order_by().aggregate(
+        product_count=Count('id'),
+        total_units=Sum('stock'),
+        total_value=Sum(ExpressionWrapper(
+            F('price') * F('stock'), output_field=DecimalField(max_digits=20, decimal_places=2))),
+        low_stock_count=Count('id', filter=Q(stock__gt=0, stock__lte=threshold)),
+        out_of_stock_count=Count('id', filter=Q(stock=0)),
+    )
+    totals['total_units'] = totals['total_units'] or 0
+    totals['total_value'] = totals['total_value'] or Decimal('0')
+    return totals
+
+
+def reconcile_inventory():
+    """
+    Recompute the summary from the product table and store it. Returns
+    {field: (stored value, actual value)} for every field that had drifted.
+
+    The summary row is locked first, so deltas of concurrent writes wait and
+    are applied on top of the recomputed totals instead of being lost.
+    """
+    with transaction.atomic():
+        summary, _ = InventorySummary.objects.select_for_update().get_or_create(pk=SUMMARY_PK)
+        actual = compute_inventory()
+
+        drift = {
+            field: (getattr(summary, field), actual[field])
+            for field in SUMMARY_FIELDS
+            if getattr(summary, field) != actual[field]
+        }
+
+        for field, value in actual.items():
+            setattr(summary, field, value)
+        summary.low_stock_threshold = get_low_stock_threshold()
+        summary.reconciled_at = timezone.now()
+        summary.save()
+
+    return drift
+
+
+def get_inventory_summary():
+    """
+    Return the summary row, recomputing it when it doesn't exist yet or was
+    computed with a different low stock threshold.
+    """
+    summary = InventorySummary.objects.filter(pk=SUMMARY_PK).first()
+    if summary is None or summary.low_stock_threshold != get_low_stock_threshold():
+        reconcile_inventory()
+        summary = InventorySummary.objects.get(pk=SUMMARY_PK)
+    return summary
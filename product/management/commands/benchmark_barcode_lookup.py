@@ -0,0 +1,60 @@
+import random
+import time
+from django.core.management.base import BaseCommand, CommandError
+from modular_engine.benchmarking import format_summary, summarize
+from product.barcodes import SNAPSHOT_FIELDS, barcode_index
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Benchmark barcode lookups through the barcode index against plain ORM queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=20000)
+        parser.add_argument('--miss-ratio', type=float, default=0.5,
+                            help='Share of lookups of barcodes no product has')
+        parser.add_argument('--hot-products', type=int, default=1000,
+                            help='Number of popular products that get 80%% of the other lookups')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        barcodes = list(Product.objects.values_list('barcode', flat=True))
+        if not barcodes:
+            raise CommandError('There are no products, run seed_products first')
+
+        rng.shuffle(barcodes)
+        hot = barcodes[:options['hot_products']]
+        probes = []
+        for index in range(options['lookups']):
+            if rng.random() < options['miss_ratio']:
+                probes.append(f"MISSING{index:09d}")
+            else:
+                probes.append(rng.choice(hot if rng.random() < 0.8 else barcodes))
+
+        barcode_index.reset()
+        started = time.perf_counter()
+        barcode_index.warm()
+        self.stdout.write(f"{len(barcodes)} products, {len(probes)} lookups, "
+                          f"index build: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        for label, lookup in [
+            ('orm exists', lambda barcode: Product.all_objects.filter(barcode=barcode).exists()),
+            ('index might_exist', barcode_index.might_exist),
+            ('orm lookup', lambda barcode: Product.objects.filter(barcode=barcode).values(*SNAPSHOT_FIELDS).first()),
+            ('index lookup', barcode_index.lookup),
+        ]:
+            latencies = []
+            found = 0
+            started = time.perf_counter()
+            for barcode in probes:
+                probe_started = time.perf_counter()
+                result = lookup(barcode)
+                latencies.append(time.perf_counter() - probe_started)
+                found += bool(result)
+            self.stdout.write(format_summary(label, summarize(latencies, time.perf_counter() - started)))
+            self.stdout.write(f"{'':<24} found {found} of {len(probes)}")
+
+        self.stdout.write(
+            f"index: {barcode_index.stats['bloom_rejects']} answered by the Bloom filter, "
+            f"{barcode_index.stats['cache_hits']} cache hits, {barcode_index.stats['queries']} queries")
@@ -0,0 +1,88 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from product.models import Product
+from product.pricing import (
+    ABSOLUTE, PERCENT, PriceAdjustment, apply_price_update, merge_previews, preview_price_update)
+
+# Barcodes per IN (...) list, well below the database parameter limits
+BARCODE_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Adjust the prices of many products at once by a percentage or an absolute amount'
+
+    def add_arguments(self, parser):
+        change = parser.add_mutually_exclusive_group(required=True)
+        change.add_argument('--percent', help='Change prices by this percentage, e.g. 5 or -10')
+        change.add_argument('--amount', help='Add this amount to prices, e.g. 1.50 or -0.25')
+
+        parser.add_argument('--barcodes', default='',
+                            help='Comma separated barcodes of the products to reprice')
+        parser.add_argument('--barcode-file',
+                            help='File with one barcode per line of the products to reprice')
+        parser.add_argument('--name-contains', help='Only reprice products whose name contains this text')
+        parser.add_argument('--min-price', help='Only reprice products priced at least this much')
+        parser.add_argument('--max-price', help='Only reprice products priced at most this much')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Number of products updated per statement')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only show what would change')
+
+    def handle(self, *args, **options):
+        try:
+            if options['percent'] is not None:
+                adjustment = PriceAdjustment(PERCENT, options['percent'])
+            else:
+                adjustment = PriceAdjustment(ABSOLUTE, options['amount'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        querysets = self.get_querysets(options)
+        preview = merge_previews(preview_price_update(queryset, adjustment) for queryset in querysets)
+        if not preview['products']:
+            raise CommandError('No products match the given filters')
+
+        self.stdout.write(
+            f"{preview['products']} products, prices {preview['min_price']}-{preview['max_price']} "
+            f"-> {preview['new_min_price']}-{preview['new_max_price']}, "
+            f"stock value change {preview['value_change']:+}")
+
+        if options['dry_run']:
+            self.stdout.write('Dry run, no prices were changed')
+            return
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            updated = sum(
+                apply_price_update(queryset, adjustment, chunk_size=options['chunk_size'])
+                for queryset in querysets
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Repriced {updated} products by {adjustment} in {time.perf_counter() - started:.2f}s"))
+
+    def get_querysets(self, options):
+        """Return the querysets of products to reprice, one per batch of barcodes"""
+        queryset = Product.objects.all()
+        if options['name_contains']:
+            queryset = queryset.filter(name__icontains=options['name_contains'])
+        if options['min_price']:
+            queryset = queryset.filter(price__gte=options['min_price'])
+        if options['max_price']:
+            queryset = queryset.filter(price__lte=options['max_price'])
+
+        barcodes = [barcode.strip() for barcode in options['barcodes'].split(',') if barcode.strip()]
+        if options['barcode_file']:
+            try:
+                with open(options['barcode_file']) as barcode_file:
+                    barcodes += [line.strip() for line in barcode_file if line.strip()]
+            except OSError as e:
+                raise CommandError(f"Can't read barcode file: {e}")
+        if not barcodes:
+            return [queryset]
+
+        barcodes = sorted(set(barcodes))
+        return [
+            queryset.filter(barcode__in=barcodes[start:start + BARCODE_BATCH_SIZE])
+            for start in range(0, len(barcodes), BARCODE_BATCH_SIZE)
+        ]
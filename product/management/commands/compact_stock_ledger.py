@@ -0,0 +1,27 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from product.stock import compact_stock_ledger
+
+
+class Command(BaseCommand):
+    help = 'Roll old stock movements into per-product snapshots for fast point-in-time stock queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=30,
+                            help='Compact movements recorded more than this many days ago')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete the compacted movements; history before the snapshot '
+                                 'is then only available at snapshot granularity')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 0:
+            raise CommandError('--older-than-days must not be negative')
+
+        # Whole seconds keep reruns within the same second on the same snapshot
+        before = (timezone.now() - datetime.timedelta(days=options['older_than_days'])).replace(microsecond=0)
+        created, pruned = compact_stock_ledger(before, prune=options['prune'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} stock snapshots as of {before.isoformat()}"
+            + (f", pruned {pruned} movements" if options['prune'] else '')))
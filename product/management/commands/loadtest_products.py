@@ -0,0 +1,135 @@
+import random
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import NoReverseMatch, reverse
+from modular_engine.benchmarking import format_summary, summarize
+from product.models import Product
+from product.permissions import PRODUCT_MANAGER_GROUP
+
+# Relative weights of the flows in the default mix
+DEFAULT_MIX = 'list=1,detail=12,api=4,create=1,update=2'
+
+
+def parse_mix(value):
+    """Parse 'flow=weight,...' into {flow: weight}. Raises ValueError if invalid."""
+    mix = {}
+    for item in value.split(','):
+        flow, _, weight = item.partition('=')
+        flow = flow.strip()
+        if flow not in Command.flows:
+            raise ValueError(f"Unknown flow '{flow}', choose from {', '.join(Command.flows)}")
+        mix[flow] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError('At least one flow needs a positive weight')
+    return mix
+
+
+class Command(BaseCommand):
+    help = ('Drive the product pages in-process with the Django test client and report '
+            'throughput and latency percentiles per flow')
+
+    flows = ('list', 'detail', 'api', 'create', 'update')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000,
+                            help='Number of flows to run; create and update send two requests each')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f"Relative weight of each flow, default '{DEFAULT_MIX}'")
+        parser.add_argument('--user', help='Username to log in as; defaults to a Product Managers member')
+        parser.add_argument('--host', default='localhost', help='Host header of the requests')
+        parser.add_argument('--warmup', type=int, default=20, help='Requests sent before measuring')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        try:
+            self.urls = {'list': reverse('product_list'), 'create': reverse('product_create'),
+                         'api': reverse('product_api')}
+        except NoReverseMatch:
+            raise CommandError('The product module is not installed')
+
+        bounds = Product.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            raise CommandError('There are no products, run seed_products first')
+        self.first_id, self.last_id = bounds['first'], bounds['last']
+
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.filter(groups__name=PRODUCT_MANAGER_GROUP).order_by('id').first()
+        if user is None:
+            raise CommandError('No user to log in as, run seed_products first or pass --user')
+
+        self.client = Client(HTTP_HOST=options['host'], raise_request_exception=False)
+        self.client.force_login(user)
+        self.rng = random.Random(options['seed'])
+        flows, weights = zip(*mix.items())
+
+        for _ in range(options['warmup']):
+            self.run_flow(self.rng.choices(flows, weights)[0])
+
+        latencies = {flow: [] for flow in flows}
+        errors = {flow: 0 for flow in flows}
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            flow = self.rng.choices(flows, weights)[0]
+            request_started = time.perf_counter()
+            succeeded = self.run_flow(flow)
+            latencies[flow].append(time.perf_counter() - request_started)
+            errors[flow] += not succeeded
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"{options['requests']} flows as {user.username}, "
+                          f"products {self.first_id}-{self.last_id}")
+        for flow in flows:
+            if latencies[flow]:
+                # Each flow's throughput is its share of the run
+                self.stdout.write(format_summary(flow, summarize(latencies[flow], elapsed)))
+                if errors[flow]:
+                    self.stdout.write(self.style.WARNING(f"{'':<24} {errors[flow]} failed"))
+        self.stdout.write(format_summary('total', summarize(sum(latencies.values(), []), elapsed)))
+
+    def random_product_id(self):
+        # Ids of deleted products give a 404, counted as failures
+        return self.rng.randint(self.first_id, self.last_id)
+
+    def run_flow(self, flow):
+        """Run one flow and return whether it succeeded; create and update load the form first"""
+        if flow == 'list':
+            return self.client.get(self.urls['list']).status_code == 200
+        if flow == 'detail':
+            return self.client.get(reverse('product_detail', args=[self.random_product_id()])).status_code == 200
+        if flow == 'api':
+            after = self.rng.randint(self.first_id - 1, self.last_id)
+            return self.client.get(self.urls['api'], {'after': after, 'limit': 50}).status_code == 200
+
+        if flow == 'create':
+            url = self.urls['create']
+            data = {
+                'name': 'Load test product',
+                'barcode': f"LOAD{time.time_ns()}{self.rng.randrange(1000):03d}",
+                'price': f"{self.rng.uniform(1, 100):.2f}",
+                'stock': self.rng.randrange(100),
+            }
+        else:
+            product = Product.objects.filter(pk=self.random_product_id()).first()
+            if product is None:
+                return False
+            url = reverse('product_update', args=[product.pk])
+            data = {
+                'name': product.name,
+                'barcode': product.barcode,
+                'price': f"{float(product.price) * self.rng.uniform(0.9, 1.1):.2f}",
+                'stock': product.stock + self.rng.randrange(5),
+            }
+
+        if self.client.get(url).status_code != 200:
+            return False
+        # A valid form redirects; an invalid one is rendered again
+        return self.client.post(url, data).status_code == 302
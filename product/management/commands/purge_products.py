@@ -0,0 +1,38 @@
+import datetime
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from product.archive import purge_archived_products
+from product.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Permanently delete products archived a while ago, in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=30,
+                            help='Purge products archived more than this many days ago')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of products deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to wait between chunks')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the products that would be purged')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 0:
+            raise CommandError('--older-than-days must not be negative')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        before = timezone.now() - datetime.timedelta(days=options['older_than_days'])
+        if options['dry_run']:
+            count = Product.all_objects.filter(deleted_at__lte=before).count()
+            self.stdout.write(f"{count} products archived before {before.isoformat()} would be purged")
+            return
+
+        started = time.perf_counter()
+        purged = purge_archived_products(before, chunk_size=options['chunk_size'], pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {purged} products archived before {before.isoformat()} "
+            f"in {time.perf_counter() - started:.2f}s"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from product.inventory import reconcile_inventory
+
+
+class Command(BaseCommand):
+    help = 'Recompute the inventory summary from the product table and report any drift'
+
+    def handle(self, *args, **options):
+        drift = reconcile_inventory()
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Inventory summary is up to date'))
+            return
+
+        for field, (stored, actual) in drift.items():
+            self.stdout.write(self.style.WARNING(f"  {field}: {stored} -> {actual}"))
+        self.stdout.write(self.style.SUCCESS(f"Corrected {len(drift)} drifted inventory totals"))
@@ -0,0 +1,127 @@
+import random
+import secrets
+import time
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from product.inventory import reconcile_inventory
+from product.models import PriceHistory, Product, ProductChange, StockMovement
+from product.permissions import PRODUCT_MANAGER_GROUP, PRODUCT_USER_GROUP, setup_product_permissions
+
+ADJECTIVES = ['Organic', 'Classic', 'Premium', 'Everyday', 'Fresh', 'Light', 'Extra Strong', 'Mini',
+              'Family Size', 'Sugar Free', 'Original', 'Spicy', 'Whole Grain', 'Roasted', 'Eco']
+NOUNS = ['Coffee Beans', 'Green Tea', 'Pasta', 'Olive Oil', 'Rice', 'Peanut Butter', 'Dish Soap',
+         'Shampoo', 'Toothpaste', 'Paper Towels', 'Orange Juice', 'Granola', 'Dark Chocolate',
+         'Tomato Sauce', 'Batteries', 'Light Bulbs', 'Notebook', 'Sparkling Water', 'Cat Food', 'Honey']
+SIZES = ['100g', '250g', '500g', '1kg', '330ml', '1l', '2l', '6 pack', '12 pack', '']
+
+def ean13(number):
+    """Return the 13 digit EAN barcode of a 12 digit number, check digit included"""
+    digits = f"{number:012d}"
+    total = sum(int(digit) * (3 if index % 2 else 1) for index, digit in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic product catalog and product users for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000, help='Number of products to create')
+        parser.add_argument('--users', type=int, default=20,
+                            help='Number of users to create, spread across the product groups')
+        parser.add_argument('--manager-ratio', type=float, default=0.25,
+                            help='Share of the users put in the Product Managers group')
+        parser.add_argument('--password',
+                            help='Password of the created users; a random one is generated and printed by default')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products inserted per batch')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['count'] < 0 or options['users'] < 0:
+            raise CommandError('--count and --users must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if not 0 <= options['manager_ratio'] <= 1:
+            raise CommandError('--manager-ratio must be between 0 and 1')
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        created = self.create_products(rng, options['count'], options['batch_size'])
+        # Managers can change prices, so their password is never a well-known default
+        password = options['password'] or secrets.token_urlsafe(12)
+        users, managers = self.create_users(options['users'], options['manager_ratio'], password)
+        # bulk_create() skips the signals that maintain the summary
+        reconcile_inventory()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} products and {users} users ({managers} managers) "
+            f"in {time.perf_counter() - started:.1f}s"))
+        if users:
+            self.stdout.write(f"Users are named seed_user_<n> with password '{password}'")
+
+    def create_products(self, rng, count, batch_size):
+        """
+        Insert the products in batches along with what the signals would have
+        recorded for them: the opening stock, the first price and the change
+        log entry.
+        """
+        # Barcodes continue from the highest id, so reruns don't collide
+        offset = (Product.all_objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        created = 0
+
+        while created < count:
+            now = timezone.now()
+            batch = []
+            for index in range(created, min(count, created + batch_size)):
+                # Mostly cheap everyday items, a few expensive ones; some sold out or running low
+                price = Decimal(str(round(rng.lognormvariate(1.8, 0.9), 2))).quantize(Decimal('0.01'))
+                stock = 0 if rng.random() < 0.05 else int(rng.expovariate(1 / 80))
+                name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(SIZES)}".strip()
+                batch.append(Product(
+                    name=name, barcode=ean13(200000000000 + offset + index),
+                    price=max(price, Decimal('0.10')), stock=stock))
+
+            with transaction.atomic():
+                products = Product.objects.bulk_create(batch)
+                StockMovement.objects.bulk_create(
+                    StockMovement(product=product, quantity=product.stock,
+                                  reason=StockMovement.OPENING, created_at=now)
+                    for product in products if product.stock
+                )
+                PriceHistory.objects.bulk_create(
+                    PriceHistory(product=product, price=product.price, changed_at=now) for product in products)
+                ProductChange.objects.bulk_create(
+                    ProductChange(product_id=product.pk, action=ProductChange.CREATED, changed_at=now)
+                    for product in products
+                )
+
+            created += len(batch)
+            self.stdout.write(f"  {created}/{count} products")
+
+        return created
+
+    def create_users(self, count, manager_ratio, password):
+        """Create seed_user_<n> users, the first share of them managers and the rest product users"""
+        setup_product_permissions()
+        groups = {group.name: group for group in Group.objects.filter(
+            name__in=[PRODUCT_USER_GROUP, PRODUCT_MANAGER_GROUP])}
+        manager_count = round(count * manager_ratio)
+
+        # Hashing is slow by design, so all users share one hash
+        password = make_password(password)
+        usernames = {f"seed_user_{index}": index < manager_count for index in range(count)}
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        users = User.objects.bulk_create(
+            User(username=username, password=password) for username in usernames if username not in existing)
+
+        Membership = User.groups.through
+        Membership.objects.bulk_create(
+            Membership(user_id=user.pk, group_id=groups[
+                PRODUCT_MANAGER_GROUP if usernames[user.username] else PRODUCT_USER_GROUP].pk)
+            for user in users
+        )
+        return len(users), sum(usernames[user.username] for user in users)
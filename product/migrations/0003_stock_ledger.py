@@ -0,0 +1,59 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_stock_ledger(apps, schema_editor):
+    """Record the current stock of existing products as their opening balance"""
+    Product = apps.get_model('product', 'Product')
+    StockMovement = apps.get_model('product', 'StockMovement')
+    StockMovement.objects.bulk_create(
+        (
+            StockMovement(product_id=product_id, quantity=stock, reason='opening', note='Ledger opened')
+            for product_id, stock in Product.objects.filter(stock__gt=0).values_list('id', 'stock').iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0002_alter_product_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('receipt', 'Receipt'), ('sale', 'Sale'), ('return', 'Return'), ('adjustment', 'Adjustment')], default='adjustment', max_length=20)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='product.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='product_stockmove_at_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('movement_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='product.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'taken_at'), name='product_stocksnapshot_unique')],
+            },
+        ),
+        migrations.RunPython(open_stock_ledger, migrations.RunPython.noop),
+    ]
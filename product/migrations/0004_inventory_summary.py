@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('total_units', models.BigIntegerField(default=0)),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('low_stock_count', models.PositiveIntegerField(default=0)),
+                ('out_of_stock_count', models.PositiveIntegerField(default=0)),
+                ('low_stock_threshold', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'inventory summary',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def record_current_prices(apps, schema_editor):
+    """Start the history of existing products with their current price"""
+    Product = apps.get_model('product', 'Product')
+    PriceHistory = apps.get_model('product', 'PriceHistory')
+    now = timezone.now()
+    PriceHistory.objects.bulk_create(
+        (
+            PriceHistory(product_id=product_id, price=price, changed_at=now)
+            for product_id, price in Product.objects.values_list('id', 'price').iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0004_inventory_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='product.product')),
+            ],
+            options={
+                'verbose_name_plural': 'price history',
+                'indexes': [models.Index(fields=['product', 'changed_at'], name='product_pricehist_at_idx'), models.Index(fields=['changed_at'], name='product_pricehist_changed_idx')],
+            },
+        ),
+        migrations.RunPython(record_current_prices, migrations.RunPython.noop),
+    ]
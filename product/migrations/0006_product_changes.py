@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:11
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def record_existing_products(apps, schema_editor):
+    """Start the change log with an entry per existing product, so the feed covers the whole catalog"""
+    Product = apps.get_model('product', 'Product')
+    ProductChange = apps.get_model('product', 'ProductChange')
+    now = timezone.now()
+    ProductChange.objects.bulk_create(
+        (
+            ProductChange(product_id=product_id, action='created', changed_at=now)
+            for product_id in Product.objects.order_by('id').values_list('id', flat=True).iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_price_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('product_id', models.PositiveIntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(record_existing_products, migrations.RunPython.noop),
+    ]
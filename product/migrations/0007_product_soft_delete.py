@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:18
+
+import django.db.models.manager
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_product_changes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='product',
+            options={'default_manager_name': 'all_objects', 'permissions': [('can_view_inventory', 'Can view inventory levels'), ('can_update_price', 'Can update product prices'), ('can_manage_stock', 'Can manage stock levels')]},
+        ),
+        migrations.AlterModelManagers(
+            name='product',
+            managers=[
+                ('all_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['id'], name='product_alive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='product_archived_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+INDEX_NAME = 'product_name_prefix_idx'
+
+
+def create_name_prefix_index(apps, schema_editor):
+    """
+    Index lower(name) for case-insensitive LIKE 'prefix%' searches of active
+    products. Only PostgreSQL has pattern operator classes; elsewhere the
+    suggestions are served from an in-memory index.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('product', 'Product')
+    quote = schema_editor.quote_name
+    # lower() returns text, so text_pattern_ops is the operator class matching LIKE on it
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote(INDEX_NAME)} ON {quote(Product._meta.db_table)} "
+        f"(lower({quote('name')}) text_pattern_ops) WHERE {quote('deleted_at')} IS NULL"
+    )
+
+
+def drop_name_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(INDEX_NAME)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_product_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_prefix_index, drop_name_prefix_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_product_name_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productchange',
+            name='product_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
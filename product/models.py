@@ -1,9 +1,35 @@
+from django.conf import settings
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.utils import timezone
+
+
+class ProductQuerySet(models.QuerySet):
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+    def archived(self):
+        return self.filter(deleted_at__isnull=False)
+
+
+class ProductManager(models.Manager.from_queryset(ProductQuerySet)):
+    """Products that haven't been archived, served by the product_alive_idx partial index"""
+
+    def get_queryset(self):
+        return super().get_queryset().alive()
 
 
 class Product(models.Model):
-    """Product model with name, barcode, price and stock"""
+    """
+    Product model with name, barcode, price and stock.
+
+    Deleting a product from the site archives it by setting `deleted_at`;
+    the purge_products command removes archived products for good later.
+    `objects` only returns products that aren't archived, `all_objects`
+    returns all of them and is the default manager, so the admin and unique
+    checks see archived products too: their barcodes stay taken until
+    they're purged.
+    """
     name = models.CharField(max_length=200)
     barcode = models.CharField(max_length=50, unique=True)
     price = models.DecimalField(
@@ -12,8 +38,19 @@ class Product(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ProductManager()
+    all_objects = ProductQuerySet.as_manager()
 
     class Meta:
+        default_manager_name = 'all_objects'
+        indexes = [
+            models.Index(fields=['id'], name='product_alive_idx', condition=models.Q(deleted_at__isnull=True)),
+            # Small, as only archived products are in it; used by the purge
+            models.Index(fields=['deleted_at'], name='product_archived_idx',
+                         condition=models.Q(deleted_at__isnull=False)),
+        ]
         permissions = [
             ("can_view_inventory", "Can view inventory levels"),
             ("can_update_price", "Can update product prices"),
@@ -52,3 +89,145 @@ class Product(models.Model):
                 return True
 
         return False
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger entry changing a product's stock by `quantity`.
+
+    Movements are written through product.stock.record_stock_movement(), which
+    keeps the materialized Product.stock in sync. The table is tuned for
+    inserts: its only index is the (product, created_at) index used by stock
+    history and point-in-time queries.
+    """
+    OPENING = 'opening'
+    RECEIPT = 'receipt'
+    SALE = 'sale'
+    RETURN = 'return'
+    ADJUSTMENT = 'adjustment'
+    REASON_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (RECEIPT, 'Receipt'),
+        (SALE, 'Sale'),
+        (RETURN, 'Return'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    # The (product, created_at) index also serves lookups by product
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='stock_movements', db_index=False)
+    quantity = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default=ADJUSTMENT)
+    note = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='+', db_index=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='product_stockmove_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity:+d} ({self.reason})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Stock movements are append-only and can't be changed")
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+    """
+    A product's stock as of `taken_at`, rolled up from the ledger by the
+    compact_stock_ledger command so point-in-time queries only need to sum
+    the movements after the latest snapshot.
+    """
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='stock_snapshots', db_index=False)
+    taken_at = models.DateTimeField()
+    stock = models.IntegerField()
+    movement_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'taken_at'], name='product_stocksnapshot_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.stock} at {self.taken_at}"
+
+
+class PriceHistory(models.Model):
+    """
+    A product's price from `changed_at` until its next entry. Rows are added
+    by the product signals and the bulk price update whenever a price is set
+    or changed; `old_price` is empty for a product's first price.
+
+    Indexed for the price of a product at a given time, (product, changed_at),
+    and for the products whose price changed in a time window, (changed_at).
+    """
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='price_history', db_index=False)
+    old_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'price history'
+        indexes = [
+            models.Index(fields=['product', 'changed_at'], name='product_pricehist_at_idx'),
+            models.Index(fields=['changed_at'], name='product_pricehist_changed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.old_price} -> {self.price} at {self.changed_at}"
+
+
+class ProductChange(models.Model):
+    """
+    Append-only change log of the product table backing the change feed.
+    Entries are added whenever a product is created, changed or deleted; the
+    auto-incrementing id is the feed's cursor. product_id isn't a foreign key
+    so entries of deleted products are kept.
+    """
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTION_CHOICES = [
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (DELETED, 'Deleted'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    product_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"#{self.id}: product {self.product_id} {self.action}"
+
+
+class InventorySummary(models.Model):
+    """
+    Inventory totals over all products, kept in a single row so the inventory
+    overview loads in constant time. Product signals and the stock ledger
+    apply deltas to it; the reconcile_inventory command recomputes it.
+    """
+    product_count = models.PositiveIntegerField(default=0)
+    total_units = models.BigIntegerField(default=0)
+    total_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    low_stock_count = models.PositiveIntegerField(default=0)
+    out_of_stock_count = models.PositiveIntegerField(default=0)
+    low_stock_threshold = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'inventory summary'
+
+    def __str__(self):
+        return f"{self.product_count} products, {self.total_units} units"
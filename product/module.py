@@ -8,6 +8,35 @@ def setup_module():
     setup_product_permissions()
 
 
+def warmup_module():
+    """Warmup function called when a worker boots, before it takes traffic"""
+    from django.template.loader import get_template
+
+    # Compile the templates so the first requests don't pay for it
+    for template_name in ['product/product_list.html', 'product/product_detail.html',
+                          'product/product_form.html', 'product/product_confirm_delete.html',
+                          'product/product_stock.html', 'product/inventory_summary.html',
+                          'product/price_changes.html']:
+        get_template(template_name)
+
+    # Build the barcode index so uniqueness checks and lookups can skip the database
+    from product.barcodes import barcode_index
+    barcode_index.warm()
+
+    # Without a database prefix index, name suggestions come from memory
+    from product.suggest import name_index, uses_database_index
+    if not uses_database_index():
+        name_index.warm()
+
+
+def healthcheck_module():
+    """Health check function backing the readiness endpoint"""
+    from product.models import Product
+
+    # Fails if the database or the product table is unavailable
+    Product.objects.exists()
+
+
 def cleanup_module():
     """Cleanup function to be called when the module is uninstalled"""
     # Clean up groups and permissions
@@ -27,4 +56,6 @@ def register(registry):
         app_name='product',
         url_patterns=url_patterns,
         setup_func=setup_module,
+        warmup_func=warmup_module,
+        healthcheck_func=healthcheck_module,
     )
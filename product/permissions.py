@@ -1,4 +1,5 @@
 from django.contrib.auth.mixins import UserPassesTestMixin, PermissionRequiredMixin
+from django.core.exceptions import PermissionDenied
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from product.models import Product
@@ -97,6 +98,43 @@ class PublicAccessMixin(UserPassesTestMixin):
         return True
 
 
+async def aget_request_user(request):
+    """
+    Resolve the request user through the async auth API when available.
+    AuthenticationMiddleware attaches `auser`; requests built without it
+    (e.g. RequestFactory) already carry a concrete `user`.
+    """
+    if hasattr(request, 'auser'):
+        return await request.auser()
+    return request.user
+
+
+async def auser_is_product_manager(user):
+    """Async check for manager-level access (staff, superuser or Product Managers)"""
+    if user.is_staff or user.is_superuser:
+        return True
+    if not user.is_authenticated:
+        return False
+    return await user.groups.filter(name=PRODUCT_MANAGER_GROUP).aexists()
+
+
+class AsyncPublicAccessMixin:
+    """
+    Async counterpart of PublicAccessMixin for async-native views.
+    The user is resolved with the async auth API before dispatching so that
+    neither the view nor the template triggers a lazy sync user lookup.
+    """
+
+    async def test_func(self):
+        return True
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await aget_request_user(request)
+        if not await self.test_func():
+            raise PermissionDenied
+        return await super().dispatch(request, *args, **kwargs)
+
+
 class UserRequiredMixin(PermissionRequiredMixin):
     """
     Mixin to require the user to have basic product permissions.
@@ -132,3 +170,46 @@ class ManagerRequiredMixin(PermissionRequiredMixin):
 
         # Fall back to the standard permission check
         return super().has_permission()
+
+
+def user_can_manage_stock(user):
+    """Check whether the user may change stock levels (Product Managers or can_manage_stock)"""
+    if not user.is_authenticated:
+        return False
+    if user.groups.filter(name=PRODUCT_MANAGER_GROUP).exists():
+        return True
+    return user.has_perm('product.can_manage_stock')
+
+
+def user_can_update_price(user):
+    """Check whether the user may change prices (Product Managers or can_update_price)"""
+    if not user.is_authenticated:
+        return False
+    if user.groups.filter(name=PRODUCT_MANAGER_GROUP).exists():
+        return True
+    return user.has_perm('product.can_update_price')
+
+
+class StockManagerRequiredMixin(PermissionRequiredMixin):
+    """
+    Mixin to require the user to be allowed to manage stock levels.
+    User must be in the Product Managers group or have the can_manage_stock permission.
+    """
+    permission_required = ('product.can_manage_stock',)
+
+    def has_permission(self):
+        return user_can_manage_stock(self.request.user)
+
+
+class InventoryViewerRequiredMixin(PermissionRequiredMixin):
+    """
+    Mixin to require the user to be allowed to view inventory levels.
+    User must be in a product group or have the can_view_inventory permission.
+    """
+    permission_required = ('product.can_view_inventory',)
+
+    def has_permission(self):
+        user = self.request.user
+        if user.groups.filter(name__in=[PRODUCT_USER_GROUP, PRODUCT_MANAGER_GROUP]).exists():
+            return True
+        return super().has_permission()
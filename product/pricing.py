@@ -0,0 +1,170 @@
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+from product.changes import record_product_changes
+from product.inventory import apply_inventory_delta
+from product.models import PriceHistory, Product, ProductChange
+
+PERCENT = 'percent'
+ABSOLUTE = 'absolute'
+ADJUSTMENT_MODES = [
+    (PERCENT, 'Percent'),
+    (ABSOLUTE, 'Absolute amount'),
+]
+
+PRICE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+VALUE_FIELD = DecimalField(max_digits=20, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+class PriceAdjustment:
+    """
+    A price change applied to every selected product: `amount` percent of
+    the current price, or `amount` added to it. Prices are rounded to cents
+    and never go below zero.
+    """
+
+    def __init__(self, mode, amount):
+        if mode not in dict(ADJUSTMENT_MODES):
+            raise ValueError(f"Unknown price adjustment mode '{mode}'")
+        try:
+            amount = Decimal(str(amount))
+        except InvalidOperation:
+            raise ValueError(f"Invalid price adjustment amount '{amount}'")
+        if mode == PERCENT and amount <= -100:
+            raise ValueError("A percent adjustment must be greater than -100")
+
+        self.mode = mode
+        self.amount = amount
+
+    def __str__(self):
+        if self.mode == PERCENT:
+            return f"{self.amount:+}%"
+        return f"{self.amount:+}"
+
+    def expression(self):
+        """The new price as a database expression of the current one"""
+        if self.mode == PERCENT:
+            factor = Value(1 + self.amount / 100, output_field=PRICE_FIELD)
+            new_price = Round(ExpressionWrapper(F('price') * factor, output_field=PRICE_FIELD), 2)
+        else:
+            new_price = F('price') + Value(self.amount, output_field=PRICE_FIELD)
+        return Greatest(new_price, Value(Decimal('0.00'), output_field=PRICE_FIELD), output_field=PRICE_FIELD)
+
+    def value_change(self):
+        """The change in stock value, (new price - old price) * stock, as an expression"""
+        return ExpressionWrapper((self.expression() - F('price')) * F('stock'), output_field=VALUE_FIELD)
+
+
+def preview_price_update(queryset, adjustment):
+    """
+    Summarize what apply_price_update() would do, using aggregate queries
+    only: the number of products, their price range before and after, and
+    the change in total stock value.
+    """
+    preview = queryset.order_by().aggregate(
+        products=Count('id'),
+        min_price=Min('price'),
+        max_price=Max('price'),
+        new_min_price=Min(adjustment.expression()),
+        new_max_price=Max(adjustment.expression()),
+        value_change=Sum(adjustment.value_change()),
+    )
+    # Some backends return the arithmetic with extra digits
+    for key, value in preview.items():
+        if key != 'products' and value is not None:
+            preview[key] = Decimal(value).quantize(CENT)
+    return preview
+
+
+def merge_previews(previews):
+    """Combine the previews of several querysets, e.g. batches of barcodes"""
+    merged = {'products': 0, 'min_price': None, 'max_price': None,
+              'new_min_price': None, 'new_max_price': None, 'value_change': Decimal('0.00')}
+    for preview in previews:
+        if not preview['products']:
+            continue
+        merged['products'] += preview['products']
+        merged['value_change'] += preview['value_change'] or 0
+        for key, pick in (('min_price', min), ('new_min_price', min),
+                          ('max_price', max), ('new_max_price', max)):
+            merged[key] = preview[key] if merged[key] is None else pick(merged[key], preview[key])
+    return merged
+
+
+def apply_price_update(queryset, adjustment, chunk_size=10000):
+    """
+    Reprice every product in the queryset with set-based UPDATEs of
+    `chunk_size` primary keys each, all in one transaction. Returns the number
+    of updated products.
+
+    Each chunk is a primary key range rather than a list of IDs, so the
+    statements stay small however many products are selected. Queryset
+    updates send no signals, so the old and new prices of a chunk are read
+    with one SELECT first, to add PriceHistory and ProductChange rows in
+    bulk and apply the change in stock value to the inventory summary.
+    """
+    queryset = queryset.order_by()
+    updated = 0
+    last_pk = None
+    now = timezone.now()
+
+    with transaction.atomic():
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            # The chunk ends at its chunk_size-th primary key, if there are that many
+            boundary = list(chunk.order_by('pk').values_list('pk', flat=True)[chunk_size - 1:chunk_size])
+            upper_pk = boundary[0] if boundary else None
+            if upper_pk is not None:
+                chunk = chunk.filter(pk__lte=upper_pk)
+
+            # The new price comes from the same expression the UPDATE uses
+            rows = list(chunk.values_list('pk', 'price', 'stock', adjustment.expression()))
+            if not rows:
+                break
+            chunk.update(price=adjustment.expression(), updated_at=now)
+            updated += len(rows)
+
+            history = []
+            value_change = Decimal('0.00')
+            for pk, price, stock, new_price in rows:
+                new_price = Decimal(new_price).quantize(CENT)
+                if new_price != price:
+                    history.append(PriceHistory(product_id=pk, old_price=price, price=new_price, changed_at=now))
+                    value_change += (new_price - price) * stock
+            PriceHistory.objects.bulk_create(history, batch_size=1000)
+            # Every row's updated_at moved, so every row changed
+            record_product_changes([row[0] for row in rows], ProductChange.UPDATED)
+            if value_change:
+                apply_inventory_delta({'total_value': value_change})
+
+            if upper_pk is None:
+                break
+            last_pk = upper_pk
+
+    return updated
+
+
+def price_at(product, at):
+    """
+    Return the product's price at time `at`, or None if its price history
+    doesn't reach back that far. A single lookup on (product, changed_at).
+    """
+    return (
+        PriceHistory.objects.filter(product=product, changed_at__lte=at)
+        .order_by('-changed_at', '-id').values_list('price', flat=True).first()
+    )
+
+
+def price_changes_between(start, end):
+    """Return the PriceHistory entries of actual price changes with start <= changed_at < end"""
+    return PriceHistory.objects.filter(
+        changed_at__gte=start, changed_at__lt=end, old_price__isnull=False)
+
+
+def products_with_price_changes(start, end):
+    """Return the products whose price changed in the window start <= changed_at < end"""
+    return Product.objects.filter(
+        pk__in=price_changes_between(start, end).values('product_id'))
@@ -0,0 +1,98 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from product.barcodes import barcode_index
+from product.changes import record_product_change
+from product.inventory import (
+    INVENTORY_FIELDS, apply_inventory_delta, inventory_delta, remember_inventory_state)
+from product.models import PriceHistory, Product, ProductChange
+
+
+def load_inventory_state(instance):
+    """Fetch the stored (price, stock) of an instance loaded with deferred fields"""
+    if instance._inventory_state is None and instance.pk is not None:
+        instance._inventory_state = (
+            Product.objects.filter(pk=instance.pk).values_list(*INVENTORY_FIELDS).first())
+
+
+def is_archived(instance):
+    """Whether the product is archived; a deferred deleted_at counts as not archived"""
+    return instance.__dict__.get('deleted_at') is not None
+
+
+@receiver(post_init, sender=Product, dispatch_uid='product_inventory_post_init')
+def product_loaded(sender, instance, **kwargs):
+    remember_inventory_state(instance)
+
+
+@receiver(pre_save, sender=Product, dispatch_uid='product_inventory_pre_save')
+def product_saving(sender, instance, update_fields=None, **kwargs):
+    """Diff the price against the one the product was loaded with, without a query"""
+    if instance._state.adding:
+        instance._price_change = (None, instance.price)
+        return
+
+    load_inventory_state(instance)
+    old_price = instance._inventory_state[0] if instance._inventory_state else None
+    # The instance may still hold the raw value, e.g. a string from a form
+    price = Product._meta.get_field('price').to_python(instance.price)
+    saves_price = update_fields is None or 'price' in update_fields
+    if saves_price and old_price != price:
+        instance._price_change = (old_price, price)
+    else:
+        instance._price_change = None
+
+
+@receiver(post_save, sender=Product, dispatch_uid='product_inventory_post_save')
+def product_saved(sender, instance, created, update_fields=None, **kwargs):
+    """Apply the change in the product's contribution to the inventory summary"""
+    if is_archived(instance):
+        return
+    old_state = None if created else instance._inventory_state
+
+    if old_state is not None and update_fields is not None:
+        if not set(INVENTORY_FIELDS).intersection(update_fields):
+            return
+        # Fields that weren't saved keep their stored values
+        new_state = tuple(
+            getattr(instance, field) if field in update_fields else old_value
+            for field, old_value in zip(INVENTORY_FIELDS, old_state)
+        )
+    else:
+        new_state = (instance.price, instance.stock)
+
+    apply_inventory_delta(inventory_delta(old_state, new_state))
+    instance._inventory_state = new_state
+
+
+@receiver(post_save, sender=Product, dispatch_uid='product_price_history_post_save')
+def product_price_saved(sender, instance, **kwargs):
+    """Record the price change found by product_saving"""
+    price_change = getattr(instance, '_price_change', None)
+    if price_change is not None:
+        instance._price_change = None
+        old_price, price = price_change
+        PriceHistory.objects.create(product=instance, old_price=old_price, price=price)
+
+
+@receiver(post_save, sender=Product, dispatch_uid='product_changes_post_save')
+def product_change_saved(sender, instance, created, **kwargs):
+    if not is_archived(instance):
+        record_product_change(instance.pk, ProductChange.CREATED if created else ProductChange.UPDATED)
+
+
+@receiver(post_save, sender=Product, dispatch_uid='product_barcode_post_save')
+def product_barcode_saved(sender, instance, **kwargs):
+    barcode_index.product_saved(instance)
+
+
+@receiver(pre_delete, sender=Product, dispatch_uid='product_inventory_pre_delete')
+def product_deleting(sender, instance, **kwargs):
+    load_inventory_state(instance)
+
+
+@receiver(post_delete, sender=Product, dispatch_uid='product_inventory_post_delete')
+def product_deleted(sender, instance, **kwargs):
+    # Archived products already left the summary and the feed
+    if not is_archived(instance):
+        apply_inventory_delta(inventory_delta(instance._inventory_state, None))
+        record_product_change(instance.pk, ProductChange.DELETED)
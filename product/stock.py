@@ -0,0 +1,144 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, Sum
+from django.utils import timezone
+from product.changes import record_product_change, record_product_changes
+from product.inventory import apply_inventory_delta, inventory_delta, remember_inventory_state
+from product.models import Product, ProductChange, StockMovement, StockSnapshot
+
+
+class InsufficientStockError(Exception):
+    """Raised when a movement would take a product's stock below zero"""
+    pass
+
+
+def _apply_stock_delta(product_id, quantity):
+    """
+    Add quantity to the materialized stock, refusing to go below zero, and
+    move the inventory summary along. Returns the product's new
+    (price, stock, updated_at). Callers add the change log entry.
+    """
+    updated_at = timezone.now()
+    products = Product.objects.filter(pk=product_id)
+    if quantity < 0:
+        products = products.filter(stock__gte=-quantity)
+    if not products.update(stock=F('stock') + quantity, updated_at=updated_at):
+        raise InsufficientStockError(
+            f"Not enough stock of product {product_id} to remove {-quantity} units")
+
+    # Queryset updates don't send post_save, so apply the summary delta here
+    price, stock = Product.objects.filter(pk=product_id).values_list('price', 'stock').get()
+    apply_inventory_delta(inventory_delta((price, stock - quantity), (price, stock)))
+    return price, stock, updated_at
+
+
+def record_stock_movement(product, quantity, reason=StockMovement.ADJUSTMENT, note='', user=None):
+    """
+    Append a movement to the ledger and apply it to Product.stock in one
+    transaction. The stock is updated with an F() expression, so concurrent
+    movements of the same product don't overwrite each other.
+    """
+    with transaction.atomic():
+        product.price, product.stock, product.updated_at = _apply_stock_delta(product.pk, quantity)
+        movement = StockMovement.objects.create(
+            product=product, quantity=quantity, reason=reason, note=note, created_by=user)
+        record_product_change(product.pk, ProductChange.UPDATED)
+
+    remember_inventory_state(product)
+    return movement
+
+
+def record_stock_movements(movements, batch_size=500):
+    """
+    Append many unsaved StockMovements at once: one UPDATE per product and
+    batched INSERTs for the ledger. Either all movements are applied or, if
+    any product would run out of stock, none are.
+    """
+    deltas = {}
+    for movement in movements:
+        deltas[movement.product_id] = deltas.get(movement.product_id, 0) + movement.quantity
+
+    with transaction.atomic():
+        # A fixed order keeps concurrent batches from deadlocking on row locks
+        changed = [product_id for product_id in sorted(deltas) if deltas[product_id]]
+        for product_id in changed:
+            _apply_stock_delta(product_id, deltas[product_id])
+        record_product_changes(changed, ProductChange.UPDATED)
+        return StockMovement.objects.bulk_create(movements, batch_size=batch_size)
+
+
+def open_stock_ledger(product, user=None):
+    """Record the stock a product was created with as its opening balance"""
+    if product.stock:
+        return StockMovement.objects.create(
+            product=product, quantity=product.stock, reason=StockMovement.OPENING, created_by=user)
+    return None
+
+
+def stock_at(product, at):
+    """
+    Return the product's stock as of `at`: the latest snapshot taken at or
+    before `at` plus the movements recorded after it.
+    """
+    snapshot = (
+        StockSnapshot.objects.filter(product=product, taken_at__lte=at)
+        .order_by('-taken_at').only('taken_at', 'stock').first()
+    )
+    movements = StockMovement.objects.filter(product=product, created_at__lte=at)
+    if snapshot is not None:
+        movements = movements.filter(created_at__gt=snapshot.taken_at)
+
+    base = snapshot.stock if snapshot is not None else 0
+    return base + (movements.aggregate(total=Sum('quantity'))['total'] or 0)
+
+
+def compact_stock_ledger(before, prune=False):
+    """
+    Roll the movements recorded up to `before` into a StockSnapshot per
+    product. With prune, the rolled-up movements are deleted afterwards;
+    stock_at() then resolves times before `before` to the nearest earlier
+    snapshot. Returns (snapshots created, movements pruned).
+    """
+    product_ids = list(
+        StockMovement.objects.filter(created_at__lte=before)
+        .values_list('product_id', flat=True).distinct().order_by('product_id')
+    )
+
+    created = pruned = 0
+    for product_id in product_ids:
+        with transaction.atomic():
+            # Movements are recorded while holding the product's row (see
+            # _apply_stock_delta), so locking it keeps new ones out until the
+            # snapshot and prune below are committed
+            Product.objects.select_for_update().filter(pk=product_id).values_list('pk').first()
+
+            previous = (
+                StockSnapshot.objects.filter(product_id=product_id, taken_at__lte=before)
+                .order_by('-taken_at').first()
+            )
+            movements = StockMovement.objects.filter(product_id=product_id, created_at__lte=before)
+            if previous is not None:
+                movements = movements.filter(created_at__gt=previous.taken_at)
+
+            # Nothing to roll up when a snapshot was already taken at `before`
+            totals = {'count': 0}
+            if previous is None or previous.taken_at < before:
+                totals = movements.aggregate(
+                    total=Sum('quantity'), count=Count('id'), last_id=Max('id'))
+            if totals['count']:
+                StockSnapshot.objects.create(
+                    product_id=product_id,
+                    taken_at=before,
+                    stock=(previous.stock if previous is not None else 0) + totals['total'],
+                    movement_count=totals['count'],
+                )
+                created += 1
+
+            if prune:
+                # Delete only what a snapshot counted: nothing past the last rolled-up movement
+                rolled_up = StockMovement.objects.filter(product_id=product_id, created_at__lte=before)
+                if totals['count']:
+                    rolled_up = rolled_up.filter(id__lte=totals['last_id'])
+                deleted, _ = rolled_up.delete()
+                pruned += deleted
+
+    return created, pruned
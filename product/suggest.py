@@ -0,0 +1,145 @@
+import bisect
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, router
+from django.db.models.functions import Lower
+from product.changes import get_settled_changes, get_settled_cursor
+from product.models import Product
+
+# Fields of each suggestion
+SUGGEST_FIELDS = ('id', 'name', 'barcode')
+
+
+class ProductNameIndex:
+    """
+    Per-process sorted array of (lowercased name, id) of the active products,
+    for prefix searches with bisect where the database has no prefix index.
+
+    Like the barcode index, changes are read from the product change log at
+    most every PRODUCT_SUGGEST_REFRESH_SECONDS; a large batch of changes
+    rebuilds the array instead of moving entries one at a time.
+    """
+    # More changes than this at once rebuild the array
+    REBUILD_THRESHOLD = 10000
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._keys = None
+            # id -> (name, barcode)
+            self._products = {}
+            self._cursor = 0
+            self._refreshed_at = 0.0
+
+    def warm(self):
+        """Load the names of every active product, sorted"""
+        with self._lock:
+            last_change = get_settled_cursor()
+            products = {}
+            keys = []
+            for product_id, name, barcode in Product.objects.values_list(*SUGGEST_FIELDS).iterator(chunk_size=10000):
+                products[product_id] = (name, barcode)
+                keys.append((name.lower(), product_id))
+            keys.sort()
+
+            self._keys, self._products = keys, products
+            self._cursor = last_change
+            self._refreshed_at = time.monotonic()
+
+    def _refresh(self):
+        """Apply the changes logged since the last refresh, at most every few seconds"""
+        interval = getattr(settings, 'PRODUCT_SUGGEST_REFRESH_SECONDS', 1.0)
+        if self._keys is not None and time.monotonic() - self._refreshed_at < interval:
+            return
+
+        with self._lock:
+            if self._keys is None:
+                self.warm()
+                return
+            if time.monotonic() - self._refreshed_at < interval:
+                return
+            self._refreshed_at = time.monotonic()
+
+            changes = get_settled_changes(self._cursor, self.REBUILD_THRESHOLD + 1)
+            if not changes:
+                return
+            if len(changes) > self.REBUILD_THRESHOLD:
+                self.warm()
+                return
+
+            self._cursor = changes[-1][0]
+            product_ids = {product_id for _, product_id, _ in changes}
+            current = {
+                product_id: (name, barcode) for product_id, name, barcode in
+                Product.objects.filter(pk__in=product_ids).values_list(*SUGGEST_FIELDS)
+            }
+            for product_id in product_ids:
+                old = self._products.pop(product_id, None)
+                if old is not None:
+                    key = (old[0].lower(), product_id)
+                    index = bisect.bisect_left(self._keys, key)
+                    if index < len(self._keys) and self._keys[index] == key:
+                        del self._keys[index]
+                if product_id in current:
+                    self._products[product_id] = current[product_id]
+                    bisect.insort(self._keys, (current[product_id][0].lower(), product_id))
+
+    def search(self, prefix, limit):
+        """Return up to `limit` products whose name starts with prefix, case-insensitively, by name"""
+        self._refresh()
+        prefix = prefix.lower()
+        with self._lock:
+            index = bisect.bisect_left(self._keys, (prefix,))
+            results = []
+            for key, product_id in self._keys[index:index + limit]:
+                if not key.startswith(prefix):
+                    break
+                name, barcode = self._products[product_id]
+                results.append({'id': product_id, 'name': name, 'barcode': barcode})
+            return results
+
+
+# The name index of this process, used unless the database has a prefix index
+name_index = ProductNameIndex()
+
+
+def uses_database_index():
+    """Whether prefix searches run on the database's product_name_prefix_idx (PostgreSQL)"""
+    return connections[router.db_for_read(Product)].vendor == 'postgresql'
+
+
+def search_product_names(prefix, limit):
+    """
+    Return up to `limit` active products whose name starts with prefix,
+    case-insensitively, ordered by name.
+    """
+    if not uses_database_index():
+        return name_index.search(prefix, limit)
+
+    # LIKE 'prefix%' on lower(name) is served by product_name_prefix_idx
+    return list(
+        Product.objects.annotate(name_lower=Lower('name'))
+        .filter(name_lower__startswith=prefix.lower())
+        .order_by('name_lower', 'id').values(*SUGGEST_FIELDS)[:limit]
+    )
+
+
+def suggest_products(prefix, limit=10):
+    """
+    search_product_names() cached per prefix and limit for
+    PRODUCT_SUGGEST_CACHE_TTL seconds, as consecutive keystrokes of many
+    users ask for the same short prefixes.
+    """
+    cache = caches[getattr(settings, 'PRODUCT_SUGGEST_CACHE', 'default')]
+    key = f"product:suggest:{limit}:{hashlib.md5(prefix.lower().encode()).hexdigest()}"
+    results = cache.get(key)
+    if results is None:
+        results = search_product_names(prefix, limit)
+        cache.set(key, results, getattr(settings, 'PRODUCT_SUGGEST_CACHE_TTL', 10))
+    return results
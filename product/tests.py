@@ -1,15 +1,53 @@
-from django.test import TestCase, SimpleTestCase, Client, RequestFactory
+from django.test import TestCase, SimpleTestCase, Client, RequestFactory, override_settings
 from django.urls import reverse, include, path
 from django.contrib.auth.models import User, Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import AnonymousUser
-from django.core.exceptions import PermissionDenied
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import Http404
+from django.utils import timezone
 from decimal import Decimal
+from io import StringIO
+import datetime
+import json
+import sys
+from unittest.mock import patch
 
-from product.models import Product
+from product.models import InventorySummary, PriceHistory, Product, ProductChange, StockMovement, StockSnapshot
 from product.permissions import PublicAccessMixin, UserRequiredMixin, ManagerRequiredMixin
 from product.permissions import PRODUCT_USER_GROUP, PRODUCT_MANAGER_GROUP, setup_product_permissions
 from product.views import ProductListView, ProductDetailView, ProductCreateView, ProductUpdateView, ProductDeleteView
+from product.views import InventorySummaryView, PriceChangesView, ProductApiView, ProductChangesView, ProductStockView
+from product.views import ProductBarcodeView, ProductSuggestView
+from product.stock import (
+    InsufficientStockError, compact_stock_ledger, record_stock_movement, record_stock_movements, stock_at)
+from product.inventory import compute_inventory, get_inventory_summary, reconcile_inventory
+from product.archive import archive_products, purge_archived_products, restore_products
+from product.barcodes import BloomFilter, barcode_index
+from product.changes import record_product_change
+from product.suggest import name_index, search_product_names, uses_database_index
+from product.forms import ProductForm
+from product.pricing import (
+    ABSOLUTE, PERCENT, PriceAdjustment, apply_price_update, preview_price_update, price_at,
+    products_with_price_changes)
+from product.urls import url_patterns
+from modular_engine.hotreload import get_reloadable_submodules
+from modular_engine.module_registry import ModuleRegistry
+from django.contrib.auth.views import LogoutView
+from djmodular.views import CustomLoginView
+
+# Mounts the product views for tests that follow their redirects, and the
+# project URLs the base template links to
+urlpatterns = [
+    path('product/', include(url_patterns)),
+    path('module/', include('modular_engine.urls')),
+    path('login/', CustomLoginView.as_view(), name='login'),
+    path('logout/', LogoutView.as_view(), name='logout'),
+]
 
 
 class ProductModelTest(TestCase):
@@ -162,32 +200,54 @@ class ProductViewsSimpleTest(TestCase):
         self.user.groups.add(user_group)
         self.manager.groups.add(manager_group)
 
-    def test_product_list_view(self):
-        """Test the product list view directly"""
+    async def test_product_list_view(self):
+        """Test the async product list view directly"""
         request = self.factory.get('/products/')
         request.user = self.anonymous_user
 
-        response = ProductListView.as_view()(request)
+        response = await ProductListView.as_view()(request)
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['products'], [self.product])
+        self.assertFalse(response.context_data['can_delete'])
 
         # Check with authenticated user
         request.user = self.user
-        response = ProductListView.as_view()(request)
+        response = await ProductListView.as_view()(request)
         self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context_data['can_delete'])
 
-    def test_product_detail_view(self):
-        """Test the product detail view directly"""
+        # Managers can delete products from the list
+        request.user = self.manager
+        response = await ProductListView.as_view()(request)
+        self.assertTrue(response.context_data['can_delete'])
+
+    async def test_product_detail_view(self):
+        """Test the async product detail view directly"""
         request = self.factory.get('/products/')
         request.user = self.anonymous_user
 
-        response = ProductDetailView.as_view()(request, pk=self.product.pk)
+        response = await ProductDetailView.as_view()(request, pk=self.product.pk)
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data['product'], self.product)
 
         # Check with authenticated user
         request.user = self.user
-        response = ProductDetailView.as_view()(request, pk=self.product.pk)
+        response = await ProductDetailView.as_view()(request, pk=self.product.pk)
         self.assertEqual(response.status_code, 200)
 
+    async def test_product_detail_view_not_found(self):
+        """Test that the async detail view raises 404 for a missing product"""
+        request = self.factory.get('/products/')
+        request.user = self.anonymous_user
+
+        with self.assertRaises(Http404):
+            await ProductDetailView.as_view()(request, pk=self.product.pk + 1000)
+
+    def test_catalog_views_are_async(self):
+        """Test that list and detail views are async-native"""
+        self.assertTrue(ProductListView.view_is_async)
+        self.assertTrue(ProductDetailView.view_is_async)
+
     def test_product_create_view_permissions(self):
         """Test permissions for the product create view"""
         # Anonymous users should be redirected to login
@@ -313,3 +373,1037 @@ class ProductViewsSimpleTest(TestCase):
 
         # Check that the product was deleted
         self.assertFalse(Product.objects.filter(pk=product.pk).exists())
+
+
+class StockLedgerTest(TestCase):
+    """Tests for the append-only stock ledger"""
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Ledger Product", barcode="LEDGER001", price=Decimal("5.00"), stock=0)
+
+    def test_movement_updates_stock(self):
+        """Test that a movement is appended and applied to the materialized stock"""
+        movement = record_stock_movement(self.product, 10, reason=StockMovement.RECEIPT)
+        record_stock_movement(self.product, -3, reason=StockMovement.SALE)
+
+        self.assertEqual(self.product.stock, 7)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 7)
+        self.assertEqual(movement.quantity, 10)
+        self.assertEqual(self.product.stock_movements.count(), 2)
+
+    def test_insufficient_stock(self):
+        """Test that stock can't go below zero and nothing is written when it would"""
+        record_stock_movement(self.product, 2)
+
+        with self.assertRaises(InsufficientStockError):
+            record_stock_movement(self.product, -3)
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 2)
+        self.assertEqual(self.product.stock_movements.count(), 1)
+
+    def test_movements_are_append_only(self):
+        """Test that a recorded movement can't be changed"""
+        movement = record_stock_movement(self.product, 1)
+        movement.quantity = 100
+        with self.assertRaises(ValueError):
+            movement.save()
+
+    def test_bulk_movements(self):
+        """Test that bulk movements update each product once and insert in batches"""
+        other = Product.objects.create(name="Other", barcode="LEDGER002", price=Decimal("1.00"), stock=0)
+        movements = [StockMovement(product=self.product, quantity=1) for _ in range(50)]
+        movements += [StockMovement(product=other, quantity=2) for _ in range(50)]
+
+        # Per product a stock update, a price read and a summary update; one insert
+        # each for the change log and the ledger; all inside a savepoint
+        with self.assertNumQueries(10):
+            record_stock_movements(movements)
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 50)
+        self.assertEqual(Product.objects.get(pk=other.pk).stock, 100)
+
+        # A batch that would oversell any product is rejected as a whole
+        with self.assertRaises(InsufficientStockError):
+            record_stock_movements([StockMovement(product=self.product, quantity=-1),
+                                    StockMovement(product=other, quantity=-101)])
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 50)
+        self.assertEqual(StockMovement.objects.count(), 100)
+
+    def test_stock_at_and_compaction(self):
+        """Test point-in-time stock before and after compacting the ledger"""
+        now = timezone.now()
+        days = [now - datetime.timedelta(days=offset) for offset in (40, 35, 10)]
+        for created_at, quantity in zip(days, (10, -4, 5)):
+            record_stock_movement(self.product, quantity)
+            StockMovement.objects.filter(pk=self.product.stock_movements.latest('id').pk).update(
+                created_at=created_at)
+
+        cutoff = now - datetime.timedelta(days=30)
+        expected = {day: stock_at(self.product, day) for day in days + [cutoff, now]}
+        self.assertEqual(expected[days[1]], 6)
+        self.assertEqual(expected[now], 11)
+
+        self.assertEqual(compact_stock_ledger(cutoff), (1, 0))
+        snapshot = StockSnapshot.objects.get(product=self.product)
+        self.assertEqual((snapshot.stock, snapshot.movement_count), (6, 2))
+        for day, stock in expected.items():
+            self.assertEqual(stock_at(self.product, day), stock)
+
+        # Compacting again at the same time is a no-op
+        self.assertEqual(compact_stock_ledger(cutoff), (0, 0))
+
+        # Pruning keeps current and post-snapshot history exact
+        self.assertEqual(compact_stock_ledger(cutoff, prune=True), (0, 2))
+        self.assertEqual(stock_at(self.product, cutoff), 6)
+        self.assertEqual(stock_at(self.product, now), 11)
+
+    def test_prune_keeps_uncounted_movements(self):
+        """Test that a movement landing after the roll-up is not pruned with it"""
+        now = timezone.now()
+        cutoff = now - datetime.timedelta(days=30)
+        StockMovement.objects.create(product=self.product, quantity=10, created_at=cutoff - datetime.timedelta(days=5))
+
+        create_snapshot = StockSnapshot.objects.create
+
+        def create_late_movement(**kwargs):
+            # Committed by another writer after the aggregate, dated before the cutoff
+            StockMovement.objects.create(product=self.product, quantity=3, created_at=cutoff - datetime.timedelta(days=1))
+            return create_snapshot(**kwargs)
+
+        with patch.object(StockSnapshot.objects, 'create', side_effect=create_late_movement):
+            self.assertEqual(compact_stock_ledger(cutoff, prune=True), (1, 1))
+
+        self.assertEqual(list(self.product.stock_movements.values_list('quantity', flat=True)), [3])
+
+    def test_admin_keeps_ledger(self):
+        """Test that the admin records the opening stock and can't edit stock afterwards"""
+        self.client.force_login(User.objects.create_superuser(username="admin", password="password"))
+        response = self.client.post(reverse('admin:product_product_add'), {
+            'name': "Admin Product", 'barcode': "LEDGER003", 'price': "1.00", 'stock': 4})
+        self.assertEqual(response.status_code, 302)
+        product = Product.objects.get(barcode="LEDGER003")
+        self.assertEqual(list(product.stock_movements.values_list('quantity', 'reason')), [(4, StockMovement.OPENING)])
+
+        response = self.client.post(reverse('admin:product_product_change', args=[product.pk]), {
+            'name': "Admin Product", 'barcode': "LEDGER003", 'price': "1.00", 'stock': 40})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 4)
+        self.assertEqual(product.stock_movements.count(), 1)
+
+    def test_compact_command(self):
+        """Test the compact_stock_ledger management command"""
+        record_stock_movement(self.product, 3)
+        StockMovement.objects.update(created_at=timezone.now() - datetime.timedelta(days=60))
+
+        out = StringIO()
+        call_command('compact_stock_ledger', '--older-than-days=30', '--prune', stdout=out)
+
+        self.assertIn('Created 1 stock snapshots', out.getvalue())
+        self.assertIn('pruned 1 movements', out.getvalue())
+        self.assertEqual(StockSnapshot.objects.get(product=self.product).stock, 3)
+        self.assertFalse(StockMovement.objects.exists())
+
+
+@override_settings(ROOT_URLCONF='product.tests')
+class StockViewsTest(TestCase):
+    """Tests for the stock management views"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        setup_product_permissions()
+
+        self.user = User.objects.create_user(username="stockuser", password="password")
+        self.user.groups.add(Group.objects.get(name=PRODUCT_USER_GROUP))
+        self.manager = User.objects.create_user(username="stockmanager", password="password")
+        self.manager.groups.add(Group.objects.get(name=PRODUCT_MANAGER_GROUP))
+
+        self.product = Product.objects.create(
+            name="Stocked Product", barcode="STOCK001", price=Decimal("2.50"), stock=5)
+
+    def post(self, view, user, data, **kwargs):
+        request = self.factory.post('/product/', data=data)
+        request.user = user
+        request.session = 'session'
+        request._messages = FallbackStorage(request)
+        return view.as_view()(request, **kwargs)
+
+    def test_stock_view_requires_permission(self):
+        """Test that only users who can manage stock may record movements"""
+        with self.assertRaises(PermissionDenied):
+            self.post(ProductStockView, self.user, {'quantity': 1, 'reason': 'receipt'}, pk=self.product.pk)
+
+        response = self.post(
+            ProductStockView, self.manager, {'quantity': 4, 'reason': 'receipt', 'note': 'Delivery'},
+            pk=self.product.pk)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 9)
+        self.assertEqual(StockMovement.objects.get(product=self.product).created_by, self.manager)
+
+    def test_stock_view_rejects_overselling(self):
+        """Test that removing more than the stock shows a form error"""
+        response = self.post(
+            ProductStockView, self.manager, {'quantity': -6, 'reason': 'sale'}, pk=self.product.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context_data['form'].errors['quantity'])
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 5)
+
+    def test_create_opens_ledger(self):
+        """Test that a new product's stock is recorded as its opening balance"""
+        data = {'name': 'New', 'barcode': 'STOCK002', 'price': '1.00', 'stock': '12'}
+        self.assertEqual(self.post(ProductCreateView, self.user, data).status_code, 302)
+
+        movement = StockMovement.objects.get(product__barcode='STOCK002')
+        self.assertEqual((movement.quantity, movement.reason), (12, StockMovement.OPENING))
+
+    def test_update_records_adjustment(self):
+        """Test that stock edits go through the ledger and need can_manage_stock"""
+        data = {'name': 'Renamed', 'barcode': 'STOCK001', 'price': '2.50', 'stock': '100'}
+
+        # Product users can edit the product but not its stock
+        self.post(ProductUpdateView, self.user, data, pk=self.product.pk)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.stock), ('Renamed', 5))
+        self.assertFalse(StockMovement.objects.exists())
+
+        self.post(ProductUpdateView, self.manager, data, pk=self.product.pk)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 100)
+        movement = StockMovement.objects.get(product=self.product)
+        self.assertEqual((movement.quantity, movement.reason), (95, StockMovement.ADJUSTMENT))
+
+
+@override_settings(PRODUCT_LOW_STOCK_THRESHOLD=5)
+class InventorySummaryTest(TestCase):
+    """Tests for the incrementally maintained inventory summary"""
+
+    def setUp(self):
+        self.cheap = Product.objects.create(name="Cheap", barcode="INV001", price=Decimal("1.50"), stock=4)
+        self.dear = Product.objects.create(name="Dear", barcode="INV002", price=Decimal("100.00"), stock=20)
+
+    def assertSummaryMatchesTable(self):
+        summary = InventorySummary.objects.get()
+        for field, value in compute_inventory().items():
+            self.assertEqual(getattr(summary, field), value, field)
+        return summary
+
+    def test_created_products_are_counted(self):
+        """Test that creating products adds their contribution"""
+        summary = self.assertSummaryMatchesTable()
+        self.assertEqual(summary.product_count, 2)
+        self.assertEqual(summary.total_value, Decimal("2006.00"))
+        self.assertEqual(summary.low_stock_count, 1)
+
+    def test_updates_apply_deltas(self):
+        """Test that price and stock changes move the totals without recomputing them"""
+        self.dear.price = Decimal("90.00")
+        self.dear.stock = 0
+        # One UPDATE of the product and one of the summary, plus the price history
+        # and change log INSERTs
+        with self.assertNumQueries(4):
+            self.dear.save()
+        summary = self.assertSummaryMatchesTable()
+        self.assertEqual(summary.out_of_stock_count, 1)
+
+        # Saving unrelated fields leaves the summary alone (the other query is the change log)
+        self.cheap.name = "Cheaper"
+        with self.assertNumQueries(2):
+            self.cheap.save(update_fields=['name'])
+
+        # Deferred fields are fetched once before saving
+        product = Product.objects.only('name').get(pk=self.cheap.pk)
+        product.price = Decimal("2.00")
+        product.save()
+        self.assertSummaryMatchesTable()
+
+    def test_stock_movements_and_deletes(self):
+        """Test that ledger movements and deletes keep the summary in sync"""
+        record_stock_movement(self.cheap, 10)
+        record_stock_movements([StockMovement(product=self.dear, quantity=-20)])
+        self.assertSummaryMatchesTable()
+
+        self.cheap.delete()
+        Product.objects.filter(pk=self.dear.pk).delete()
+        summary = self.assertSummaryMatchesTable()
+        self.assertEqual(summary.product_count, 0)
+
+    def test_reconcile_corrects_drift(self):
+        """Test that the reconcile command reports and fixes drift"""
+        # Queryset updates bypass the signals
+        Product.objects.filter(pk=self.dear.pk).update(stock=1)
+
+        out = StringIO()
+        call_command('reconcile_inventory', stdout=out)
+        self.assertIn('total_units: 24 -> 5', out.getvalue())
+        self.assertSummaryMatchesTable()
+        self.assertEqual(reconcile_inventory(), {})
+
+    def test_threshold_change_recomputes(self):
+        """Test that changing the low stock threshold recomputes the counts"""
+        with override_settings(PRODUCT_LOW_STOCK_THRESHOLD=50):
+            self.assertEqual(get_inventory_summary().low_stock_count, 2)
+
+    def test_summary_view(self):
+        """Test that the summary page needs can_view_inventory and reads one row"""
+        setup_product_permissions()
+        factory = RequestFactory()
+
+        request = factory.get('/product/inventory/')
+        request.user = User.objects.create_user(username="outsider", password="password")
+        with self.assertRaises(PermissionDenied):
+            InventorySummaryView.as_view()(request)
+
+        request.user = User.objects.create_user(username="viewer", password="password")
+        request.user.groups.add(Group.objects.get(name=PRODUCT_USER_GROUP))
+        with self.assertNumQueries(2):
+            response = InventorySummaryView.as_view()(request)
+        self.assertEqual(response.context_data['summary'].product_count, 2)
+
+
+class BulkPriceUpdateTest(TestCase):
+    """Tests for the bulk price update engine"""
+
+    def setUp(self):
+        Product.objects.bulk_create([
+            Product(name=f"Bulk {index}", barcode=f"BULK{index:03d}", price=Decimal("10.00") + index, stock=index)
+            for index in range(30)
+        ])
+        reconcile_inventory()
+
+    def prices(self, *barcodes):
+        return list(Product.objects.filter(barcode__in=barcodes).order_by('barcode').values_list('price', flat=True))
+
+    def test_adjustment_validation(self):
+        """Test that invalid adjustments are rejected"""
+        with self.assertRaises(ValueError):
+            PriceAdjustment(PERCENT, -100)
+        with self.assertRaises(ValueError):
+            PriceAdjustment('double', 2)
+        with self.assertRaises(ValueError):
+            PriceAdjustment(ABSOLUTE, 'cheap')
+
+    def test_preview_doesnt_write(self):
+        """Test that the dry-run preview summarizes the change with aggregates only"""
+        with self.assertNumQueries(1):
+            preview = preview_price_update(Product.objects.all(), PriceAdjustment(PERCENT, 10))
+
+        self.assertEqual(preview['products'], 30)
+        self.assertEqual(preview['new_min_price'], Decimal("11.00"))
+        self.assertEqual(preview['new_max_price'], Decimal("42.90"))
+        self.assertEqual(self.prices('BULK000'), [Decimal("10.00")])
+
+    def test_chunked_update(self):
+        """Test that chunked set-based updates reprice every selected product"""
+        queryset = Product.objects.filter(stock__gte=5)
+        preview = preview_price_update(queryset, PriceAdjustment(PERCENT, '12.5'))
+        value_before = InventorySummary.objects.get().total_value
+
+        # Per chunk: the boundary lookup, the old and new prices, the UPDATE, the price
+        # history and change log INSERTs and the summary update (plus the savepoint)
+        with self.assertNumQueries(4 * 6 + 2):
+            updated = apply_price_update(queryset, PriceAdjustment(PERCENT, '12.5'), chunk_size=7)
+
+        self.assertEqual(updated, 25)
+        self.assertEqual(self.prices('BULK004', 'BULK005', 'BULK029'),
+                         [Decimal("14.00"), Decimal("16.88"), Decimal("43.88")])
+
+        # The inventory summary moved by the previewed value change
+        summary = InventorySummary.objects.get()
+        self.assertEqual(summary.total_value, compute_inventory()['total_value'])
+        self.assertEqual(summary.total_value, value_before + preview['value_change'])
+
+    def test_prices_dont_go_negative(self):
+        """Test that absolute cuts stop at zero"""
+        apply_price_update(Product.objects.all(), PriceAdjustment(ABSOLUTE, '-15'))
+        self.assertEqual(self.prices('BULK000', 'BULK005', 'BULK006'),
+                         [Decimal("0.00"), Decimal("0.00"), Decimal("1.00")])
+
+    def test_command(self):
+        """Test the bulk_update_prices command with barcodes and a dry run"""
+        out = StringIO()
+        call_command('bulk_update_prices', '--percent=-50', '--barcodes=BULK001,BULK002', '--dry-run', stdout=out)
+        self.assertIn('2 products', out.getvalue())
+        self.assertEqual(self.prices('BULK001'), [Decimal("11.00")])
+
+        call_command('bulk_update_prices', '--amount=1', '--min-price=38', stdout=out)
+        self.assertIn('Repriced 2 products', out.getvalue())
+        self.assertEqual(self.prices('BULK028', 'BULK029'), [Decimal("39.00"), Decimal("40.00")])
+
+    def test_admin_action_requires_can_update_price(self):
+        """Test that the admin action is only offered to users who can update prices"""
+        setup_product_permissions()
+        staff = User.objects.create_user(username="clerk", password="password", is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='change_product'))
+        self.client.force_login(staff)
+
+        changelist = reverse('admin:product_product_changelist')
+        response = self.client.get(changelist)
+        self.assertNotContains(response, 'bulk_update_prices')
+
+        staff.groups.add(Group.objects.get(name=PRODUCT_MANAGER_GROUP))
+        pks = list(Product.objects.filter(barcode__in=['BULK001', 'BULK002']).values_list('pk', flat=True))
+        data = {'action': 'bulk_update_prices', '_selected_action': pks, 'mode': PERCENT, 'amount': '10'}
+
+        response = self.client.post(changelist, {**data, 'preview': 'Preview'})
+        self.assertEqual(response.context['preview']['products'], 2)
+        self.assertEqual(self.prices('BULK001'), [Decimal("11.00")])
+
+        response = self.client.post(changelist, {**data, 'apply': 'Apply'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.prices('BULK001', 'BULK002'), [Decimal("12.10"), Decimal("13.20")])
+
+    def test_admin_change_form_requires_can_update_price(self):
+        """Test that the price is read-only on the admin change form without can_update_price"""
+        setup_product_permissions()
+        staff = User.objects.create_user(username="clerk", password="password", is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='change_product'))
+        self.client.force_login(staff)
+        product = Product.objects.get(barcode='BULK001')
+        url = reverse('admin:product_product_change', args=[product.pk])
+        data = {'name': "Renamed", 'barcode': "BULK001", 'price': "99.00"}
+
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(self.prices('BULK001'), [Decimal("11.00")])
+        self.assertEqual(Product.objects.get(pk=product.pk).name, "Renamed")
+
+        staff.groups.add(Group.objects.get(name=PRODUCT_MANAGER_GROUP))
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(self.prices('BULK001'), [Decimal("99.00")])
+
+    def test_update_view_requires_can_update_price(self):
+        """Test that only users who can update prices get the price field"""
+        setup_product_permissions()
+        request = RequestFactory().get('/product/')
+        product = Product.objects.get(barcode='BULK001')
+
+        request.user = User.objects.create_user(username="pricer", password="password")
+        request.user.groups.add(Group.objects.get(name=PRODUCT_USER_GROUP))
+        response = ProductUpdateView.as_view()(request, pk=product.pk)
+        self.assertNotIn('price', response.context_data['form'].fields)
+
+        request.user.groups.add(Group.objects.get(name=PRODUCT_MANAGER_GROUP))
+        response = ProductUpdateView.as_view()(request, pk=product.pk)
+        self.assertIn('price', response.context_data['form'].fields)
+
+
+class PriceHistoryTest(TestCase):
+    """Tests for the price history"""
+
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Tracked Product", barcode="TRACK001", price=Decimal("10.00"), stock=3)
+
+    def history(self):
+        return list(
+            PriceHistory.objects.filter(product=self.product).order_by('changed_at', 'id')
+            .values_list('old_price', 'price'))
+
+    def test_saves_record_price_changes(self):
+        """Test that creating a product and changing its price record history entries"""
+        self.assertEqual(self.history(), [(None, Decimal("10.00"))])
+
+        # Prices are compared as decimals, so an equal value isn't a change
+        self.product.price = "10.0"
+        self.product.save()
+        self.product.stock = 4
+        self.product.save(update_fields=['stock'])
+        self.assertEqual(len(self.history()), 1)
+
+        self.product.price = Decimal("12.50")
+        self.product.save()
+        self.assertEqual(self.history(), [(None, Decimal("10.00")), (Decimal("10.00"), Decimal("12.50"))])
+
+        # Products loaded with a deferred price are diffed against the fetched value
+        product = Product.objects.only('name').get(pk=self.product.pk)
+        product.price = Decimal("11.00")
+        product.save()
+        self.assertEqual(self.history()[-1], (Decimal("12.50"), Decimal("11.00")))
+
+    def test_bulk_update_records_history(self):
+        """Test that bulk price updates record an entry per changed product"""
+        Product.objects.create(name="Free Product", barcode="TRACK002", price=Decimal("0.00"), stock=1)
+        apply_price_update(Product.objects.all(), PriceAdjustment(PERCENT, 10))
+
+        self.assertEqual(self.history()[-1], (Decimal("10.00"), Decimal("11.00")))
+        # Zero stays zero, so the free product's price didn't change
+        self.assertEqual(PriceHistory.objects.filter(product__barcode="TRACK002").count(), 1)
+
+    def test_time_range_queries(self):
+        """Test looking up the price at a time and the products changed in a window"""
+        created = timezone.now() - datetime.timedelta(days=10)
+        changed = timezone.now() - datetime.timedelta(days=2)
+        PriceHistory.objects.filter(product=self.product).update(changed_at=created)
+        PriceHistory.objects.create(
+            product=self.product, old_price=Decimal("10.00"), price=Decimal("15.00"), changed_at=changed)
+        Product.objects.create(name="Other Product", barcode="TRACK003", price=Decimal("1.00"), stock=1)
+
+        self.assertIsNone(price_at(self.product, created - datetime.timedelta(days=1)))
+        self.assertEqual(price_at(self.product, created), Decimal("10.00"))
+        self.assertEqual(price_at(self.product, changed - datetime.timedelta(seconds=1)), Decimal("10.00"))
+        self.assertEqual(price_at(self.product, timezone.now()), Decimal("15.00"))
+
+        # Newly created products have no old price, so they aren't changes
+        window = products_with_price_changes(changed - datetime.timedelta(days=1), timezone.now())
+        self.assertEqual(list(window), [self.product])
+        self.assertFalse(products_with_price_changes(created, changed).exists())
+
+    async def test_detail_view(self):
+        """Test that the detail page lists the latest price changes first"""
+        self.product.price = Decimal("12.00")
+        await self.product.asave()
+
+        request = RequestFactory().get('/product/')
+        request.user = AnonymousUser()
+        response = await ProductDetailView.as_view()(request, pk=self.product.pk)
+        self.assertEqual([entry.price for entry in response.context_data['price_history']],
+                         [Decimal("12.00"), Decimal("10.00")])
+
+    def test_price_changes_view(self):
+        """Test that the price changes report requires inventory access"""
+        self.product.price = Decimal("12.00")
+        self.product.save()
+
+        setup_product_permissions()
+        request = RequestFactory().get('/product/price-changes/')
+        request.user = User.objects.create_user(username="viewer", password="password")
+        with self.assertRaises(PermissionDenied):
+            PriceChangesView.as_view()(request)
+
+        request.user.groups.add(Group.objects.get(name=PRODUCT_MANAGER_GROUP))
+        response = PriceChangesView.as_view()(request)
+        self.assertEqual([change.price for change in response.context_data['changes']], [Decimal("12.00")])
+
+    @override_settings(ROOT_URLCONF='product.tests')
+    def test_price_changes_view_rejects_invalid_dates(self):
+        """Test that a well-formed but invalid date is a bad request"""
+        setup_product_permissions()
+        user = User.objects.create_user(username="viewer", password="password")
+        user.groups.add(Group.objects.get(name=PRODUCT_MANAGER_GROUP))
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('product_price_changes'), {'since': '2024-02-30'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('product_price_changes'), {'since': '2024-02-28', 'until': '2024-02-29'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProductChangesTest(TestCase):
+    """Tests for the product change feed"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.first = Product.objects.create(name="First", barcode="FEED001", price=Decimal("1.00"), stock=1)
+        self.second = Product.objects.create(name="Second", barcode="FEED002", price=Decimal("2.00"), stock=2)
+
+    async def get_page(self, **params):
+        request = self.factory.get('/product/changes/', params)
+        request.user = AnonymousUser()
+        response = await ProductChangesView.as_view()(request)
+        return response.status_code, json.loads(response.content)
+
+    def test_writes_are_logged(self):
+        """Test that saves, deletes, stock movements and bulk price updates add entries"""
+        start = ProductChange.objects.order_by('id').last().id
+        first_pk = self.first.pk
+        self.first.name = "First renamed"
+        self.first.save()
+        record_stock_movement(self.second, 3)
+        apply_price_update(Product.objects.all(), PriceAdjustment(ABSOLUTE, 1))
+        self.first.delete()
+
+        self.assertEqual(
+            list(ProductChange.objects.filter(id__gt=start).order_by('id').values_list('product_id', 'action')),
+            [(first_pk, 'updated'), (self.second.pk, 'updated'),
+             (first_pk, 'updated'), (self.second.pk, 'updated'), (first_pk, 'deleted')])
+
+    async def test_feed_pages(self):
+        """Test that the feed is read in pages with a resumable cursor"""
+        status, page = await self.get_page(since=0, limit=1)
+        self.assertEqual(status, 200)
+        self.assertTrue(page['has_more'])
+        self.assertEqual(page['changes'][0]['product']['barcode'], "FEED001")
+
+        status, page = await self.get_page(since=page['cursor'])
+        self.assertFalse(page['has_more'])
+        self.assertEqual([change['product_id'] for change in page['changes']], [self.second.pk])
+
+        # Nothing new since the last cursor
+        cursor = page['cursor']
+        status, page = await self.get_page(since=cursor)
+        self.assertEqual((page['changes'], page['cursor']), ([], cursor))
+
+        status, page = await self.get_page(since='latest')
+        self.assertEqual(status, 400)
+
+    async def test_feed_collapses_changes(self):
+        """Test that a page lists each product once, with its current state"""
+        _, page = await self.get_page()
+        cursor = page['cursor']
+        first_pk = self.first.pk
+
+        self.second.stock = 5
+        await self.second.asave()
+        self.second.price = Decimal("3.00")
+        await self.second.asave()
+        await self.first.adelete()
+
+        _, page = await self.get_page(since=cursor)
+        self.assertEqual(
+            [(change['product_id'], change['action']) for change in page['changes']],
+            [(self.second.pk, 'updated'), (first_pk, 'deleted')])
+        self.assertEqual(page['changes'][0]['product']['price'], "3.00")
+        self.assertIsNone(page['changes'][1]['product'])
+
+    async def test_feed_waits_for_uncommitted_entries(self):
+        """Test that the cursor doesn't pass an entry committed after a newer one"""
+        _, page = await self.get_page()
+        cursor = page['cursor']
+
+        # Transaction A inserted entry cursor + 1 and is still open when
+        # transaction B commits entry cursor + 2
+        await ProductChange.objects.acreate(id=cursor + 2, product_id=self.second.pk, action=ProductChange.UPDATED)
+        _, page = await self.get_page(since=cursor)
+        self.assertEqual((page['changes'], page['cursor'], page['has_more']), ([], cursor, False))
+
+        # A commits
+        await ProductChange.objects.acreate(id=cursor + 1, product_id=self.first.pk, action=ProductChange.UPDATED)
+        _, page = await self.get_page(since=cursor)
+        self.assertEqual([change['id'] for change in page['changes']], [cursor + 1, cursor + 2])
+        cursor = page['cursor']
+
+        # Gaps in front of entries older than the settle time were rolled back
+        await ProductChange.objects.acreate(
+            id=cursor + 2, product_id=self.first.pk, action=ProductChange.UPDATED,
+            changed_at=timezone.now() - datetime.timedelta(minutes=5))
+        _, page = await self.get_page(since=cursor)
+        self.assertEqual(page['cursor'], cursor + 2)
+
+
+class ProductApiTest(TestCase):
+    """Tests for the product JSON API"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.products = Product.objects.bulk_create([
+            Product(name=f"Api {index}", barcode=f"API{index:03d}", price=Decimal("1.50") + index, stock=index)
+            for index in range(5)
+        ])
+
+    async def get(self, **params):
+        request = self.factory.get('/product/api/', params)
+        request.user = AnonymousUser()
+        response = await ProductApiView.as_view()(request)
+        return response.status_code, json.loads(response.content)
+
+    async def test_keyset_pages(self):
+        """Test that products are listed in id order, one page after another"""
+        status, page = await self.get(limit=3, fields='price,name')
+        self.assertEqual(status, 200)
+        self.assertEqual(page['results'][0], {'id': self.products[0].pk, 'price': "1.50", 'name': "Api 0"})
+        self.assertEqual(page['next_after'], self.products[2].pk)
+
+        status, page = await self.get(limit=3, after=page['next_after'])
+        self.assertEqual([product['barcode'] for product in page['results']], ["API003", "API004"])
+        self.assertIsNone(page['next_after'])
+
+    async def test_batch_fetch(self):
+        """Test fetching a batch of products by id or barcode in one query"""
+        status, page = await self.get(barcodes="API001,API004,NOPE", fields='stock')
+        self.assertEqual(page['results'], {
+            "API001": {'id': self.products[1].pk, 'stock': 1},
+            "API004": {'id': self.products[4].pk, 'stock': 4},
+        })
+        self.assertEqual(page['missing'], ["NOPE"])
+
+        status, page = await self.get(ids=f"{self.products[3].pk}")
+        self.assertEqual(page['results'][str(self.products[3].pk)]['name'], "Api 3")
+
+    async def test_invalid_requests(self):
+        """Test that invalid parameters are rejected with a 400"""
+        for params in ({'fields': 'name,secret'}, {'ids': '1,x'}, {'ids': '1', 'barcodes': 'A'},
+                       {'after': 'last'}, {'limit': 0}):
+            status, page = await self.get(**params)
+            self.assertEqual(status, 400, params)
+            self.assertIn('error', page)
+
+
+class LoadTestCommandsTest(TestCase):
+    """Tests for the catalog generator and the load-test harness"""
+
+    def test_seed_products(self):
+        """Test that seeding creates products, users and everything the signals would record"""
+        out = StringIO()
+        call_command('seed_products', count=25, users=4, batch_size=10, stdout=out)
+        call_command('seed_products', count=5, users=4, stdout=out)
+        self.assertIn('Created 25 products and 4 users (1 managers)', out.getvalue())
+        self.assertIn('Created 5 products and 0 users', out.getvalue())
+        # Without --password the users get a random one, which is printed
+        password = out.getvalue().split("with password '")[1].split("'")[0]
+        self.assertNotEqual(password, "password")
+        self.assertTrue(User.objects.get(username="seed_user_0").check_password(password))
+        call_command('seed_products', count=0, users=5, password="load-test", stdout=out)
+        self.assertTrue(User.objects.get(username="seed_user_4").check_password("load-test"))
+
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(Product.objects.values('barcode').distinct().count(), 30)
+        self.assertEqual(User.objects.filter(groups__name=PRODUCT_MANAGER_GROUP).count(), 1)
+        self.assertEqual(User.objects.filter(groups__name=PRODUCT_USER_GROUP).count(), 4)
+        self.assertEqual(PriceHistory.objects.count(), 30)
+        self.assertEqual(ProductChange.objects.count(), 30)
+        for product in Product.objects.all():
+            self.assertEqual(stock_at(product, timezone.now()), product.stock)
+        self.assertEqual(reconcile_inventory(), {})
+
+    @override_settings(ROOT_URLCONF='product.tests', ALLOWED_HOSTS=['localhost'])
+    def test_loadtest_products(self):
+        """Test that the harness runs every flow and reports latency percentiles"""
+        with self.assertRaises(CommandError):
+            call_command('loadtest_products', stdout=StringIO())
+
+        call_command('seed_products', count=10, users=4, stdout=StringIO())
+        out = StringIO()
+        call_command('loadtest_products', requests=20, warmup=0,
+                     mix='list=1,detail=1,api=1,create=1,update=1', stdout=out)
+
+        report = out.getvalue()
+        for flow in ('list', 'detail', 'api', 'create', 'update', 'total'):
+            self.assertIn(flow, report)
+        self.assertIn('p99=', report)
+        self.assertNotIn('failed', report)
+
+        with self.assertRaises(CommandError):
+            call_command('loadtest_products', mix='browse=1', stdout=StringIO())
+
+
+class SoftDeleteTest(TestCase):
+    """Tests for archiving and purging products"""
+
+    def setUp(self):
+        self.products = Product.objects.bulk_create([
+            Product(name=f"Old {index}", barcode=f"OLD{index:03d}", price=Decimal("2.00"), stock=index)
+            for index in range(6)
+        ])
+        for product in self.products[:3]:
+            record_stock_movement(product, 5)
+        reconcile_inventory()
+
+    def assertSummaryMatchesTable(self):
+        summary = InventorySummary.objects.get()
+        for field, value in compute_inventory().items():
+            self.assertEqual(getattr(summary, field), value, field)
+        return summary
+
+    @override_settings(ROOT_URLCONF='product.tests')
+    def test_delete_view_archives(self):
+        """Test that deleting a product archives it"""
+        setup_product_permissions()
+        manager = User.objects.create_user(username="manager", password="password")
+        manager.groups.add(Group.objects.get(name=PRODUCT_MANAGER_GROUP))
+        product = self.products[1]
+
+        request = RequestFactory().post('/product/')
+        request.user = manager
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        response = ProductDeleteView.as_view()(request, pk=product.pk)
+        self.assertEqual(response.status_code, 302)
+
+        self.assertFalse(Product.objects.filter(pk=product.pk).exists())
+        self.assertIsNotNone(Product.all_objects.get(pk=product.pk).deleted_at)
+        self.assertEqual(ProductChange.objects.order_by('id').last().action, ProductChange.DELETED)
+        self.assertEqual(self.assertSummaryMatchesTable().product_count, 5)
+
+        # Archived products are gone from the site, but their barcode stays taken
+        with self.assertRaises(Http404):
+            ProductDeleteView.as_view()(request, pk=product.pk)
+        with self.assertRaises(ValidationError):
+            Product(name="Reused", barcode=product.barcode, price=1, stock=1).validate_unique()
+
+    def test_archive_and_restore(self):
+        """Test set-based archiving and restoring, in chunks"""
+        queryset = Product.all_objects.filter(barcode__in=['OLD000', 'OLD002', 'OLD004'])
+        self.assertEqual(archive_products(queryset, chunk_size=2), 3)
+        self.assertEqual(archive_products(queryset), 0)
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertSummaryMatchesTable()
+
+        # Saving an archived product, e.g. in the admin, doesn't bring it back into the summary
+        archived = Product.all_objects.get(barcode='OLD002')
+        archived.stock = 50
+        archived.save()
+        self.assertSummaryMatchesTable()
+
+        self.assertEqual(restore_products(Product.all_objects.filter(barcode='OLD002')), 1)
+        self.assertEqual(self.assertSummaryMatchesTable().total_units, 1 + 5 + 50 + 3 + 5)
+
+    def test_purge(self):
+        """Test that purging removes old archived products and their rows in chunks"""
+        archive_products(Product.objects.filter(barcode__in=['OLD000', 'OLD001', 'OLD002', 'OLD003']))
+        recent = Product.all_objects.get(barcode='OLD003')
+        Product.all_objects.archived().exclude(pk=recent.pk).update(
+            deleted_at=timezone.now() - datetime.timedelta(days=40))
+        before = timezone.now() - datetime.timedelta(days=30)
+
+        # Per chunk: the ids, a DELETE per referencing table and one of the products, in a savepoint
+        with self.assertNumQueries(2 * 7 + 3):
+            purged = purge_archived_products(before, chunk_size=2)
+        self.assertEqual(purged, 3)
+
+        self.assertEqual(sorted(Product.all_objects.values_list('barcode', flat=True)),
+                         ['OLD003', 'OLD004', 'OLD005'])
+        self.assertFalse(StockMovement.objects.exclude(product__barcode='OLD003').exists())
+        self.assertFalse(PriceHistory.objects.filter(product_id=self.products[0].pk).exists())
+        self.assertSummaryMatchesTable()
+
+        out = StringIO()
+        call_command('purge_products', '--older-than-days=0', '--dry-run', stdout=out)
+        self.assertIn('1 products', out.getvalue())
+        call_command('purge_products', '--older-than-days=0', stdout=out)
+        self.assertFalse(Product.all_objects.filter(pk=recent.pk).exists())
+
+    def test_admin_actions(self):
+        """Test that the admin archives instead of bulk deleting"""
+        admin_user = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_login(admin_user)
+        changelist = reverse('admin:product_product_changelist')
+
+        response = self.client.get(changelist)
+        self.assertNotContains(response, 'delete_selected')
+
+        pks = [product.pk for product in self.products[:2]]
+        response = self.client.post(changelist, {'action': 'archive_selected', '_selected_action': pks})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Product.objects.count(), 4)
+
+        response = self.client.get(changelist, {'archived': 'yes'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+        # The delete button archives as well
+        product = self.products[2]
+        record_stock_movement(product, 1)
+        movements = product.stock_movements.count()
+        response = self.client.post(reverse('admin:product_product_delete', args=[product.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIsNotNone(Product.all_objects.get(pk=product.pk).deleted_at)
+        self.assertEqual(product.stock_movements.count(), movements)
+
+
+@override_settings(PRODUCT_BARCODE_REFRESH_SECONDS=60)
+class BarcodeIndexTest(TestCase):
+    """Tests for the barcode lookup fast path"""
+
+    def setUp(self):
+        barcode_index.reset()
+        self.addCleanup(barcode_index.reset)
+        self.product = Product.objects.create(
+            name="Scanned Product", barcode="SCAN001", price=Decimal("3.00"), stock=7)
+        barcode_index.warm()
+
+    def test_bloom_filter(self):
+        """Test that the Bloom filter has no false negatives and few false positives"""
+        bloom = BloomFilter(1000, error_rate=0.01)
+        for index in range(1000):
+            bloom.add(f"IN{index}")
+        self.assertTrue(all(f"IN{index}" in bloom for index in range(1000)))
+        false_positives = sum(f"OUT{index}" in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+        # Adding members again doesn't count towards the capacity
+        count = bloom.count
+        bloom.add("IN1")
+        self.assertEqual(bloom.count, count)
+
+    def test_saves_dont_rebuild_the_filter(self):
+        """Test that saving the same products again and again doesn't outgrow the filter"""
+        # A filter with room for a few barcodes
+        barcode_index._bloom = BloomFilter(4)
+        barcode_index._bloom.add("SCAN001")
+        with override_settings(PRODUCT_BARCODE_REFRESH_SECONDS=0), \
+                patch.object(barcode_index, 'warm', wraps=barcode_index.warm) as warm:
+            for _ in range(10):
+                record_product_change(self.product.pk, ProductChange.UPDATED)
+                self.assertTrue(barcode_index.might_exist("SCAN001"))
+            warm.assert_not_called()
+
+            # New barcodes beyond its capacity do rebuild it
+            for index in range(4):
+                Product.objects.create(name="More", barcode=f"MORE{index}", price=1, stock=1)
+            barcode_index.might_exist("SCAN001")
+            warm.assert_called_once()
+
+    def test_lookups(self):
+        """Test that unknown barcodes and repeated lookups don't query the database"""
+        with self.assertNumQueries(0):
+            self.assertIsNone(barcode_index.lookup("UNKNOWN"))
+        with self.assertNumQueries(1):
+            self.assertEqual(barcode_index.lookup("SCAN001")['stock'], 7)
+        with self.assertNumQueries(0):
+            self.assertEqual(barcode_index.lookup("SCAN001")['name'], "Scanned Product")
+
+        # Saves in this process update the index right away
+        self.product.price = Decimal("4.00")
+        self.product.save()
+        Product.objects.create(name="New Product", barcode="SCAN002", price=1, stock=1)
+        self.assertEqual(barcode_index.lookup("SCAN001")['price'], Decimal("4.00"))
+        self.assertEqual(barcode_index.lookup("SCAN002")['name'], "New Product")
+
+    def test_refresh_from_change_log(self):
+        """Test that queryset updates and other processes' writes are read from the change log"""
+        barcode_index.lookup("SCAN001")
+        record_stock_movement(self.product, 3)
+        self.assertEqual(barcode_index.lookup("SCAN001")['stock'], 7)
+
+        with override_settings(PRODUCT_BARCODE_REFRESH_SECONDS=0):
+            self.assertEqual(barcode_index.lookup("SCAN001")['stock'], 10)
+            archive_products(Product.objects.filter(pk=self.product.pk))
+            self.assertIsNone(barcode_index.lookup("SCAN001"))
+
+    def test_form_uniqueness(self):
+        """Test that new barcodes skip the uniqueness query and taken ones are still rejected"""
+        form = ProductForm(data={'name': "Fresh", 'barcode': "FRESH001", 'price': "1.00", 'stock': 1})
+        with self.assertNumQueries(0):
+            self.assertTrue(form.is_valid())
+
+        form = ProductForm(data={'name': "Copy", 'barcode': "SCAN001", 'price': "1.00", 'stock': 1})
+        self.assertFalse(form.is_valid())
+        self.assertIn('barcode', form.errors)
+
+    def test_lookup_view_responses(self):
+        """Test the snapshot and not found responses of the barcode lookup view"""
+        def get(barcode):
+            request = RequestFactory().get(f'/product/barcode/{barcode}/')
+            request.user = AnonymousUser()
+            response = ProductBarcodeView.as_view()(request, barcode=barcode)
+            return response.status_code, json.loads(response.content)
+
+        self.assertEqual(get("SCAN001"), (200, {
+            'id': self.product.pk, 'name': "Scanned Product", 'barcode': "SCAN001", 'price': "3.00", 'stock': 7}))
+
+        status, data = get("UNKNOWN")
+        self.assertEqual(status, 404)
+        self.assertIn('error', data)
+
+        # Archived products aren't found, though their barcode stays taken
+        with override_settings(PRODUCT_BARCODE_REFRESH_SECONDS=0):
+            archive_products(Product.objects.filter(pk=self.product.pk))
+            self.assertEqual(get("SCAN001")[0], 404)
+
+    @override_settings(ROOT_URLCONF='product.tests')
+    def test_views(self):
+        """Test the barcode lookup view and creating a product whose barcode the index missed"""
+        response = self.client.get(reverse('product_barcode', args=["SCAN001"]))
+        self.assertEqual(json.loads(response.content)['id'], self.product.pk)
+        response = self.client.get(reverse('product_barcode', args=["UNKNOWN"]))
+        self.assertEqual(response.status_code, 404)
+
+        # Written without signals or a change log entry, so the index doesn't know it
+        Product.objects.bulk_create([Product(name="Hidden", barcode="HIDDEN01", price=1, stock=1)])
+        setup_product_permissions()
+        user = User.objects.create_user(username="clerk", password="password")
+        user.groups.add(Group.objects.get(name=PRODUCT_USER_GROUP))
+        self.client.force_login(user)
+
+        response = self.client.post(reverse('product_create'), {
+            'name': "Duplicate", 'barcode': "HIDDEN01", 'price': "1.00", 'stock': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('barcode', response.context['form'].errors)
+        self.assertEqual(Product.objects.filter(barcode="HIDDEN01").count(), 1)
+
+
+@override_settings(PRODUCT_SUGGEST_REFRESH_SECONDS=0)
+class ProductSuggestTest(TestCase):
+    """Tests for product name suggestions"""
+
+    def setUp(self):
+        name_index.reset()
+        cache.clear()
+        self.addCleanup(name_index.reset)
+        self.addCleanup(cache.clear)
+        Product.objects.bulk_create([
+            Product(name=name, barcode=f"SUG{index:03d}", price=1, stock=1)
+            for index, name in enumerate(["Green Tea", "green beans", "Grape Juice", "Ginger", "Tea Cups"])
+        ])
+
+    def names(self, prefix, limit=10):
+        return [product['name'] for product in search_product_names(prefix, limit)]
+
+    def test_prefix_search(self):
+        """Test case-insensitive prefix matches in name order"""
+        self.assertFalse(uses_database_index())
+        self.assertEqual(self.names("gr"), ["Grape Juice", "green beans", "Green Tea"])
+        self.assertEqual(self.names("GREEN T"), ["Green Tea"])
+        self.assertEqual(self.names("g", limit=2), ["Ginger", "Grape Juice"])
+        self.assertEqual(self.names("tea"), ["Tea Cups"])
+        self.assertEqual(self.names("x"), [])
+
+    def test_index_follows_changes(self):
+        """Test that created, renamed and archived products are picked up from the change log"""
+        self.names("g")
+        Product.objects.create(name="Garlic", barcode="SUG100", price=1, stock=1)
+        ginger = Product.objects.get(name="Ginger")
+        ginger.name = "Turmeric"
+        ginger.save()
+        archive_products(Product.objects.filter(name="Grape Juice"))
+
+        self.assertEqual(self.names("g"), ["Garlic", "green beans", "Green Tea"])
+        self.assertEqual(self.names("tu"), ["Turmeric"])
+
+    def test_view(self):
+        """Test the suggest endpoint and its per-prefix cache"""
+        request = RequestFactory().get('/product/suggest/', {'q': "gre", 'limit': 1})
+        request.user = AnonymousUser()
+        response = ProductSuggestView.as_view()(request)
+        self.assertEqual(json.loads(response.content)['results'][0]['name'], "green beans")
+
+        # Served from the cache until its TTL runs out
+        Product.objects.create(name="Grease", barcode="SUG101", price=1, stock=1)
+        response = ProductSuggestView.as_view()(request)
+        self.assertEqual(json.loads(response.content)['results'][0]['name'], "green beans")
+        cache.clear()
+        response = ProductSuggestView.as_view()(request)
+        self.assertEqual(json.loads(response.content)['results'][0]['name'], "Grease")
+
+        request = RequestFactory().get('/product/suggest/', {'q': "gre", 'limit': "all"})
+        request.user = AnonymousUser()
+        self.assertEqual(ProductSuggestView.as_view()(request).status_code, 400)
+
+
+@override_settings(PRODUCT_BARCODE_REFRESH_SECONDS=60)
+class ProductHotReloadTest(TestCase):
+    """Tests for hot reloading the product module"""
+
+    def setUp(self):
+        barcode_index.reset()
+        self.addCleanup(barcode_index.reset)
+
+        # Put the original views back so later tests run against them
+        package = sys.modules['product']
+        original = {name: sys.modules[name] for name in get_reloadable_submodules('product')}
+        def restore():
+            sys.modules.update(original)
+            for name, module in original.items():
+                setattr(package, name.rpartition('.')[2], module)
+        self.addCleanup(restore)
+
+        self.registry = ModuleRegistry()
+        import product.module
+        product.module.register(self.registry)
+        patcher = patch.object(self.registry, '_reload_urls')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reload_keeps_shared_state(self):
+        """Test that reloaded views use the indexes the signal receivers keep up to date"""
+        old_views = sys.modules['product.views']
+        self.assertTrue(self.registry.hot_reload_module('product'))
+
+        views = sys.modules['product.views']
+        self.assertIsNot(views, old_views)
+        self.assertIs(views.barcode_index, barcode_index)
+        self.assertIs(sys.modules['product.suggest'].name_index, name_index)
+
+        barcode_index.warm()
+        Product.objects.create(name="Reloaded", barcode="RELOAD01", price=1, stock=1)
+        request = RequestFactory().get('/product/barcode/RELOAD01/')
+        request.user = AnonymousUser()
+        response = views.ProductBarcodeView.as_view()(request, barcode="RELOAD01")
+        self.assertEqual(json.loads(response.content)['name'], "Reloaded")
@@ -4,10 +4,18 @@ from product import views
 # The product module doesn't use namespaces for tests to work correctly
 url_patterns = [
     path('', views.ProductListView.as_view(), name='product_list'),
+    path('inventory/', views.InventorySummaryView.as_view(), name='product_inventory'),
+    path('price-changes/', views.PriceChangesView.as_view(), name='product_price_changes'),
+    path('api/', views.ProductApiView.as_view(), name='product_api'),
+    path('barcode/<str:barcode>/', views.ProductBarcodeView.as_view(), name='product_barcode'),
+    path('suggest/', views.ProductSuggestView.as_view(), name='product_suggest'),
+    path('changes/', views.ProductChangesView.as_view(), name='product_changes'),
     path('create/', views.ProductCreateView.as_view(), name='product_create'),
     path('<int:pk>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('<int:pk>/update/', views.ProductUpdateView.as_view(),
             name='product_update'),
+    path('<int:pk>/stock/', views.ProductStockView.as_view(),
+            name='product_stock'),
     path('<int:pk>/delete/', views.ProductDeleteView.as_view(),
             name='product_delete'),
 ]
\ No newline at end of file
@@ -1,31 +1,189 @@
-from django.shortcuts import render
+import datetime
+from django.shortcuts import render, get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.functional import cached_property
 from django.contrib import messages
+from django.core.exceptions import BadRequest
+from django.db import IntegrityError, transaction
+from django.forms import modelform_factory
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.template.response import TemplateResponse
 from django.urls import reverse_lazy
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import View, CreateView, UpdateView, DeleteView, FormView, ListView, TemplateView
 
-from product.models import Product
-from product.permissions import PublicAccessMixin, UserRequiredMixin, ManagerRequiredMixin
+from modular_engine.routers import replica_reads
+from product.api import BATCH_KEYS, aget_product_page, aget_products_by, parse_batch, parse_fields
+from product.archive import archive_products
+from product.changes import aget_product_changes
+from product.barcodes import barcode_index
+from product.forms import ProductForm, StockMovementForm
+from product.inventory import get_inventory_summary, get_low_stock_threshold
+from product.pricing import price_changes_between
+from product.models import PriceHistory, Product, StockMovement
+from product.permissions import AsyncPublicAccessMixin, PublicAccessMixin, UserRequiredMixin, ManagerRequiredMixin
+from product.permissions import InventoryViewerRequiredMixin, StockManagerRequiredMixin
+from product.permissions import auser_is_product_manager, user_can_manage_stock, user_can_update_price
+from product.stock import InsufficientStockError, open_stock_ledger, record_stock_movement
+from product.suggest import suggest_products
 
+# Price changes shown on the product detail page
+PRICE_HISTORY_LIMIT = 10
 
-class ProductListView(PublicAccessMixin, ListView):
-    """List all products - public access allowed"""
-    model = Product
+# Change log entries per page of the change feed, by default and at most
+CHANGES_PAGE_SIZE = 100
+CHANGES_MAX_PAGE_SIZE = 1000
+
+# Products per page of the JSON API, by default and at most, and per batch fetch
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+API_MAX_BATCH_SIZE = 500
+
+# Suggestions returned by the autocomplete endpoint, by default and at most
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+
+
+class ProductListView(AsyncPublicAccessMixin, View):
+    """
+    List all products - public access allowed.
+    Async-native so catalog reads don't occupy a thread-pool slot under ASGI;
+    the template is rendered by the handler once the data has been fetched.
+    """
     template_name = 'product/product_list.html'
-    context_object_name = 'products'
 
+    async def get(self, request, *args, **kwargs):
+        with replica_reads():
+            products = [product async for product in Product.objects.all().aiterator()]
+        context = {
+            'products': products,
+            'can_delete': await auser_is_product_manager(request.user),
+        }
+        return TemplateResponse(request, self.template_name, context)
 
-class ProductDetailView(PublicAccessMixin, DetailView):
-    """View a product's details - public access allowed"""
-    model = Product
+
+class ProductDetailView(AsyncPublicAccessMixin, View):
+    """View a product's details - public access allowed, async-native"""
     template_name = 'product/product_detail.html'
-    context_object_name = 'product'
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            with replica_reads():
+                product = await Product.objects.aget(pk=kwargs['pk'])
+                # Newest first along the (product, changed_at) index
+                price_history = [
+                    entry async for entry in PriceHistory.objects.filter(product=product)
+                    .order_by('-changed_at', '-id')[:PRICE_HISTORY_LIMIT]
+                ]
+        except Product.DoesNotExist:
+            raise Http404("No product found matching the query")
+        context = {'object': product, 'product': product, 'price_history': price_history}
+        return TemplateResponse(request, self.template_name, context)
+
+
+class ProductChangesView(AsyncPublicAccessMixin, View):
+    """
+    JSON feed of product changes - public access allowed, async-native.
+    ?since=<cursor> returns the changes after the cursor in pages of at most
+    ?limit= log entries, along with the cursor of the next page. Start with
+    since=0 to read the whole catalog, then poll for deltas.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            since = int(request.GET.get('since') or 0)
+            limit = int(request.GET.get('limit') or CHANGES_PAGE_SIZE)
+        except ValueError:
+            return JsonResponse({'error': 'since and limit must be integers'}, status=400)
+        if since < 0 or limit < 1:
+            return JsonResponse({'error': "since can't be negative and limit must be at least 1"}, status=400)
+
+        with replica_reads():
+            page = await aget_product_changes(since, min(limit, CHANGES_MAX_PAGE_SIZE))
+        return JsonResponse(page)
+
+
+class ProductApiView(AsyncPublicAccessMixin, View):
+    """
+    JSON API for products - public access allowed, async-native.
+    ?fields=name,price picks the fields returned (id is always included).
+    ?ids=1,2 or ?barcodes=A,B fetches a batch of products in one query;
+    otherwise products are listed in id order, ?after=<id>&limit=<n> giving
+    the next page.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            fields = parse_fields(request.GET.get('fields'))
+            batch = [(key, request.GET[key]) for key in BATCH_KEYS if key in request.GET]
+            if len(batch) > 1:
+                raise ValueError("Fetch either ids or barcodes, not both")
+            if batch:
+                key, values = batch[0]
+                values = parse_batch(key, values, API_MAX_BATCH_SIZE)
+            else:
+                try:
+                    after = int(request.GET.get('after') or 0)
+                    limit = int(request.GET.get('limit') or API_PAGE_SIZE)
+                except ValueError:
+                    raise ValueError("after and limit must be integers")
+                if limit < 1:
+                    raise ValueError("limit must be at least 1")
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        with replica_reads():
+            if batch:
+                results, missing = await aget_products_by(key, values, fields)
+                return JsonResponse({'results': results, 'missing': missing})
+            results, next_after = await aget_product_page(fields, after, min(limit, API_MAX_PAGE_SIZE))
+        return JsonResponse({'results': results, 'next_after': next_after})
+
+
+class ProductBarcodeView(PublicAccessMixin, View):
+    """
+    Look a product up by barcode, e.g. from a point of sale - public access
+    allowed. Served from the barcode index: unknown barcodes and recently
+    looked up products usually don't reach the database.
+    """
+
+    def get(self, request, *args, **kwargs):
+        snapshot = barcode_index.lookup(kwargs['barcode'])
+        if snapshot is None:
+            return JsonResponse({'error': 'No product with this barcode'}, status=404)
+        return JsonResponse(snapshot)
+
+
+class ProductSuggestView(PublicAccessMixin, View):
+    """
+    Autocomplete for product names - public access allowed.
+    ?q=<prefix> returns the first ?limit= active products, by name, whose
+    name starts with the prefix (case-insensitive).
+    """
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        try:
+            limit = min(int(request.GET.get('limit') or SUGGEST_LIMIT), SUGGEST_MAX_LIMIT)
+        except ValueError:
+            return JsonResponse({'error': 'limit must be an integer'}, status=400)
+        if limit < 1:
+            return JsonResponse({'error': 'limit must be at least 1'}, status=400)
+
+        results = suggest_products(query, limit) if query else []
+        return JsonResponse({'query': query, 'results': results})
+
+
+def barcode_taken(form):
+    """Report a barcode taken since the form was validated, e.g. by another process"""
+    form.add_error('barcode', form.instance.unique_error_message(Product, ['barcode']))
 
 
 class ProductCreateView(UserRequiredMixin, CreateView):
     """Create a new product - requires user role"""
     model = Product
+    form_class = ProductForm
     template_name = 'product/product_form.html'
-    fields = ['name', 'barcode', 'price', 'stock']
     success_url = reverse_lazy('product_list')
     
     def get_context_data(self, **kwargs):
@@ -33,31 +191,87 @@ class ProductCreateView(UserRequiredMixin, CreateView):
         context['action'] = 'Create'
         return context
 
+    def form_valid(self, form):
+        # The initial stock is the product's opening balance in the ledger
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+                open_stock_ledger(self.object, user=self.request.user)
+        except IntegrityError:
+            barcode_taken(form)
+            return self.form_invalid(form)
+        return response
+
 
 class ProductUpdateView(UserRequiredMixin, UpdateView):
-    """Update a product - requires user role"""
+    """
+    Update a product - requires user role.
+    The price can only be changed by users with can_update_price. Stock can
+    only be changed by users who can manage stock, and a change is recorded
+    in the stock ledger as an adjustment.
+    """
     model = Product
+    queryset = Product.objects.all()
     template_name = 'product/product_form.html'
     fields = ['name', 'barcode', 'price', 'stock']
+
+    def get_form_class(self):
+        user = self.request.user
+        self.fields = [
+            name for name in self.fields
+            if (name != 'price' or user_can_update_price(user))
+            and (name != 'stock' or user_can_manage_stock(user))
+        ]
+        return modelform_factory(Product, form=ProductForm, fields=self.fields)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['action'] = 'Update'
         return context
+
+    def form_valid(self, form):
+        self.object = form.save(commit=False)
+        # Never write the stock column directly: movements may have changed it meanwhile
+        update_fields = [name for name in form.cleaned_data if name != 'stock']
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self.object.save(update_fields=update_fields + ['updated_at'])
+            except IntegrityError:
+                barcode_taken(form)
+                return self.form_invalid(form)
+            original_stock = form.initial.get('stock', self.object.stock)
+            delta = form.cleaned_data.get('stock', original_stock) - original_stock
+            if delta:
+                try:
+                    record_stock_movement(
+                        self.object, delta, note='Edited on the product form', user=self.request.user)
+                except InsufficientStockError as e:
+                    transaction.set_rollback(True)
+                    form.add_error('stock', str(e))
+                    return self.form_invalid(form)
+
+        return HttpResponseRedirect(self.get_success_url())
         
     def get_success_url(self):
         return reverse_lazy('product_detail', kwargs={'pk': self.object.pk})
 
 
 class ProductDeleteView(ManagerRequiredMixin, DeleteView):
-    """Delete a product - requires manager role"""
+    """
+    Delete a product - requires manager role.
+    The product is archived; purge_products removes it for good later.
+    """
     model = Product
+    queryset = Product.objects.all()
     template_name = 'product/product_confirm_delete.html'
     success_url = reverse_lazy('product_list')
-    
-    def delete(self, request, *args, **kwargs):
-        messages.success(request, "Product deleted successfully")
-        return super().delete(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        archive_products(Product.objects.filter(pk=self.object.pk))
+        messages.success(self.request, "Product deleted successfully")
+        return HttpResponseRedirect(self.get_success_url())
         
     def get(self, request, *args, **kwargs):
         """
@@ -65,3 +279,89 @@ class ProductDeleteView(ManagerRequiredMixin, DeleteView):
         and in case JavaScript is disabled
         """
         return super().get(request, *args, **kwargs)
+
+
+class ProductStockView(StockManagerRequiredMixin, FormView):
+    """Record stock movements of a product and list the latest ones - requires can_manage_stock"""
+    template_name = 'product/product_stock.html'
+    form_class = StockMovementForm
+
+    @cached_property
+    def product(self):
+        return get_object_or_404(Product.objects, pk=self.kwargs['pk'])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['product'] = self.product
+        context['movements'] = (
+            StockMovement.objects.filter(product=self.product)
+            .select_related('created_by').order_by('-created_at', '-id')[:20]
+        )
+        return context
+
+    def form_valid(self, form):
+        try:
+            record_stock_movement(
+                self.product,
+                form.cleaned_data['quantity'],
+                reason=form.cleaned_data['reason'],
+                note=form.cleaned_data['note'],
+                user=self.request.user,
+            )
+        except InsufficientStockError as e:
+            form.add_error('quantity', str(e))
+            return self.form_invalid(form)
+
+        messages.success(self.request, f"Stock of {self.product.name} is now {self.product.stock} units")
+        return super().form_valid(form)
+
+    def get_success_url(self):
+        return reverse_lazy('product_stock', kwargs={'pk': self.product.pk})
+
+
+class InventorySummaryView(InventoryViewerRequiredMixin, TemplateView):
+    """
+    Inventory overview - requires can_view_inventory.
+    Reads the precomputed summary row, so it costs the same at any catalog size.
+    """
+    template_name = 'product/inventory_summary.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['summary'] = get_inventory_summary()
+        context['low_stock_threshold'] = get_low_stock_threshold()
+        return context
+
+
+class PriceChangesView(InventoryViewerRequiredMixin, ListView):
+    """
+    Report of price changes in a time window - requires can_view_inventory.
+    The window is given as ?since=YYYY-MM-DD&until=YYYY-MM-DD (default: the
+    last 7 days) and is served by the changed_at index.
+    """
+    template_name = 'product/price_changes.html'
+    context_object_name = 'changes'
+    paginate_by = 50
+
+    def get_window(self):
+        today = timezone.localdate()
+        try:
+            since = parse_date(self.request.GET.get('since') or '') or today - datetime.timedelta(days=7)
+            until = parse_date(self.request.GET.get('until') or '') or today
+        except ValueError:
+            # Well formed but not a date, e.g. 2024-02-30
+            raise BadRequest("since and until must be valid dates")
+        return since, until
+
+    def get_queryset(self):
+        since, until = self.get_window()
+        start = timezone.make_aware(datetime.datetime.combine(since, datetime.time.min))
+        end = timezone.make_aware(datetime.datetime.combine(until + datetime.timedelta(days=1), datetime.time.min))
+        return price_changes_between(start, end).select_related('product').order_by('-changed_at', '-id')
+
+    def get_context_data(self, **kwargs):
+        # The paginator counts and slices the queryset here
+        with replica_reads():
+            context = super().get_context_data(**kwargs)
+        context['since'], context['until'] = self.get_window()
+        return context